@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from cameras.models import Camera
+from .models import Alert
+from .renderers import FastJSONRenderer
+from .serializers import AlertRowSerializer, AlertSerializer
+
+
+def sample_alerts(count):
+    """
+    Unsaved alerts (and the equivalent values() rows) of two cameras
+    """
+    cameras = [Camera(id=1, name='Front door'), Camera(id=2, name='Nursery')]
+    now = timezone.now()
+    alerts = []
+    rows = []
+    for index in range(count):
+        camera = cameras[index % 2]
+        alert = Alert(
+            id=index + 1, camera=camera, alert_type='Motion',
+            message=f'Motion detected at {camera.name}', timestamp=now - timedelta(seconds=index),
+            count=index % 5 + 1, last_seen=now - timedelta(seconds=index) if index % 5 else None,
+            clip='alert_clips/clip.mp4' if index % 4 == 0 else '',
+        )
+        alerts.append(alert)
+        rows.append({
+            'id': alert.id, 'camera_id': camera.id, 'camera__name': camera.name,
+            'alert_type': alert.alert_type, 'message': alert.message,
+            'timestamp': alert.timestamp, 'count': alert.count, 'last_seen': alert.last_seen,
+            'clip': alert.clip.name,
+        })
+    return alerts, rows
+
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def compare_serializers(count=1000, repeat=5):
+    """
+    Time serializing and rendering ``count`` alerts with AlertSerializer and
+    JSONRenderer against AlertRowSerializer and FastJSONRenderer. Both take
+    the best of ``repeat`` runs; the database is not involved.
+    """
+    alerts, rows = sample_alerts(count)
+    drf, drf_output = _best(
+        lambda: JSONRenderer().render(AlertSerializer(alerts, many=True).data), repeat
+    )
+    fast, fast_output = _best(
+        lambda: FastJSONRenderer().render(AlertRowSerializer().to_representation(rows)), repeat
+    )
+    return {
+        'count': count,
+        'drf_ms': drf * 1000,
+        'fast_ms': fast * 1000,
+        'speedup': drf / fast,
+        'bytes': len(fast_output),
+        'same_output': drf_output == fast_output,
+    }
@@ -0,0 +1,180 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import Alert
+from .services import publish_alerts
+from .writer import get_alert_writer
+
+
+class Episode:
+    __slots__ = ('alert', 'seen', 'pushed', 'dirty')
+
+    def __init__(self, alert, now):
+        self.alert = alert
+        self.seen = now
+        self.pushed = now
+        self.dirty = False
+
+
+class AlertCoalescer:
+    """
+    Folds repeats of an alert into one open "episode" per (camera, alert
+    type) instead of storing and pushing every one of them.
+
+    The first alert opens an episode and is stored and pushed as usual.
+    Repeats within ``window`` seconds of the last one only bump its count
+    and last-seen time; the change is saved and pushed at most every
+    ``push_interval`` seconds, and once more when the episode closes after
+    ``window`` quiet seconds. At most ``max_episodes`` episodes are kept
+    open, the least recently seen ones being closed early.
+    """
+
+    def __init__(self, window=None, push_interval=None, max_episodes=None):
+        self.window = window or settings.ALERT_EPISODE_WINDOW
+        self.push_interval = push_interval or settings.ALERT_EPISODE_PUSH_INTERVAL
+        self.max_episodes = max_episodes or settings.ALERT_EPISODE_MAX
+
+        self.lock = threading.Lock()
+        # Least recently seen first
+        self.episodes = OrderedDict()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.counters = {'opened': 0, 'coalesced': 0, 'updates': 0, 'closed': 0, 'evicted': 0}
+
+    def observe(self, camera, alert_type, message, now=None):
+        """
+        Record an alert. Returns a new, unsaved Alert when it opens an
+        episode (the caller stores it), or None when it was folded into
+        the open one.
+        """
+        now = time.monotonic() if now is None else now
+        key = (camera.id, alert_type)
+        with self.lock:
+            closed = self._expire(now)
+            episode = self.episodes.get(key)
+            if episode is None:
+                alert = Alert(camera=camera, alert_type=alert_type, message=message, last_seen=timezone.now())
+                self.episodes[key] = Episode(alert, now)
+                self.counters['opened'] += 1
+                while len(self.episodes) > self.max_episodes:
+                    closed.append(self.episodes.popitem(last=False)[1])
+                    self.counters['evicted'] += 1
+                due = []
+            else:
+                alert = None
+                episode.alert.count += 1
+                episode.alert.last_seen = timezone.now()
+                episode.seen = now
+                episode.dirty = True
+                self.episodes.move_to_end(key)
+                self.counters['coalesced'] += 1
+                due = self._due([episode], now)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='alert-coalescer', daemon=True)
+                self.thread.start()
+        self._save(closed + due)
+        return alert
+
+    def _expire(self, now):
+        # Caller holds the lock; episodes are ordered by when they were last seen
+        closed = []
+        while self.episodes:
+            episode = next(iter(self.episodes.values()))
+            if now - episode.seen <= self.window:
+                break
+            self.episodes.popitem(last=False)
+            closed.append(episode)
+            self.counters['closed'] += 1
+        return closed
+
+    def _due(self, episodes, now):
+        # Caller holds the lock. Alerts the batch writer has not stored yet
+        # wait for the next round.
+        due = []
+        for episode in episodes:
+            if episode.dirty and episode.alert.id is not None and now - episode.pushed >= self.push_interval:
+                episode.pushed = now
+                due.append(episode)
+        return due
+
+    def _save(self, episodes):
+        """
+        Store and push the latest count of episodes with unsaved repeats
+        """
+        alerts = []
+        for episode in episodes:
+            if not episode.dirty:
+                continue
+            episode.dirty = False
+            alert = episode.alert
+            if alert.id is None:
+                get_alert_writer().flush(timeout=1)
+            if alert.id is None:
+                continue
+            try:
+                Alert.objects.filter(id=alert.id).update(count=alert.count, last_seen=alert.last_seen)
+            except Exception as e:
+                print(f"Error updating alert {alert.id}: {e}")
+                continue
+            alerts.append(alert)
+        if not alerts:
+            return
+        with self.lock:
+            self.counters['updates'] += len(alerts)
+        try:
+            publish_alerts(alerts)
+        except Exception as e:
+            print(f"Error publishing alert updates: {e}")
+
+    def sweep(self, now=None):
+        """
+        Close expired episodes and push updates that are due
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            closed = self._expire(now)
+            due = self._due(list(self.episodes.values()), now)
+        self._save(closed + due)
+
+    def _run(self):
+        while not self.stopped.wait(self.push_interval):
+            # Drop a connection the server closed since the last sweep
+            close_old_connections()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping alert episodes: {e}")
+
+    def close(self):
+        """
+        Save the latest state of every open episode and forget them
+        """
+        self.stopped.set()
+        with self.lock:
+            episodes = list(self.episodes.values())
+            self.episodes.clear()
+        self._save(episodes)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, open=len(self.episodes))
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_alert_coalescer():
+    """
+    Return the process-wide alert coalescer, creating it on first use
+    """
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = AlertCoalescer()
+            atexit.register(_coalescer.close)
+        return _coalescer
@@ -39,6 +39,12 @@ class AlertConsumer(AsyncWebsocketConsumer):
         # Send the alert message to the WebSocket
         await self.send(text_data=json.dumps(event['message']))
     
+    async def alert_batch(self, event):
+        # Alerts written together arrive together, but clients still get
+        # one message per alert
+        for message in event['messages']:
+            await self.send(text_data=json.dumps(message))
+    
     @database_sync_to_async
     def user_exists(self, user_id):
         try:
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from alerts.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the minute/hour/day alert rollups from the alerts table in chunks. '
+        'The rollups are cleared first, so /api/alerts/stats/ reports too few alerts '
+        'until the rebuild finishes; run it off-peak.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Alerts aggregated per chunk')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        def progress(high, last_id, done):
+            self.stdout.write(f"Counted alerts up to id {high} of {last_id} ({done} alerts)")
+
+        self.stdout.write("Clearing rollups; alert stats stay incomplete until the rebuild finishes")
+        done = rebuild_rollups(options['chunk_size'], progress=progress)
+        self.stdout.write(f"Rebuilt rollups from {done} alerts")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from alerts.benchmark import compare_serializers
+
+
+class Command(BaseCommand):
+    help = 'Compare the DRF and fast read path serialization of alert lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Alerts per list')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs to take the best of')
+
+    def handle(self, *args, **options):
+        result = compare_serializers(options['count'], options['repeat'])
+        self.stdout.write(
+            f"{result['count']} alerts: DRF {result['drf_ms']:.2f}ms, "
+            f"fast path {result['fast_ms']:.2f}ms ({result['speedup']:.1f}x faster, "
+            f"{result['bytes']} bytes, same output: {result['same_output']})"
+        )
@@ -12,12 +12,73 @@ class Alert(models.Model):
     )
     
     camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='alerts')
+    # The camera's owner, copied onto the alert so a user's feed is one
+    # range of alert_user_time_idx rather than a walk through everyone's
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='alerts',
+                             editable=False)
     alert_type = models.CharField(max_length=20, choices=ALERT_TYPES)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Repeats of the alert folded into it while its episode was open, see
+    # alerts.coalescing; timestamp is when the episode was first seen
+    count = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(blank=True, null=True)
+    clip = models.FileField(upload_to='alert_clips', blank=True, null=True)
     
     class Meta:
-        ordering = ['-timestamp']
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            # Keyset pages of one camera's alerts (of one type), newest first
+            models.Index(fields=['camera', '-timestamp', '-id'], name='alert_camera_time_idx'),
+            models.Index(fields=['camera', 'alert_type', '-timestamp', '-id'], name='alert_camera_type_time_idx'),
+            # A user's all-cameras feed, which stops after a page instead of
+            # sorting every alert of the user
+            models.Index(fields=['user', '-timestamp', '-id'], name='alert_user_time_idx'),
+        ]
+    
+    def set_owner(self):
+        """
+        Copy the camera's owner onto the alert; bulk_create skips save()
+        so batch writers call this themselves
+        """
+        if self.user_id is None:
+            self.user_id = self.camera.user_id
+    
+    def save(self, *args, **kwargs):
+        self.set_owner()
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.alert_type} alert from {self.camera.name} at {self.timestamp}"
+
+
+class AlertRollup(models.Model):
+    """
+    Number of alerts per camera, type and time bucket, kept up to date as
+    alerts are written (see alerts.rollups)
+    """
+    GRANULARITIES = (
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+    
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='alert_rollups')
+    alert_type = models.CharField(max_length=20, choices=Alert.ALERT_TYPES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITIES)
+    # Start of the bucket, in UTC
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['camera', 'alert_type', 'granularity', 'bucket'], name='alert_rollup_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['camera', 'granularity', 'bucket'], name='alert_rollup_range_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.count} {self.alert_type} alerts from camera {self.camera_id} in the {self.granularity} of {self.bucket}"
@@ -0,0 +1,16 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class AlertCursorPagination(CursorPagination):
+    """
+    Keyset pagination of alerts, newest first.
+
+    Pages are fetched with ``timestamp < cursor`` (ties broken by id)
+    against the composite indexes on Alert, so a page deep in the history
+    costs the same as the first one, unlike LIMIT/OFFSET.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = settings.ALERTS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ALERTS_MAX_PAGE_SIZE
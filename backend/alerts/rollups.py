@@ -0,0 +1,128 @@
+from collections import Counter
+from datetime import timezone as dt_timezone
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Trunc
+from .models import Alert, AlertRollup
+
+GRANULARITIES = [name for name, _ in AlertRollup.GRANULARITIES]
+# Bound parameters per upserted row, and rows per statement on backends
+# without a parameter limit
+UPSERT_PARAMS = 5
+UPSERT_ROWS = 500
+
+
+def upsert_rows():
+    """
+    Rows per upsert statement, within the backend's bound parameter limit
+    (999 on SQLite builds before 3.32)
+    """
+    max_params = connection.features.max_query_params
+    if max_params is None:
+        return UPSERT_ROWS
+    return min(UPSERT_ROWS, max_params // UPSERT_PARAMS)
+
+
+def bucket_start(timestamp, granularity):
+    """
+    Start of the UTC minute, hour or day ``timestamp`` falls in
+    """
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity {granularity}")
+
+
+def add_counts(counts):
+    """
+    Add ``{(camera_id, alert_type, granularity, bucket): count}`` to the
+    rollups with INSERT ... ON CONFLICT DO UPDATE, so concurrent writers
+    add to a bucket instead of overwriting it
+    """
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    table = quote(AlertRollup._meta.db_table)
+    columns = ', '.join(quote(column) for column in ('camera_id', 'alert_type', 'granularity', 'bucket', 'count'))
+    key = ', '.join(quote(column) for column in ('camera_id', 'alert_type', 'granularity', 'bucket'))
+    rows = list(counts.items())
+    size = upsert_rows()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            params = []
+            for (camera_id, alert_type, granularity, bucket), count in chunk:
+                params += [camera_id, alert_type, granularity,
+                           connection.ops.adapt_datetimefield_value(bucket), count]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))} "
+                f"ON CONFLICT ({key}) DO UPDATE SET {quote('count')} = {table}.{quote('count')} + excluded.{quote('count')}",
+                params,
+            )
+
+
+def record_rollups(alerts):
+    """
+    Count freshly stored alerts into their minute, hour and day buckets
+    """
+    counts = Counter()
+    for alert in alerts:
+        for granularity in GRANULARITIES:
+            counts[(alert.camera_id, alert.alert_type, granularity, bucket_start(alert.timestamp, granularity))] += 1
+    add_counts(counts)
+
+
+def lock_alerts():
+    """
+    Keep alerts from being written until the current transaction ends,
+    waiting for writers already inside theirs. PostgreSQL needs a SHARE
+    lock on the alerts table; SQLite allows one writing transaction at a
+    time, which the rollup delete that follows becomes.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(Alert._meta.db_table)} IN SHARE MODE")
+
+
+def rebuild_rollups(chunk_size=10000, progress=None):
+    """
+    Recompute every rollup from the alerts table, ``chunk_size`` alerts at
+    a time so no single query aggregates the whole table.
+
+    Rollups are cleared and the highest alert id read in one transaction
+    that holds off alert writers (see lock_alerts), so every alert up to
+    that id has been committed together with its rollup counts, and every
+    later one gets a higher id and is counted by its writer. The chunks
+    only add counts, so the rebuild can run while alerts keep coming in.
+    Until the last chunk is in, /api/alerts/stats/ undercounts everything
+    before that id. Returns the number of alerts counted.
+    """
+    with transaction.atomic():
+        lock_alerts()
+        AlertRollup.objects.all().delete()
+        last_id = Alert.objects.aggregate(last=Max('id'))['last'] or 0
+
+    done = 0
+    low = 0
+    while low < last_id:
+        high = min(low + chunk_size, last_id)
+        chunk = Alert.objects.filter(id__gt=low, id__lte=high).order_by()
+        counts = {}
+        for granularity in GRANULARITIES:
+            rows = chunk.annotate(
+                bucket=Trunc('timestamp', granularity, tzinfo=dt_timezone.utc)
+            ).values('camera_id', 'alert_type', 'bucket').annotate(count=Count('id'))
+            for row in rows:
+                counts[(row['camera_id'], row['alert_type'], granularity, row['bucket'])] = row['count']
+                if granularity == 'day':
+                    done += row['count']
+        with transaction.atomic():
+            add_counts(counts)
+        if progress:
+            progress(high, last_id, done)
+        low = high
+    return done
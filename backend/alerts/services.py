@@ -0,0 +1,89 @@
+import asyncio
+from collections import defaultdict
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from cameras.models import Camera
+from .models import Alert
+
+def alert_payload(alert, camera):
+    """
+    Build the message pushed to WebSocket clients for an alert
+    """
+    return {
+        'id': alert.id,
+        'camera_id': camera.id,
+        'camera_name': camera.name,
+        'alert_type': alert.alert_type,
+        'message': alert.message,
+        'timestamp': alert.timestamp.isoformat(),
+        'count': alert.count,
+        'last_seen': alert.last_seen.isoformat() if alert.last_seen else None,
+    }
+
+def send_alert_to_websocket(alert_data, user_id=None):
+    """
+    Send the alert to the WebSocket
+    """
+    if not alert_data:
+        return
+
+    # Get the channel layer
+    channel_layer = get_channel_layer()
+
+    # Get the user ID
+    if user_id is None:
+        user_id = Camera.objects.get(id=alert_data['camera_id']).user_id
+
+    # Send the alert to the user's group
+    async_to_sync(channel_layer.group_send)(
+        f'alerts_{user_id}',
+        {
+            'type': 'alert_message',
+            'message': alert_data
+        }
+    )
+
+def publish_alerts(alerts):
+    """
+    Push stored alerts to their owners' WebSocket groups: one message per
+    group carrying all of that group's alerts, all groups sent at once
+    """
+    groups = defaultdict(list)
+    for alert in alerts:
+        groups[f'alerts_{alert.camera.user_id}'].append(alert_payload(alert, alert.camera))
+    if not groups:
+        return
+
+    channel_layer = get_channel_layer()
+
+    async def send():
+        await asyncio.gather(*(
+            channel_layer.group_send(group, {'type': 'alert_batch', 'messages': messages})
+            for group, messages in groups.items()
+        ))
+
+    async_to_sync(send)()
+
+def create_alert(camera, alert_type, message):
+    """
+    Raise an alert for the camera. Repeats of an alert that is still open
+    are folded into it (see alerts.coalescing) and return None. New alerts
+    are queued on the batch writer, which stores them and pushes them to
+    the owner's WebSocket group within ALERT_BATCH_INTERVAL seconds; the
+    returned alert gets its id once written, or before returning with an
+    interval of 0.
+    """
+    from .coalescing import get_alert_coalescer
+    from .writer import get_alert_writer, write_alerts
+
+    if settings.ALERT_EPISODE_WINDOW > 0:
+        alert = get_alert_coalescer().observe(camera, alert_type, message)
+        if alert is None:
+            return None
+    else:
+        alert = Alert(camera=camera, alert_type=alert_type, message=message)
+    if settings.ALERT_BATCH_INTERVAL <= 0:
+        write_alerts([alert])
+        return alert
+    return get_alert_writer().submit(alert)
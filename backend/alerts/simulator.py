@@ -1,17 +1,16 @@
 import random
 import threading
 import time
-import json
-from django.db import transaction
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.utils import timezone
 from cameras.models import Camera
-from .models import Alert
+# send_alert_to_websocket is still imported from here by older code
+from .services import alert_payload, create_alert, send_alert_to_websocket  # noqa: F401
+from .writer import get_alert_writer
 
 def generate_random_alert():
     """
-    Generate a random alert for a random camera
+    Generate a random alert for a random camera and return its data, or
+    None when no camera is online or the alert was folded into an open
+    episode
     """
     # Get all online cameras
     cameras = Camera.objects.filter(status='online')
@@ -30,45 +29,15 @@ def generate_random_alert():
     else:
         message = f"Crying sound detected at {camera.location}"
     
-    # Create the alert
-    with transaction.atomic():
-        alert = Alert.objects.create(
-            camera=camera,
-            alert_type=alert_type,
-            message=message
-        )
+    # Queue the alert; the batch writer stores and publishes it
+    alert = create_alert(camera, alert_type, message)
+    if alert is None:
+        return None
+    if alert.id is None:
+        get_alert_writer().flush(timeout=1)
     
     # Return the alert data
-    return {
-        'id': alert.id,
-        'camera_id': camera.id,
-        'camera_name': camera.name,
-        'alert_type': alert_type,
-        'message': message,
-        'timestamp': timezone.now().isoformat()
-    }
-
-def send_alert_to_websocket(alert_data):
-    """
-    Send the alert to the WebSocket
-    """
-    if not alert_data:
-        return
-    
-    # Get the channel layer
-    channel_layer = get_channel_layer()
-    
-    # Get the user ID
-    user_id = Camera.objects.get(id=alert_data['camera_id']).user_id
-    
-    # Send the alert to the user's group
-    async_to_sync(channel_layer.group_send)(
-        f'alerts_{user_id}',
-        {
-            'type': 'alert_message',
-            'message': alert_data
-        }
-    )
+    return alert_payload(alert, camera)
 
 def alert_simulator():
     """
@@ -79,11 +48,7 @@ def alert_simulator():
         time.sleep(random.randint(5, 30))
         
         # Generate a random alert
-        alert_data = generate_random_alert()
-        
-        # Send the alert to the WebSocket
-        if alert_data:
-            send_alert_to_websocket(alert_data)
+        generate_random_alert()
 
 def start():
     """
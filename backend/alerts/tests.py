@@ -1,13 +1,32 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
 from cameras.models import Camera
-from .models import Alert
+from .models import Alert, AlertRollup
+from .benchmark import compare_serializers
+from .serializers import ALERT_LIST_COLUMNS, AlertRowSerializer, AlertSerializer
+from .services import create_alert
+from .writer import AlertWriter, write_alerts
+from .coalescing import AlertCoalescer
+from .rollups import add_counts, rebuild_rollups
+from .simulator import generate_random_alert
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
 from guardian_eye.asgi import application
+from unittest.mock import patch
 import json
+import shutil
+import tempfile
+import io
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 User = get_user_model()
 
@@ -60,6 +79,119 @@ class AlertTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
         
+    def test_cursor_pagination(self):
+        """Test paging through alerts with cursors, including timestamp ties"""
+        for i in range(9):
+            Alert.objects.create(camera=self.camera, alert_type='Motion', message=f'Motion {i}')
+        # Give a run of alerts the same timestamp so only the id tells them apart
+        ids = list(Alert.objects.values_list('id', flat=True)[2:7])
+        Alert.objects.filter(id__in=ids).update(timestamp=Alert.objects.get(id=ids[0]).timestamp)
+        expected = list(Alert.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        
+        seen = []
+        url = reverse('alert-list') + '?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(alert['id'] for alert in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        
+        response = self.client.get(reverse('alert-list'), {'camera': self.camera.id, 'alert_type': 'Crying'})
+        self.assertEqual([alert['alert_type'] for alert in response.data['results']], ['Crying'])
+    
+    def assertIndexRangeScan(self, queryset, *indexes):
+        """
+        Assert the query walks one of ``indexes`` and stops after a page
+        instead of sorting every matching alert
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tiny test tables would otherwise just be read whole
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertTrue(any(f'Index Scan using {index}' in plan for index in indexes), plan)
+            self.assertNotIn('Sort', plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertTrue(any(index in plan for index in indexes), plan)
+            self.assertNotIn('TEMP B-TREE', plan.upper())
+        else:
+            self.skipTest(f'no plan check for {connection.vendor}')
+    
+    def test_pages_use_index(self):
+        """Test cursor pages are index range scans, not sorts of the whole table"""
+        alerts = Alert.objects.filter(user=self.user).order_by('-timestamp', '-id')
+        cursor = Alert.objects.latest('timestamp').timestamp
+        
+        # Either index keeps one camera's page in order, depending on statistics
+        self.assertIndexRangeScan(alerts.filter(camera_id=self.camera.id, timestamp__lt=cursor)[:50],
+                                  'alert_camera_time_idx', 'alert_user_time_idx')
+        self.assertIndexRangeScan(alerts.filter(timestamp__lt=cursor)[:50], 'alert_user_time_idx')
+        self.assertEqual(set(Alert.objects.values_list('user_id', flat=True)), {self.user.id})
+    
+    def test_list_query_count(self):
+        """Test the alert list costs the same number of queries for any page size"""
+        other = Camera.objects.create(user=self.user, name='Other', ip_address='192.168.1.101', location='Hall')
+        for i in range(30):
+            Alert.objects.create(camera=other if i % 2 else self.camera, alert_type='Motion', message=f'Motion {i}')
+        url = reverse('alert-list')
+        
+        # One query for the user of the token, one for the page
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'page_size': 5})
+        self.assertEqual(len(response.data['results']), 5)
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'page_size': 32})
+        self.assertEqual({alert['camera_name'] for alert in response.data['results']}, {'Test Camera', 'Other'})
+        
+        alert = Alert.objects.filter(camera=other).first()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('alert-detail', args=[alert.id]))
+        self.assertEqual(response.data['camera_name'], 'Other')
+    
+    def test_fast_read_path_matches_serializer(self):
+        """Test the fast read path renders exactly what AlertSerializer does"""
+        alert = Alert.objects.filter(camera=self.camera).first()
+        alert.clip.name = 'alert_clips/front door.mp4'
+        alert.save()
+        alert_id = alert.id
+        alerts = Alert.objects.order_by('-timestamp', '-id')
+        
+        expected = AlertSerializer(alerts, many=True).data
+        rows = AlertRowSerializer().to_representation(alerts.values(*ALERT_LIST_COLUMNS))
+        self.assertEqual(json.loads(json.dumps(expected)), rows)
+        
+        response = self.client.get(reverse('alert-list'))
+        clips = [alert['clip'] for alert in response.data['results'] if alert['id'] == alert_id]
+        self.assertEqual(clips, ['http://testserver/media/alert_clips/front%20door.mp4'])
+        self.assertEqual(json.loads(response.content)['results'], response.data['results'])
+    
+    def test_fast_read_path_benchmark(self):
+        """Test the serializer benchmark compares identical output"""
+        result = compare_serializers(1000, repeat=3)
+        self.assertTrue(result['same_output'])
+        # Timings are left to the bench_alerts command; they flake on busy machines
+        self.assertEqual(result['count'], 1000)
+        
+    def test_alert_clip(self):
+        """Test downloading the clip recorded for an alert"""
+        alert = Alert.objects.filter(camera=self.camera).first()
+        url = reverse('alert-clip', args=[alert.id])
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            alert.clip.save('clip.mp4', ContentFile(b'fake mp4 data'))
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(b''.join(response.streaming_content), b'fake mp4 data')
+        
     async def test_websocket_connection(self):
         """Test WebSocket connection"""
         communicator = WebsocketCommunicator(
@@ -73,6 +205,21 @@ class AlertTests(TestCase):
         # Disconnect
         await communicator.disconnect()
         
+    async def test_websocket_alert_batch(self):
+        """Test a published batch reaches the client as one message per alert"""
+        communicator = WebsocketCommunicator(application, f'/ws/alerts/{self.user.id}/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        
+        await get_channel_layer().group_send(f'alerts_{self.user.id}', {
+            'type': 'alert_batch',
+            'messages': [{'id': 1, 'message': 'First'}, {'id': 2, 'message': 'Second'}],
+        })
+        self.assertEqual((await communicator.receive_json_from())['message'], 'First')
+        self.assertEqual((await communicator.receive_json_from())['message'], 'Second')
+        
+        await communicator.disconnect()
+        
     async def test_websocket_alert(self):
         """Test receiving alert via WebSocket"""
         communicator = WebsocketCommunicator(
@@ -104,3 +251,287 @@ class AlertTests(TestCase):
         
         # Disconnect
         await communicator.disconnect()
+
+
+class AlertWriterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='StrongPassword123!')
+        self.other = User.objects.create_user(username='other', password='StrongPassword123!')
+        self.cameras = [
+            Camera.objects.create(user=user, name=f'Camera {user.id}', ip_address='192.168.1.90', location='Hall')
+            for user in (self.user, self.user, self.other)
+        ]
+        self.batches = []
+        self.lock = threading.Lock()
+    
+    def record(self, alerts):
+        with self.lock:
+            self.batches.append(list(alerts))
+        return alerts
+    
+    def alert(self, index=0):
+        return Alert(camera=self.cameras[index % 3], alert_type='Motion', message=f'Motion {index}')
+    
+    def test_flushes_by_size_and_time(self):
+        """Test alerts are written in full batches, and partial ones after the interval"""
+        writer = AlertWriter(batch_size=10, interval=0.05, write=self.record)
+        self.addCleanup(writer.close)
+        for index in range(25):
+            writer.submit(self.alert(index))
+        
+        self.assertTrue(writer.flush(timeout=2))
+        self.assertEqual([len(batch) for batch in self.batches], [10, 10, 5])
+        stats = writer.stats()
+        self.assertEqual(stats['alerts'], 25)
+        # The partial batch waited for the interval, but not much longer
+        self.assertGreaterEqual(stats['max_delay'], 0.05)
+        self.assertLess(stats['max_delay'], 0.5)
+    
+    def test_close_writes_buffered_alerts(self):
+        """Test nothing buffered is lost on a clean shutdown"""
+        writer = AlertWriter(batch_size=100, interval=60, write=self.record)
+        alerts = [writer.submit(self.alert(index)) for index in range(7)]
+        started = time.monotonic()
+        writer.close(timeout=2)
+        
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.batches, [alerts])
+        # Alerts raised while shutting down are written straight away
+        late = writer.submit(self.alert())
+        self.assertEqual(self.batches[-1], [late])
+    
+    def test_failed_alerts_are_retried(self):
+        """Test alerts a batch could not store are written on a later attempt, then given up on"""
+        attempts = []
+        
+        def flaky(alerts):
+            attempts.append(list(alerts))
+            # The first batch fails outright, the next stores all but one
+            if len(attempts) == 1:
+                raise OperationalError('server closed the connection unexpectedly')
+            return [alert for alert in alerts if alert.message != 'Motion 0']
+        
+        writer = AlertWriter(batch_size=10, interval=0.01, write=flaky, retries=2, retry_delay=0.01)
+        self.addCleanup(writer.close)
+        alerts = [writer.submit(self.alert(index)) for index in range(3)]
+        
+        self.assertTrue(writer.flush(timeout=2))
+        self.assertEqual(attempts, [alerts, alerts, [alerts[0]]])
+        stats = writer.stats()
+        self.assertEqual((stats['alerts'], stats['stored'], stats['dropped']), (3, 2, 1))
+    
+    def test_batch_is_one_insert_and_one_publish_per_group(self):
+        """Test a batch is stored with one insert and published once per user"""
+        alerts = [self.alert(index) for index in range(6)]
+        with patch('alerts.services.get_channel_layer') as mock_layer, CaptureQueriesContext(connection) as queries:
+            mock_layer.return_value.group_send = self.async_recorder()
+            write_alerts(alerts)
+        
+        # One insert for the alerts and one upsert for their rollups
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        
+        self.assertTrue(all(alert.id for alert in alerts))
+        self.assertEqual(Alert.objects.filter(message__startswith='Motion').count(), 6)
+        sent = {group: [message['id'] for message in event['messages']] for group, event in self.sent}
+        self.assertEqual(sent, {
+            f'alerts_{self.user.id}': [alerts[i].id for i in (0, 1, 3, 4)],
+            f'alerts_{self.other.id}': [alerts[2].id, alerts[5].id],
+        })
+    
+    @override_settings(ALERT_BATCH_INTERVAL=0, ALERT_EPISODE_WINDOW=0)
+    def test_create_alert_without_batching(self):
+        """Test an interval of 0 writes alerts before create_alert returns"""
+        with patch('alerts.writer.publish_alerts') as mock_publish:
+            alert = create_alert(self.cameras[0], 'Crying', 'Crying')
+        self.assertIsNotNone(alert.id)
+        mock_publish.assert_called_once_with([alert])
+    
+    @override_settings(ALERT_BATCH_INTERVAL=0, ALERT_EPISODE_WINDOW=0)
+    def test_simulator_returns_alert_data(self):
+        """Test that the simulator returns the stored alert's data"""
+        Camera.objects.filter(id=self.cameras[0].id).update(status='online')
+        with patch('alerts.writer.publish_alerts'):
+            data = generate_random_alert()
+        
+        alert = Alert.objects.get(id=data['id'])
+        self.assertEqual(data['camera_id'], self.cameras[0].id)
+        self.assertEqual(data['camera_name'], self.cameras[0].name)
+        self.assertEqual((data['alert_type'], data['message']), (alert.alert_type, alert.message))
+        self.assertEqual(data['timestamp'], alert.timestamp.isoformat())
+    
+    def async_recorder(self):
+        self.sent = []
+        
+        async def group_send(group, event):
+            self.sent.append((group, event))
+        return group_send
+
+
+@patch('alerts.coalescing.publish_alerts')
+class AlertCoalescerTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='episodes', password='StrongPassword123!')
+        self.cameras = [
+            Camera.objects.create(user=user, name=f'Camera {index}', ip_address='192.168.1.91', location='Hall')
+            for index in range(3)
+        ]
+        self.coalescer = AlertCoalescer(window=60, push_interval=10, max_episodes=2)
+        self.addCleanup(self.coalescer.stopped.set)
+    
+    def observe(self, camera, now, alert_type='Motion'):
+        alert = self.coalescer.observe(camera, alert_type, 'Motion detected', now=now)
+        if alert is not None:
+            with patch('alerts.writer.publish_alerts'):
+                write_alerts([alert])
+        return alert
+    
+    def test_repeats_update_one_episode(self, mock_publish):
+        """Test repeats inside the window update one alert with throttled pushes"""
+        camera = self.cameras[0]
+        opened = self.observe(camera, 0)
+        self.assertIsNotNone(opened)
+        for now in (1, 2, 3):
+            self.assertIsNone(self.observe(camera, now))
+        mock_publish.assert_not_called()
+        
+        # The first repeat after the push interval saves and pushes the count
+        self.observe(camera, 11)
+        mock_publish.assert_called_once_with([opened])
+        stored = Alert.objects.get(id=opened.id)
+        self.assertEqual(stored.count, 5)
+        self.assertGreater(stored.last_seen, stored.timestamp)
+        
+        # A different type is its own episode
+        self.assertIsNotNone(self.observe(camera, 12, alert_type='Crying'))
+        
+        # The final count is saved when the episode closes
+        self.observe(camera, 13)
+        self.coalescer.sweep(now=100)
+        self.assertEqual(Alert.objects.get(id=opened.id).count, 6)
+        self.assertEqual(self.coalescer.stats()['open'], 0)
+        
+        # After a quiet window the next alert opens a new episode
+        self.assertNotEqual(self.observe(camera, 101).id, opened.id)
+        self.assertEqual(Alert.objects.filter(camera=camera, alert_type='Motion').count(), 2)
+    
+    def test_state_table_is_bounded(self, mock_publish):
+        """Test the least recently seen episode is closed when the table is full"""
+        first = self.observe(self.cameras[0], 0)
+        self.observe(self.cameras[0], 1)
+        self.observe(self.cameras[1], 2)
+        self.observe(self.cameras[2], 3)
+        
+        stats = self.coalescer.stats()
+        self.assertEqual(stats['open'], 2)
+        self.assertEqual(stats['evicted'], 1)
+        # Its unsaved repeat was stored on the way out
+        self.assertEqual(Alert.objects.get(id=first.id).count, 2)
+        self.assertIsNotNone(self.observe(self.cameras[0], 4))
+
+
+@patch('alerts.writer.publish_alerts')
+class AlertRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='rollups', password='StrongPassword123!')
+        self.client.force_authenticate(user=self.user)
+        self.camera = Camera.objects.create(user=self.user, name='Nursery', ip_address='192.168.1.92', location='Nursery')
+        self.start = datetime(2026, 3, 2, 9, 58, tzinfo=dt_timezone.utc)
+    
+    def write(self, minutes, alert_type='Crying'):
+        """
+        Write alerts ``minutes`` after the start, with their real timestamps
+        """
+        alerts = [Alert(camera=self.camera, alert_type=alert_type, message='Alert') for _ in minutes]
+        with patch('django.utils.timezone.now', side_effect=[self.start + timedelta(minutes=m) for m in minutes]):
+            write_alerts(alerts)
+        return alerts
+    
+    def counts(self, granularity):
+        return {
+            (rollup.alert_type, rollup.bucket.strftime('%d %H:%M')): rollup.count
+            for rollup in AlertRollup.objects.filter(granularity=granularity)
+        }
+    
+    def test_upserts_add_to_buckets(self, mock_publish):
+        """Test written alerts are added to their minute, hour and day buckets"""
+        self.write([0, 0.5, 1, 3])
+        self.write([0.2, 70], alert_type='Motion')
+        self.write([0.7])
+        
+        self.assertEqual(self.counts('minute'), {
+            ('Crying', '02 09:58'): 3, ('Crying', '02 09:59'): 1, ('Crying', '02 10:01'): 1,
+            ('Motion', '02 09:58'): 1, ('Motion', '02 11:08'): 1,
+        })
+        self.assertEqual(self.counts('hour'), {
+            ('Crying', '02 09:00'): 4, ('Crying', '02 10:00'): 1,
+            ('Motion', '02 09:00'): 1, ('Motion', '02 11:00'): 1,
+        })
+        self.assertEqual(self.counts('day'), {('Crying', '02 00:00'): 5, ('Motion', '02 00:00'): 2})
+    
+    def test_stats_endpoint(self, mock_publish):
+        """Test range queries are answered from the rollups"""
+        self.write([0, 1, 3, 65])
+        self.write([2], alert_type='Motion')
+        url = reverse('alert-stats')
+        
+        response = self.client.get(url, {
+            'granularity': 'hour', 'alert_type': 'Crying',
+            'start': '2026-03-02T00:00:00Z', 'end': '2026-03-03T00:00:00Z',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(
+            [(row['bucket'], row['count']) for row in response.data['results']],
+            [('2026-03-02T09:00:00+00:00', 2), ('2026-03-02T10:00:00+00:00', 1), ('2026-03-02T11:00:00+00:00', 1)]
+        )
+        
+        # Buckets are answered from the rollups alone
+        Alert.objects.all().delete()
+        response = self.client.get(url, {'granularity': 'day', 'start': '2026-03-02T00:00:00', 'end': '2026-03-09T00:00:00'})
+        self.assertEqual(response.data['results'], [
+            {'camera': self.camera.id, 'alert_type': 'Crying', 'bucket': '2026-03-02T00:00:00+00:00', 'count': 4},
+            {'camera': self.camera.id, 'alert_type': 'Motion', 'bucket': '2026-03-02T00:00:00+00:00', 'count': 1},
+        ])
+        
+        response = self.client.get(url, {'granularity': 'minute', 'start': '2025-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # 24 hours of two alert types is more rows than allowed, one type is not
+        day = {'granularity': 'hour', 'start': '2026-03-02T00:00:00Z', 'end': '2026-03-03T00:00:00Z'}
+        with override_settings(ALERT_STATS_MAX_ROWS=30):
+            self.assertEqual(self.client.get(url, day).status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.get(url, dict(day, alert_type='Motion', camera=self.camera.id))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_upserts_stay_within_parameter_limit(self, mock_publish):
+        """Test that large upserts are split to respect the backend's bound parameter limit"""
+        counts = {
+            (self.camera.id, 'Crying', 'minute', self.start + timedelta(minutes=m)): 1 for m in range(450)
+        }
+        with patch.object(connection.features, 'max_query_params', 999), \
+                CaptureQueriesContext(connection) as queries:
+            add_counts(counts)
+        
+        inserts = [query['sql'] for query in queries.captured_queries if 'INSERT' in query['sql']]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(AlertRollup.objects.count(), 450)
+    
+    def test_backfill_rebuilds_in_chunks(self, mock_publish):
+        """Test the backfill command recomputes the rollups chunk by chunk"""
+        self.write([0, 0.5, 1, 3, 61, 62, 1500])
+        self.write([2, 3], alert_type='Motion')
+        expected = {granularity: self.counts(granularity) for granularity in ('minute', 'hour', 'day')}
+        
+        AlertRollup.objects.filter(granularity='hour').update(count=99)
+        AlertRollup.objects.filter(granularity='minute').delete()
+        output = io.StringIO()
+        call_command('backfill_alert_rollups', chunk_size=3, stdout=output)
+        
+        self.assertEqual({granularity: self.counts(granularity) for granularity in expected}, expected)
+        self.assertIn('Rebuilt rollups from 9 alerts', output.getvalue())
+        self.assertEqual(output.getvalue().count('Counted alerts'), 3)
+        self.assertEqual(rebuild_rollups(chunk_size=100), 9)
@@ -1,7 +1,19 @@
-from rest_framework import viewsets
+import math
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from .models import Alert
-from .serializers import AlertSerializer
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from .models import Alert, AlertRollup
+from .pagination import AlertCursorPagination
+from .renderers import FastJSONRenderer
+from .rollups import GRANULARITIES, bucket_start
+from .serializers import ALERT_LIST_COLUMNS, AlertRowSerializer, AlertSerializer
 
 class AlertViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -9,10 +21,110 @@ class AlertViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = AlertSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AlertCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     
     def get_queryset(self):
         """
         This view should return a list of all alerts
-        for the cameras owned by the currently authenticated user.
+        for the cameras owned by the currently authenticated user,
+        optionally only those of ``?camera=`` and/or ``?alert_type=``.
         """
-        return Alert.objects.filter(camera__user=self.request.user)
+        queryset = Alert.objects.filter(user=self.request.user).select_related('camera')
+        camera = self.request.query_params.get('camera')
+        if camera and camera.isdigit():
+            queryset = queryset.filter(camera_id=int(camera))
+        alert_type = self.request.query_params.get('alert_type')
+        if alert_type:
+            queryset = queryset.filter(alert_type=alert_type)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List alerts through the fast read path: only the needed columns,
+        camera name included, in one query
+        """
+        queryset = self.filter_queryset(self.get_queryset()).values(*ALERT_LIST_COLUMNS)
+        rows = AlertRowSerializer(request)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
+    
+    @action(detail=True, methods=['get'])
+    def clip(self, request, pk=None):
+        """
+        Stream the video clip recorded around the alert
+        """
+        alert = self.get_object()
+        if not alert.clip:
+            raise Http404("No clip was recorded for this alert")
+        return FileResponse(alert.clip.open('rb'), content_type='video/mp4')
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Alert counts per camera, type and ``granularity`` (minute, hour or
+        day) bucket between ``start`` and ``end`` (ISO 8601, the last day
+        by default), optionally only for ``camera`` and/or ``alert_type``.
+        Answered from the rollup table, never from the alerts themselves.
+        """
+        granularity = request.query_params.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            return Response({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = self._parse_time(request.query_params.get('end')) or timezone.now()
+            start = self._parse_time(request.query_params.get('start')) or end - timedelta(days=1)
+        except ValueError:
+            return Response({"error": "start and end must be ISO 8601 date-times"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({"error": "start must be before end"}, status=status.HTTP_400_BAD_REQUEST)
+        start = bucket_start(start, granularity)
+        span = {'minute': 60, 'hour': 3600, 'day': 86400}[granularity]
+        buckets = math.ceil((end - start).total_seconds() / span)
+        if buckets > settings.ALERT_STATS_MAX_BUCKETS:
+            return Response({"error": f"At most {settings.ALERT_STATS_MAX_BUCKETS} buckets per query"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        rollups = AlertRollup.objects.filter(
+            camera__user=request.user, granularity=granularity, bucket__gte=start, bucket__lt=end
+        )
+        camera = request.query_params.get('camera')
+        if camera and camera.isdigit():
+            rollups = rollups.filter(camera_id=int(camera))
+            cameras = 1
+        else:
+            cameras = request.user.cameras.count()
+        alert_type = request.query_params.get('alert_type')
+        if alert_type:
+            rollups = rollups.filter(alert_type=alert_type)
+        # Every camera and type may have a row in every bucket
+        if buckets * cameras * (1 if alert_type else len(Alert.ALERT_TYPES)) > settings.ALERT_STATS_MAX_ROWS:
+            return Response({"error": f"At most {settings.ALERT_STATS_MAX_ROWS} rows per query; narrow it down "
+                                      "with camera or alert_type, a shorter range or a coarser granularity"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = rollups.values_list('camera_id', 'alert_type', 'bucket', 'count').order_by('bucket', 'camera_id', 'alert_type')
+        
+        results = [
+            {'camera': camera_id, 'alert_type': kind, 'bucket': bucket.isoformat(), 'count': count}
+            for camera_id, kind, bucket, count in rows
+        ]
+        return Response({
+            'granularity': granularity,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'total': sum(row['count'] for row in results),
+            'results': results,
+        })
+    
+    def _parse_time(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        if timezone.is_naive(parsed):
+            parsed = parsed.replace(tzinfo=dt_timezone.utc)
+        return parsed
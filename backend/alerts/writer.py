@@ -0,0 +1,184 @@
+import atexit
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import Alert
+from .rollups import record_rollups
+from .services import publish_alerts
+
+
+def write_alerts(alerts):
+    """
+    Store alerts with a single bulk_create and count them into the rollups
+    in the same transaction, then push them to their owners' WebSocket
+    groups together. If the batch is rejected the alerts are retried one
+    by one so a single bad row does not take the rest with it. Returns the
+    alerts stored.
+    """
+    for alert in alerts:
+        alert.set_owner()
+    try:
+        with transaction.atomic():
+            Alert.objects.bulk_create(alerts)
+            record_rollups(alerts)
+        stored = alerts
+    except Exception as e:
+        print(f"Error writing {len(alerts)} alerts, retrying one by one: {e}")
+        stored = []
+        for alert in alerts:
+            # Ids handed out by the rolled back batch are not valid
+            alert.id = None
+            try:
+                with transaction.atomic():
+                    alert.save()
+                    record_rollups([alert])
+                stored.append(alert)
+            except Exception as e:
+                alert.id = None
+                print(f"Error writing alert for camera {alert.camera_id}: {e}")
+
+    try:
+        publish_alerts(stored)
+    except Exception as e:
+        print(f"Error publishing alerts: {e}")
+    return stored
+
+
+class AlertWriter:
+    """
+    Buffers alerts in memory and writes them in batches from a background
+    thread.
+
+    A batch is written as soon as it holds ``batch_size`` alerts, and never
+    later than ``interval`` seconds after its oldest alert was queued, so
+    bursts cost one INSERT and one publish per batch instead of one round
+    trip and commit per alert. Alerts a batch failed to store (say, while
+    the database restarts) are put back at the front of the buffer and
+    retried after ``retry_delay`` seconds, up to ``retries`` times.
+    close() writes whatever is still buffered.
+    """
+
+    def __init__(self, batch_size=None, interval=None, write=write_alerts, retries=None, retry_delay=None):
+        self.batch_size = batch_size or settings.ALERT_BATCH_SIZE
+        self.interval = interval or settings.ALERT_BATCH_INTERVAL
+        self.write = write
+        self.retries = settings.ALERT_WRITE_RETRIES if retries is None else retries
+        self.retry_delay = settings.ALERT_WRITE_RETRY_DELAY if retry_delay is None else retry_delay
+
+        self.condition = threading.Condition()
+        self.buffer = []
+        self.queued = 0
+        self.done = 0
+        self.closed = False
+        self.thread = None
+        self.counters = {'alerts': 0, 'stored': 0, 'retried': 0, 'dropped': 0,
+                         'batches': 0, 'largest_batch': 0, 'max_delay': 0.0}
+
+    def submit(self, alert):
+        """
+        Queue an unsaved alert; it gets its id once its batch is written
+        """
+        with self.condition:
+            if not self.closed:
+                self.buffer.append((time.monotonic(), alert, 0))
+                self.queued += 1
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='alert-writer', daemon=True)
+                    self.thread.start()
+                if len(self.buffer) in (1, self.batch_size):
+                    self.condition.notify_all()
+                return alert
+        # Shutting down: nothing would flush the buffer any more
+        self.write([alert])
+        return alert
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.buffer and not self.closed:
+                    self.condition.wait()
+                if not self.buffer:
+                    return
+                # Let the batch fill up until its oldest alert is due
+                while len(self.buffer) < self.batch_size and not self.closed:
+                    remaining = self.buffer[0][0] + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.buffer[:self.batch_size]
+                del self.buffer[:self.batch_size]
+
+            # The thread's connection may have been dropped by the server
+            # or outlived CONN_MAX_AGE since the last batch
+            close_old_connections()
+            try:
+                stored = self.write([alert for _, alert, _ in batch])
+            except Exception as e:
+                print(f"Error writing alerts: {e}")
+                stored = []
+            delay = time.monotonic() - batch[0][0]
+            written = {id(alert) for alert in stored}
+            failed = [(queued_at, alert, attempts + 1) for queued_at, alert, attempts in batch
+                      if id(alert) not in written]
+            retry = [entry for entry in failed if entry[2] <= self.retries]
+            # A retried alert is done once it is stored or given up on
+            dropped = len(failed) - len(retry)
+            if dropped:
+                print(f"Error writing alerts: dropping {dropped} after {self.retries} retries")
+
+            with self.condition:
+                self.buffer[:0] = retry
+                self.done += len(batch) - len(retry)
+                self.counters['alerts'] += len(batch) - len(retry)
+                self.counters['stored'] += len(stored)
+                self.counters['retried'] += len(retry)
+                self.counters['dropped'] += dropped
+                self.counters['batches'] += 1
+                self.counters['largest_batch'] = max(self.counters['largest_batch'], len(batch))
+                self.counters['max_delay'] = max(self.counters['max_delay'], delay)
+                self.condition.notify_all()
+                if retry:
+                    self.condition.wait_for(lambda: self.closed, self.retry_delay)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every alert queued before this call has been written;
+        returns False on timeout
+        """
+        with self.condition:
+            target = self.queued
+            return self.condition.wait_for(lambda: self.done >= target, timeout)
+
+    def close(self, timeout=None):
+        """
+        Write everything still buffered and stop the background thread.
+        Alerts submitted afterwards are written straight away.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters, buffered=len(self.buffer))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_alert_writer():
+    """
+    Return the process-wide alert writer, creating it on first use. It is
+    closed at interpreter exit so buffered alerts are not lost.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AlertWriter()
+            atexit.register(_writer.close)
+        return _writer
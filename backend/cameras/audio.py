@@ -0,0 +1,240 @@
+import shutil
+import subprocess
+import threading
+import wave
+import numpy as np
+from django.conf import settings
+from alerts.services import create_alert
+from .models import Camera
+from .validators import get_stream_url
+
+
+class CryDetector:
+    """
+    Streaming infant-cry detector over mono PCM audio.
+
+    Audio is cut into fixed ``chunk_size`` frames and every batch of
+    complete frames goes through one vectorised FFT. Each frame yields
+    three features: loudness (RMS), the share of energy in the cry band
+    and periodicity (autocorrelation peak at a cry-like pitch). A frame
+    counts as cry-like when all three pass their thresholds. Detection is
+    the fraction of cry-like frames over a sliding window of
+    ``window_chunks`` frames, with hysteresis: a cry starts when the
+    fraction reaches ``on_ratio`` and only ends once it falls to
+    ``off_ratio``, so one continuous cry is one event.
+
+    All buffers are preallocated, so memory per stream is constant.
+    """
+
+    def __init__(self, sample_rate=16000, chunk_size=None, window_chunks=None,
+                 min_rms=None, band=(250, 4000), pitch=(250, 800),
+                 min_band_ratio=0.5, min_periodicity=0.5, on_ratio=0.5, off_ratio=0.15):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size or settings.SOUND_CHUNK_SIZE
+        self.window_chunks = window_chunks or settings.SOUND_WINDOW_CHUNKS
+        self.min_rms = min_rms or settings.SOUND_MIN_RMS
+        self.min_band_ratio = min_band_ratio
+        self.min_periodicity = min_periodicity
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+
+        self.window = np.hanning(self.chunk_size).astype(np.float32)
+        frequencies = np.fft.rfftfreq(self.chunk_size, 1.0 / sample_rate)
+        self.band_mask = (frequencies >= band[0]) & (frequencies <= band[1])
+        self.min_lag = int(sample_rate / pitch[1])
+        self.max_lag = int(sample_rate / pitch[0])
+
+        # Samples left over from the last call, and the sliding window of
+        # per-frame decisions
+        self.pending = np.zeros(self.chunk_size, dtype=np.float32)
+        self.pending_size = 0
+        self.history = np.zeros(self.window_chunks, dtype=bool)
+        self.history_index = 0
+        self.history_sum = 0
+
+        self.crying = False
+        self.chunks_seen = 0
+
+    def features(self, frames):
+        """
+        Compute (rms, band_ratio, periodicity) for a (n, chunk_size) batch
+        """
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+
+        spectrum = np.fft.rfft(frames * self.window, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        power[:, 0] = 0
+        total = power.sum(axis=1) + 1e-12
+        band_ratio = power[:, self.band_mask].sum(axis=1) / total
+
+        # Autocorrelation is the inverse FFT of the power spectrum
+        autocorrelation = np.fft.irfft(power, n=self.chunk_size, axis=1)
+        lags = autocorrelation[:, self.min_lag:self.max_lag + 1]
+        periodicity = lags.max(axis=1) / (autocorrelation[:, 0] + 1e-12)
+
+        return rms, band_ratio, periodicity
+
+    def feed(self, samples):
+        """
+        Feed PCM samples (int16 or float in [-1, 1]) and return the list of
+        times, in seconds from the start of the stream, where a cry began
+        """
+        samples = np.asarray(samples)
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32, copy=False)
+
+        # Complete the pending frame first
+        if self.pending_size:
+            needed = self.chunk_size - self.pending_size
+            head, samples = samples[:needed], samples[needed:]
+            self.pending[self.pending_size:self.pending_size + len(head)] = head
+            self.pending_size += len(head)
+            if self.pending_size < self.chunk_size:
+                return []
+            batch = [self.pending[np.newaxis, :].copy()]
+            self.pending_size = 0
+        else:
+            batch = []
+
+        complete = len(samples) // self.chunk_size * self.chunk_size
+        if complete:
+            batch.append(samples[:complete].reshape(-1, self.chunk_size))
+        rest = samples[complete:]
+        self.pending[:len(rest)] = rest
+        self.pending_size = len(rest)
+
+        if not batch:
+            return []
+        return self.process_frames(np.concatenate(batch))
+
+    def process_frames(self, frames):
+        rms, band_ratio, periodicity = self.features(frames)
+        cry_like = (
+            (rms >= self.min_rms)
+            & (band_ratio >= self.min_band_ratio)
+            & (periodicity >= self.min_periodicity)
+        )
+
+        onsets = []
+        for value in cry_like:
+            self.history_sum += int(value) - int(self.history[self.history_index])
+            self.history[self.history_index] = value
+            self.history_index = (self.history_index + 1) % self.window_chunks
+            self.chunks_seen += 1
+
+            ratio = self.history_sum / self.window_chunks
+            if not self.crying and ratio >= self.on_ratio:
+                self.crying = True
+                onsets.append(self.chunks_seen * self.chunk_size / self.sample_rate)
+            elif self.crying and ratio <= self.off_ratio:
+                self.crying = False
+        return onsets
+
+
+def iter_wav_chunks(path, chunk_size=4096):
+    """
+    Yield (sample_rate, mono int16 samples) chunks from a WAV file
+    """
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError('Only 16-bit PCM WAV files are supported')
+        channels = wav.getnchannels()
+        sample_rate = wav.getframerate()
+        while True:
+            data = wav.readframes(chunk_size)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16)
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+            yield sample_rate, samples
+
+
+def detect_cries_in_wav(path, **options):
+    """
+    Run a WAV file through the streaming detector and return the cry onsets
+    """
+    detector = None
+    onsets = []
+    for sample_rate, samples in iter_wav_chunks(path):
+        if detector is None:
+            detector = CryDetector(sample_rate=sample_rate, **options)
+        onsets.extend(detector.feed(samples))
+    return onsets
+
+
+def iter_stream_audio(url, sample_rate=16000, chunk_size=4096):
+    """
+    Yield mono int16 chunks of a camera's audio track decoded by ffmpeg
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg is required to read camera audio')
+
+    command = [
+        ffmpeg, '-nostdin', '-loglevel', 'error', '-i', url,
+        '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-',
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = process.stdout.read(chunk_size * 2)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+    finally:
+        process.kill()
+        process.wait()
+
+
+class SoundMonitor:
+    """
+    Runs a CryDetector on the audio track of every online camera with sound
+    detection enabled and raises ``Crying`` alerts on each cry onset
+    """
+
+    def __init__(self, sample_rate=16000, refresh_interval=30):
+        self.sample_rate = sample_rate
+        self.refresh_interval = refresh_interval
+        self.workers = {}
+        self.stopped = threading.Event()
+
+    def watch(self, camera, stopped):
+        detector = CryDetector(sample_rate=self.sample_rate)
+        url = get_stream_url(camera)
+        while not stopped.is_set():
+            try:
+                for samples in iter_stream_audio(url, self.sample_rate):
+                    if detector.feed(samples):
+                        create_alert(camera, 'Crying', f"Crying sound detected at {camera.location}")
+                    if stopped.is_set():
+                        break
+            except Exception as e:
+                print(f"Error reading audio for camera {camera.id}: {e}")
+            stopped.wait(5)
+
+    def refresh_cameras(self):
+        cameras = {
+            camera.id: camera
+            for camera in Camera.objects.filter(enable_sound_detection=True, status='online')
+        }
+        for camera_id in list(self.workers):
+            if camera_id not in cameras:
+                self.workers.pop(camera_id).set()
+        for camera_id, camera in cameras.items():
+            if camera_id not in self.workers:
+                stopped = threading.Event()
+                self.workers[camera_id] = stopped
+                threading.Thread(target=self.watch, args=(camera, stopped), daemon=True).start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.refresh_cameras()
+            self.stopped.wait(self.refresh_interval)
+        for stopped in self.workers.values():
+            stopped.set()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+STREAM_TOKEN_SALT = 'cameras.live-stream'
+
+
+class QueryParamJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that also accepts the access token as a ``token``
+    query parameter, for clients such as <img> tags that cannot send headers
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is not None:
+            return super().authenticate(request)
+
+        raw_token = request.query_params.get('token')
+        if not raw_token:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
+
+
+def make_stream_token(user, camera):
+    """
+    A signed token that opens the live preview of one camera for
+    LIVE_STREAM_TOKEN_TTL seconds, so the access token never ends up in a URL
+    """
+    return signing.dumps({'user': user.id, 'camera': camera.id}, salt=STREAM_TOKEN_SALT)
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates a ``stream_token`` query parameter made by
+    make_stream_token; ``request.auth`` is its payload, which names the one
+    camera it is good for
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get('stream_token')
+        if not raw_token:
+            return None
+
+        try:
+            payload = signing.loads(raw_token, salt=STREAM_TOKEN_SALT, max_age=settings.LIVE_STREAM_TOKEN_TTL)
+        except signing.BadSignature:
+            raise AuthenticationFailed('Stream token is invalid or expired')
+        try:
+            user = get_user_model().objects.get(id=payload['user'], is_active=True)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('User not found')
+        return user, payload
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import time
+import cv2
+import numpy as np
+
+# Scenarios run in spawned processes that import this module, so anything
+# touching Django models is imported only after django.setup() has run.
+
+SCENARIOS = ('static', 'blobs', 'noise', 'lighting')
+
+
+def write_scenario(path, scenario, size, frames=90, fps=15, seed=0):
+    """
+    Write a deterministic synthetic video and return its ground truth: one
+    boolean per frame telling whether something moved in it.
+
+    Every scenario is a static textured scene. ``blobs`` has two squares
+    moving through it during the middle third, ``noise`` adds per-frame
+    sensor noise and ``lighting`` a slow brightness swing on top of the
+    same moving square; ``static`` has no motion at all.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(40, 120, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    start, end = frames // 3, 2 * frames // 3
+    side = max(4, height // 8)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    truth = []
+    for index in range(frames):
+        frame = background.copy()
+        moving = scenario != 'static' and start <= index < end
+        if moving:
+            step = (index - start) * (width - side) // max(1, end - start)
+            top = height // 3
+            frame[top:top + side, step:step + side] = 255
+            if scenario == 'blobs':
+                bottom = height - side - height // 6
+                frame[bottom:bottom + side, width - side - step:width - step] = 20
+        if scenario == 'noise':
+            noise = rng.normal(0, 6, frame.shape)
+            frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+        elif scenario == 'lighting':
+            gain = 1 + 0.15 * np.sin(2 * np.pi * index / frames)
+            frame = cv2.convertScaleAbs(frame, alpha=gain)
+        writer.write(frame)
+        # The frame after the square leaves still differs from the background
+        truth.append(moving or (scenario != 'static' and index == end))
+    writer.release()
+    return truth
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB
+    """
+    # Linux carries ru_maxrss over from the parent through fork and exec,
+    # VmHWM starts afresh with the new program
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def run_scenario(path, truth, width=None):
+    """
+    Run capture -> preprocess -> detect over a video file on one core and
+    return throughput, latency and detection quality figures
+    """
+    from .motion import MotionDetector
+    from .pipeline import FrameContext
+
+    detector = MotionDetector(width=width)
+    baseline_rss = peak_rss_mb()
+    cap = cv2.VideoCapture(path)
+    latencies = []
+    detected = []
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    while True:
+        started = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        context = FrameContext(frame, width=detector.width)
+        result = detector.process_gray(context['blurred'])
+        latencies.append(time.perf_counter() - started)
+        detected.append(result.motion)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    cap.release()
+
+    # Frames still inside the detector warm-up are not scored
+    scored = range(detector.warmup + 1, min(len(detected), len(truth)))
+    true_positives = sum(1 for i in scored if detected[i] and truth[i])
+    false_positives = sum(1 for i in scored if detected[i] and not truth[i])
+    false_negatives = sum(1 for i in scored if not detected[i] and truth[i])
+
+    latencies_ms = np.array(latencies) * 1000
+    frames = len(latencies)
+    return {
+        'frames': frames,
+        'fps': frames / wall if wall else None,
+        'fps_per_core': frames / cpu if cpu else None,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p90': float(np.percentile(latencies_ms, 90)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'max': float(latencies_ms.max()),
+        },
+        'peak_rss_mb': peak_rss_mb(),
+        # What the run itself added on top of the interpreter and imports
+        'scenario_rss_mb': peak_rss_mb() - baseline_rss,
+        'precision': true_positives / (true_positives + false_positives) if true_positives + false_positives else None,
+        'recall': true_positives / (true_positives + false_negatives) if true_positives + false_negatives else None,
+        'false_positives': false_positives,
+    }
+
+
+def scenario_main(path, truth, width, results):
+    """
+    Entry point of the process a scenario runs in: a fresh process per
+    scenario, so its peak RSS is not that of the largest scenario before it
+    """
+    import django
+    django.setup()
+
+    # One OpenCV thread, so the figures are per core
+    cv2.setNumThreads(1)
+    results.put(run_scenario(path, truth, width=width))
+
+
+def run_isolated(path, truth, width=None):
+    """
+    run_scenario() in a spawned process of its own
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=scenario_main, args=(path, truth, width, results), daemon=True)
+    process.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"Benchmark of {path} exited with code {process.exitcode}")
+    finally:
+        process.join()
+
+
+def run_suite(directory, scenarios=SCENARIOS, resolutions=((640, 360), (1280, 720), (1920, 1080)),
+              frames=90, width=None):
+    """
+    Generate every scenario at every resolution into ``directory``, run
+    each in its own process and return the report as a JSON-serialisable
+    dict
+    """
+    results = []
+    for size in resolutions:
+        for scenario in scenarios:
+            path = os.path.join(directory, f"{scenario}_{size[0]}x{size[1]}.avi")
+            truth = write_scenario(path, scenario, size, frames=frames)
+            try:
+                result = run_isolated(path, truth, width=width)
+            finally:
+                os.remove(path)
+            result.update(scenario=scenario, width=size[0], height=size[1])
+            results.append(result)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current, tolerance=0.1):
+    """
+    Return a list of (scenario, width, height, metric, before, after) for
+    every fps_per_core drop or recall/precision loss beyond ``tolerance``
+    """
+    before = {(r['scenario'], r['width'], r['height']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['scenario'], result['width'], result['height'])
+        old = before.get(key)
+        if old is None:
+            continue
+        for metric in ('fps_per_core', 'precision', 'recall'):
+            if old[metric] is None or result[metric] is None:
+                continue
+            if result[metric] < old[metric] * (1 - tolerance):
+                regressions.append(key + (metric, old[metric], result[metric]))
+    return regressions
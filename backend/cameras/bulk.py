@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Camera
+from .serializers import CameraSerializer
+from .thumbnails import queue_thumbnails
+from .validators import validate_camera_connection
+
+
+def validate_connections(addresses, workers=None):
+    """
+    Check the reachability of many camera addresses at once on a bounded
+    thread pool; each distinct address is only checked once. Returns
+    address -> (is_reachable, status).
+    """
+    addresses = list(dict.fromkeys(addresses))
+    if not addresses:
+        return {}
+    workers = min(workers or settings.CAMERA_BULK_WORKERS, len(addresses))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='camera-bulk') as executor:
+        return dict(zip(addresses, executor.map(validate_camera_connection, addresses)))
+
+
+def bulk_save_cameras(items, request, atomic=False):
+    """
+    Create (or, for items carrying an ``id``, update) many cameras of the
+    requesting user at once.
+
+    Every item is validated by CameraSerializer, then the connections of
+    all new cameras and changed addresses are checked concurrently. Valid
+    items are written with one bulk_create and one bulk_update, and
+    thumbnails are queued for them. With ``atomic`` nothing is written
+    unless every item is valid.
+
+    Returns one result dict per item, in order, with its ``status``
+    ('created', 'updated', 'invalid', 'unreachable' or 'skipped') and
+    ``id`` or ``errors``.
+    """
+    user = request.user
+    ids = [item.get('id') for item in items if isinstance(item, dict) and item.get('id') is not None]
+    existing = Camera.objects.filter(user=user, id__in=[i for i in ids if isinstance(i, int)]).in_bulk()
+
+    results = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'status': 'invalid', 'errors': {'non_field_errors': ['Expected an object.']}}
+            continue
+        instance = None
+        if item.get('id') is not None:
+            instance = existing.get(item['id'])
+            if instance is None:
+                results[index] = {'status': 'invalid', 'errors': {'id': ['Camera not found.']}}
+                continue
+        serializer = CameraSerializer(instance, data=item, partial=instance is not None,
+                                      context={'request': request})
+        if not serializer.is_valid():
+            results[index] = {'status': 'invalid', 'errors': serializer.errors}
+            continue
+        pending.append((index, instance, serializer.validated_data))
+
+    # Only new cameras and changed addresses need a connection check
+    def address(instance, data):
+        if instance is None or data.get('ip_address', instance.ip_address) != instance.ip_address:
+            return data.get('ip_address')
+        return None
+
+    connections = validate_connections(
+        filter(None, (address(instance, data) for _, instance, data in pending))
+    )
+
+    created = []
+    updated = []
+    update_fields = {'updated_at'}
+    for index, instance, data in pending:
+        checked = address(instance, data)
+        if checked is not None:
+            is_reachable, status = connections[checked]
+            if not is_reachable:
+                results[index] = {
+                    'status': 'unreachable',
+                    'errors': {'ip_address': ['Camera is unreachable. Please check the IP address.']},
+                }
+                continue
+            data = dict(data, status=status)
+
+        if instance is None:
+            camera = Camera(user=user, **data)
+            camera.fill_stream_url()
+            created.append((index, camera))
+        else:
+            for field, value in data.items():
+                setattr(instance, field, value)
+            update_fields.update(data)
+            updated.append((index, instance, checked is not None))
+
+    failed = any(result is not None for result in results)
+    if atomic and failed:
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {'status': 'skipped'}
+        return results
+
+    now = timezone.now()
+    for _, camera, _ in updated:
+        camera.updated_at = now
+    with transaction.atomic():
+        if created:
+            Camera.objects.bulk_create([camera for _, camera in created])
+        if updated:
+            Camera.objects.bulk_update([camera for _, camera, _ in updated], sorted(update_fields))
+
+    for index, camera in created:
+        results[index] = {'status': 'created', 'id': camera.id}
+    for index, camera, _ in updated:
+        results[index] = {'status': 'updated', 'id': camera.id}
+
+    # New cameras and moved ones need fresh thumbnails
+    queue_thumbnails(
+        [camera.id for _, camera in created]
+        + [camera.id for _, camera, moved in updated if moved]
+    )
+    return results
@@ -0,0 +1,276 @@
+import threading
+import time
+from collections import OrderedDict
+import cv2
+from django.conf import settings
+
+
+class PooledCapture:
+    """
+    A warm VideoCapture handle for one stream URL.
+
+    A reader thread keeps pulling frames so the latest decoded frame is
+    always at hand, and reopens the stream with exponential backoff when
+    it drops. With a ``sampler`` every frame is still grabbed to keep the
+    stream current, but only the frames the sampler picks are decoded.
+    """
+
+    def __init__(self, url, capture_factory, backoff_base, backoff_max, sampler=None):
+        self.url = url
+        self.sampler = sampler
+        self.capture_factory = capture_factory
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_time = 0
+        self.frame_count = 0
+        self.failures = 0
+        self.next_attempt = 0
+        self.last_used = time.monotonic()
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        cap = None
+        while not self.stopped.is_set():
+            if cap is None:
+                delay = self.next_attempt - time.monotonic()
+                if delay > 0:
+                    self.stopped.wait(delay)
+                    continue
+                cap = self._open()
+                if cap is None:
+                    continue
+
+            if not cap.grab():
+                self._drop(cap)
+                cap = None
+                continue
+            if self.sampler is not None and not self.sampler.should_decode():
+                continue
+
+            ret, frame = cap.retrieve()
+            if not ret or frame is None:
+                self._drop(cap)
+                cap = None
+                continue
+            if self.sampler is not None:
+                self.sampler.observe(frame)
+
+            with self.condition:
+                self.frame = frame
+                self.frame_time = time.monotonic()
+                self.frame_count += 1
+                self.failures = 0
+                self.condition.notify_all()
+
+        if cap is not None:
+            cap.release()
+
+    def _drop(self, cap):
+        cap.release()
+        self._backoff()
+
+    def _open(self):
+        try:
+            cap = self.capture_factory(self.url)
+            if cap.isOpened():
+                return cap
+            cap.release()
+        except Exception as e:
+            print(f"Error opening stream {self.url}: {e}")
+        self._backoff()
+        return None
+
+    def _backoff(self):
+        self.failures += 1
+        delay = min(self.backoff_base * 2 ** (self.failures - 1), self.backoff_max)
+        self.next_attempt = time.monotonic() + delay
+
+    def latest_frame(self, timeout=5, max_age=None):
+        """
+        Return the most recent frame, waiting up to ``timeout`` seconds for
+        one (no older than ``max_age`` seconds, if given) to arrive
+        """
+        self.last_used = time.monotonic()
+        deadline = self.last_used + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                fresh = max_age is None or now - self.frame_time <= max_age
+                if self.frame is not None and fresh:
+                    return self.frame
+                if now >= deadline or self.stopped.is_set():
+                    return None
+                self.condition.wait(deadline - now)
+
+    def wait_for_frame(self, after_count, timeout=1):
+        """
+        Wait until a frame newer than ``after_count`` arrives and return
+        (frame_count, frame), or (after_count, None) on timeout
+        """
+        self.last_used = time.monotonic()
+        if self.sampler is not None:
+            self.sampler.boost()
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.frame_count != after_count or self.stopped.is_set(), timeout
+            )
+            if self.frame_count == after_count or self.frame is None:
+                return after_count, None
+            return self.frame_count, self.frame
+
+    def has_fresh_frame(self, max_age):
+        return self.frame is not None and time.monotonic() - self.frame_time <= max_age
+
+    def is_current(self):
+        # Every decoded frame is a new array, so frames handed out are
+        # never overwritten
+        return True
+
+    def close(self):
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+
+
+class CapturePool:
+    """
+    Pool of warm capture handles keyed by stream URL, shared by thumbnails,
+    status checks and detectors.
+
+    At most ``max_streams`` streams, plus the streams reserved by long-lived
+    readers such as detectors, are kept open (least recently used is
+    evicted first) and streams that nobody asked a frame from for
+    ``idle_timeout`` seconds are closed by a janitor thread. A
+    ``sampler_factory`` gives every stream its own AdaptiveSampler.
+    """
+
+    def __init__(self, max_streams=None, idle_timeout=None, backoff_base=None,
+                 backoff_max=None, capture_factory=cv2.VideoCapture, sampler_factory=None):
+        self.max_streams = max_streams or settings.CAPTURE_POOL_MAX_STREAMS
+        self.idle_timeout = idle_timeout or settings.CAPTURE_POOL_IDLE_TIMEOUT
+        self.backoff_base = backoff_base or settings.CAPTURE_POOL_BACKOFF_BASE
+        self.backoff_max = backoff_max or settings.CAPTURE_POOL_BACKOFF_MAX
+        self.capture_factory = capture_factory
+        self.sampler_factory = sampler_factory
+
+        self.lock = threading.Lock()
+        self.streams = OrderedDict()
+        self.reservations = {}
+
+        self.stopped = threading.Event()
+        self.janitor = threading.Thread(target=self._evict_idle_forever, daemon=True)
+        self.janitor.start()
+
+    def acquire(self, url):
+        """
+        Return the warm capture for ``url``, opening it if needed
+        """
+        evicted = []
+        with self.lock:
+            stream = self.streams.get(url)
+            if stream is not None:
+                self.streams.move_to_end(url)
+            else:
+                while len(self.streams) >= self.max_streams + sum(self.reservations.values()):
+                    _, oldest = self.streams.popitem(last=False)
+                    evicted.append(oldest)
+                sampler = self.sampler_factory() if self.sampler_factory else None
+                stream = PooledCapture(
+                    url, self.capture_factory, self.backoff_base, self.backoff_max, sampler
+                )
+                self.streams[url] = stream
+            stream.last_used = time.monotonic()
+
+        for oldest in evicted:
+            oldest.close()
+        return stream
+
+    def reserve(self, owner, count):
+        """
+        Make room for ``count`` streams of ``owner`` on top of
+        ``max_streams``, so a reader cycling through more streams than that
+        does not evict its own streams on every pass
+        """
+        with self.lock:
+            if count:
+                self.reservations[owner] = count
+            else:
+                self.reservations.pop(owner, None)
+
+    def latest_frame(self, url, timeout=5, max_age=None):
+        """
+        Return the latest frame of ``url`` (or None if none arrived in time)
+        """
+        return self.acquire(url).latest_frame(timeout=timeout, max_age=max_age)
+
+    def has_fresh_frame(self, url, max_age=5):
+        """
+        Whether an already open stream produced a frame in the last ``max_age``
+        seconds, without opening anything
+        """
+        with self.lock:
+            stream = self.streams.get(url)
+        return stream is not None and stream.has_fresh_frame(max_age)
+
+    def release(self, url):
+        with self.lock:
+            stream = self.streams.pop(url, None)
+        if stream is not None:
+            stream.close()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self.lock:
+            idle = [
+                url for url, stream in self.streams.items()
+                if now - stream.last_used > self.idle_timeout
+            ]
+            evicted = [self.streams.pop(url) for url in idle]
+        for stream in evicted:
+            stream.close()
+        return len(evicted)
+
+    def _evict_idle_forever(self):
+        while not self.stopped.wait(min(self.idle_timeout, 10)):
+            self.evict_idle()
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                url: dict(
+                    frames=stream.frame_count,
+                    failures=stream.failures,
+                    idle=time.monotonic() - stream.last_used,
+                    **(stream.sampler.stats() if stream.sampler else {})
+                )
+                for url, stream in self.streams.items()
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_capture_pool():
+    """
+    Return the process-wide capture pool, creating it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CapturePool()
+        return _pool
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from django.conf import settings
+from alerts.models import Alert
+from alerts.writer import get_alert_writer
+
+# Frames are encoded and clips written by background threads, off the
+# detection path. One encoder thread keeps every camera's frames in order.
+_encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='clip-encoder')
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='clip-writer')
+# Clips handed to the writer and not written yet, across all recorders
+_writes_queued = 0
+_writes_lock = threading.Lock()
+# Codecs this OpenCV build cannot encode, so they are not retried per clip
+_unsupported_fourccs = set()
+
+
+class EncodedFrameRing:
+    """
+    Ring of (timestamp, JPEG bytes) covering the last ``seconds`` seconds,
+    never holding more than ``max_bytes`` of encoded data
+    """
+
+    def __init__(self, seconds, max_bytes):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.size = 0
+
+    def append(self, timestamp, data):
+        self.frames.append((timestamp, data))
+        self.size += len(data)
+        while self.frames and (
+            self.size > self.max_bytes or timestamp - self.frames[0][0] > self.seconds
+        ):
+            _, old = self.frames.popleft()
+            self.size -= len(old)
+
+    def snapshot(self):
+        return list(self.frames)
+
+
+class PendingClip:
+    def __init__(self, alert, frames, deadline, max_bytes):
+        # Alerts rather than ids: batched alerts only get their id once written
+        self.alerts = [alert]
+        self.frames = frames
+        self.deadline = deadline
+        self.max_bytes = max_bytes
+        self.size = sum(len(data) for _, data in frames)
+
+    def append(self, timestamp, data):
+        if self.size + len(data) <= self.max_bytes:
+            self.frames.append((timestamp, data))
+            self.size += len(data)
+
+
+class ClipRecorder:
+    """
+    Keeps the last ``pre_seconds`` of a camera's frames JPEG-encoded in
+    memory. When an alert fires, those frames plus the next
+    ``post_seconds`` are written to ``MEDIA_ROOT/alert_clips`` in the
+    background and stored on the alert.
+
+    Memory is bounded by ``max_bytes`` for the ring plus ``2 * max_bytes``
+    for the one clip that may be collecting post-event frames; alerts that
+    fire while a clip is collecting share that clip.
+
+    Frames are only scaled down to the clip width by the caller; JPEG
+    encoding happens on the encoder thread. At most ``max_queued`` frames
+    wait to be encoded, later ones are dropped until it catches up.
+    """
+
+    def __init__(self, pre_seconds=None, post_seconds=None, max_bytes=None, width=None, quality=None,
+                 max_queued=None):
+        self.pre_seconds = pre_seconds or settings.ALERT_CLIP_PRE_SECONDS
+        self.post_seconds = post_seconds or settings.ALERT_CLIP_POST_SECONDS
+        self.max_bytes = max_bytes or settings.ALERT_CLIP_MAX_BYTES
+        self.width = width or settings.ALERT_CLIP_WIDTH
+        self.quality = quality or settings.ALERT_CLIP_QUALITY
+        self.max_queued = max_queued or settings.ALERT_CLIP_ENCODE_QUEUE
+
+        self.ring = EncodedFrameRing(self.pre_seconds, self.max_bytes)
+        self.pending = []
+        self.queued = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def shrink(self, frame):
+        """
+        A private copy of the frame at the clip width, so the caller's frame
+        may be reused while it waits to be encoded
+        """
+        height, width = frame.shape[:2]
+        if width > self.width:
+            size = (self.width, max(1, round(height * self.width / width)))
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame.copy()
+
+    def encode(self, frame):
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return data.tobytes() if ok else None
+
+    def add_frame(self, frame, timestamp=None):
+        """
+        Queue a frame to be encoded into the ring (and any clip still
+        collecting frames). Returns the Future of the encode, whose result
+        is the list of clip writes it started, or None if it was dropped.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            if self.queued >= self.max_queued:
+                self.dropped += 1
+                return None
+            self.queued += 1
+        return _encoder.submit(self._add_encoded, self.shrink(frame), timestamp)
+
+    def _add_encoded(self, frame, timestamp):
+        try:
+            data = self.encode(frame)
+        finally:
+            with self.lock:
+                self.queued -= 1
+        if data is None:
+            return []
+        with self.lock:
+            self.ring.append(timestamp, data)
+            for clip in self.pending:
+                clip.append(timestamp, data)
+        return self.flush_expired(timestamp)
+
+    def trigger(self, alert, timestamp=None):
+        """
+        Start a clip for the alert from the frames in the ring, once the
+        frames queued before it are encoded
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        return _encoder.submit(self._trigger, alert, timestamp)
+
+    def _trigger(self, alert, timestamp):
+        with self.lock:
+            if self.pending:
+                self.pending[-1].alerts.append(alert)
+                return
+            clip = PendingClip(
+                alert, self.ring.snapshot(), timestamp + self.post_seconds, self.max_bytes * 2
+            )
+            self.pending.append(clip)
+
+    def flush_expired(self, timestamp=None):
+        """
+        Hand the clips whose post-event window is over to the writer thread
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            done = [clip for clip in self.pending if clip.deadline <= timestamp]
+            self.pending = [clip for clip in self.pending if clip.deadline > timestamp]
+        futures = [submit_clip(clip.alerts, clip.frames) for clip in done]
+        return [future for future in futures if future is not None]
+
+    def close(self):
+        """
+        Write every pending clip once the frames queued so far are encoded
+        """
+        return _encoder.submit(self.flush_expired, float('inf'))
+
+
+def submit_clip(alerts, frames):
+    """
+    Queue a clip for the writer thread. Returns its Future, or None if
+    ALERT_CLIP_WRITE_QUEUE clips are already waiting and it was dropped.
+    """
+    global _writes_queued
+    with _writes_lock:
+        if _writes_queued >= settings.ALERT_CLIP_WRITE_QUEUE:
+            print(f"Error writing clip for camera {alerts[0].camera_id}: {_writes_queued} clips already queued")
+            return None
+        _writes_queued += 1
+    return _writer.submit(_write_queued_clip, alerts, frames)
+
+
+def _write_queued_clip(alerts, frames):
+    global _writes_queued
+    try:
+        return write_clip(alerts, frames)
+    finally:
+        with _writes_lock:
+            _writes_queued -= 1
+
+
+def open_clip_writer(path, fps, size):
+    """
+    Open a VideoWriter with the first of ALERT_CLIP_FOURCCS this OpenCV
+    build can encode, or return None if there is none
+    """
+    failed = []
+    for code in settings.ALERT_CLIP_FOURCCS:
+        if code in _unsupported_fourccs:
+            continue
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*code), fps, size)
+        if writer.isOpened():
+            # Only now is it the codec rather than, say, the path at fault
+            _unsupported_fourccs.update(failed)
+            return writer
+        writer.release()
+        failed.append(code)
+    return None
+
+
+def write_clip(alerts, frames):
+    """
+    Write JPEG frames to an MP4 clip and attach it to the alerts
+    """
+    if not frames:
+        return None
+    if any(alert.id is None for alert in alerts):
+        get_alert_writer().flush(timeout=settings.ALERT_CLIP_POST_SECONDS)
+    alert_ids = [alert.id for alert in alerts if alert.id is not None]
+    if not alert_ids:
+        return None
+    try:
+        first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if duration > 0 else 1.0
+
+        relative_path = os.path.join('alert_clips', f"{alert_ids[0]}.mp4")
+        path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        writer = open_clip_writer(path, fps, (width, height))
+        if writer is None:
+            print(f"Error writing clip for alerts {alert_ids}: none of {settings.ALERT_CLIP_FOURCCS} can be encoded")
+            return None
+        for _, data in frames:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height))
+            writer.write(frame)
+        writer.release()
+
+        Alert.objects.filter(id__in=alert_ids).update(clip=relative_path)
+        return relative_path
+    except Exception as e:
+        print(f"Error writing clip for alerts {alert_ids}: {e}")
+        return None
@@ -0,0 +1,161 @@
+import asyncio
+import ipaddress
+import time
+from django.conf import settings
+from .probe import FleetProber
+
+# Ports cameras and NVRs usually serve RTSP, web UIs and ONVIF on
+DISCOVERY_PORTS = (554, 80, 8080, 8000)
+RTSP_PORTS = {554}
+
+
+def expand_cidr(cidr, max_hosts=None):
+    """
+    Return the host addresses of a CIDR range as strings, refusing ranges
+    larger than ``max_hosts`` and anything but private or link-local ones
+    """
+    max_hosts = max_hosts or settings.DISCOVERY_MAX_HOSTS
+    network = ipaddress.ip_network(cidr, strict=False)
+    if not (network.is_private or network.is_link_local):
+        raise ValueError(f"{cidr} is not a private or link-local network")
+    if network.num_addresses > max_hosts + 2:
+        raise ValueError(f"{cidr} has more than {max_hosts} hosts")
+    hosts = list(network.hosts()) or [network.network_address]
+    return [str(host) for host in hosts]
+
+
+# Bytes of an HTTP response read to tell an ONVIF device service apart
+ONVIF_RESPONSE_BYTES = 4096
+ONVIF_CONTENT_TYPES = ('soap', 'xml')
+
+
+async def _exchange(host, port, request, timeout, limit=0):
+    """
+    Send a request and return the first response line plus up to ``limit``
+    bytes of what follows it (('', b'') on failure)
+    """
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return '', b''
+    try:
+        writer.write(request.encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        rest = b''
+        while len(rest) < limit:
+            chunk = await asyncio.wait_for(reader.read(limit - len(rest)), timeout)
+            if not chunk:
+                break
+            rest += chunk
+        return line.decode(errors='replace').strip(), rest
+    except (asyncio.TimeoutError, OSError):
+        return '', b''
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+def is_onvif_response(status_line, rest):
+    """
+    Whether an answer to GET /onvif/device_service comes from an ONVIF
+    device service: a SOAP/XML document, or the SOAP fault a service
+    answers a GET with. Login pages and redirects (401, 403, 3xx) of
+    ordinary web UIs are not.
+    """
+    parts = status_line.split()
+    if len(parts) < 2 or parts[1] not in ('200', '400', '405', '500'):
+        return False
+    head, _, body = rest.partition(b'\r\n\r\n')
+    content_type = ''
+    for header in head.decode('latin-1').split('\r\n'):
+        name, _, value = header.partition(':')
+        if name.strip().lower() == 'content-type':
+            content_type = value.strip().lower()
+    if parts[1] == '200':
+        return any(kind in content_type for kind in ONVIF_CONTENT_TYPES)
+    return b'Envelope' in body or b'Fault' in body
+
+
+async def classify(host, port, timeout, rtsp_ports=RTSP_PORTS):
+    """
+    Return the kinds of camera service an open port looks like. RTSP ports
+    get an RTSP OPTIONS and are 'rtsp' candidates unless an HTTP server
+    answers; other ports get an HTTP request for the ONVIF device service
+    and are 'http' when an HTTP server answers, plus 'onvif' when that
+    service answers it (see is_onvif_response).
+    """
+    if port in rtsp_ports:
+        line, _ = await _exchange(host, port, f"OPTIONS rtsp://{host}:{port}/ RTSP/1.0\r\nCSeq: 1\r\n\r\n", timeout)
+        return ['http'] if line.startswith('HTTP/') else ['rtsp']
+
+    line, rest = await _exchange(
+        host, port,
+        f"GET /onvif/device_service HTTP/1.0\r\nHost: {host}:{port}\r\n\r\n",
+        timeout, limit=ONVIF_RESPONSE_BYTES,
+    )
+    if line.startswith('RTSP/'):
+        return ['rtsp']
+    if not line.startswith('HTTP/'):
+        return []
+    kinds = ['http']
+    if is_onvif_response(line, rest):
+        kinds.append('onvif')
+    return kinds
+
+
+async def discover(cidr, ports=DISCOVERY_PORTS, concurrency=None, timeout=None, rtsp_ports=RTSP_PORTS):
+    """
+    Scan a CIDR range for cameras, yielding a result dict for every host
+    with an open camera port as soon as that host is done, then a summary.
+
+    All connection attempts share a ``concurrency`` cap and each one is
+    bounded by ``timeout`` seconds.
+    """
+    concurrency = concurrency or settings.DISCOVERY_CONCURRENCY
+    timeout = timeout or settings.DISCOVERY_TIMEOUT
+    hosts = expand_cidr(cidr)
+    prober = FleetProber(concurrency=concurrency, timeout=timeout)
+    limit = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def scan_port(host, port):
+        async with limit:
+            result = await prober.probe(host, port)
+            if not result.is_reachable:
+                return None
+            return port, result.latency, await classify(host, port, timeout, rtsp_ports)
+
+    async def scan_host(host):
+        found = [item for item in await asyncio.gather(*(scan_port(host, port) for port in ports)) if item]
+        if not found:
+            return None
+        kinds = sorted({kind for _, _, port_kinds in found for kind in port_kinds})
+        return {
+            'host': host,
+            'open_ports': sorted(port for port, _, _ in found),
+            'kinds': kinds,
+            'latency': min(latency for _, latency, _ in found),
+        }
+
+    tasks = [asyncio.ensure_future(scan_host(host)) for host in hosts]
+    found = 0
+    try:
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            if result is not None:
+                found += 1
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        'done': True,
+        'scanned': len(hosts),
+        'found': found,
+        'elapsed': time.monotonic() - started,
+    }
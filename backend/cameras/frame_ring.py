@@ -0,0 +1,240 @@
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# Per-slot metadata: sequence number and capture time in nanoseconds
+META_FIELDS = 2
+HEADER_BYTES = 64
+
+
+class SharedFrameRing:
+    """
+    Fixed-slot ring of frames in shared memory, written by one producer
+    process and read by any number of consumer processes without copying.
+
+    The block starts with the sequence number of the newest frame, followed
+    by per-slot metadata and the frame slots. Frame ``seq`` (counting from
+    1) lives in slot ``seq % slots``. The producer clears a slot's sequence
+    number while it overwrites the pixels and sets it back once the frame
+    is complete, so a consumer can tell a slot has been reused by checking
+    ``is_current(seq)`` after it is done with a view.
+    """
+
+    def __init__(self, name=None, shape=(1080, 1920, 3), slots=8, dtype=np.uint8, create=False):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        meta_bytes = slots * META_FIELDS * 8
+        size = HEADER_BYTES + meta_bytes + slots * frame_bytes
+
+        # Consumers are expected to be started by the creating process, so
+        # they share its resource tracker and only the creator unlinks
+        self.owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+
+        # np.asarray keeps an export of the buffer as the base of every view
+        # taken from it, so closing the mapping fails with BufferError while
+        # a frame is still in use instead of pulling the memory from under it
+        raw = np.asarray(self.shm.buf)
+        self.head = raw[:8].view(np.uint64)
+        self.meta = raw[HEADER_BYTES:HEADER_BYTES + meta_bytes].view(np.uint64).reshape(slots, META_FIELDS)
+        frames_start = HEADER_BYTES + meta_bytes
+        self.frames = raw[frames_start:frames_start + slots * frame_bytes].view(self.dtype).reshape(
+            (slots,) + self.shape
+        )
+        if create:
+            self.head[0] = 0
+            self.meta[:] = 0
+
+    @classmethod
+    def create(cls, shape, slots=8, dtype=np.uint8, name=None):
+        return cls(name=name, shape=shape, slots=slots, dtype=dtype, create=True)
+
+    @classmethod
+    def attach(cls, name, shape, slots=8, dtype=np.uint8):
+        return cls(name=name, shape=shape, slots=slots, dtype=dtype, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, frame, timestamp=None):
+        """
+        Copy a frame into the next slot and return its sequence number
+        """
+        seq = int(self.head[0]) + 1
+        slot = seq % self.slots
+        self.meta[slot, 0] = 0
+        self.frames[slot] = frame
+        self.meta[slot, 1] = timestamp if timestamp is not None else time.time_ns()
+        self.meta[slot, 0] = seq
+        self.head[0] = seq
+        return seq
+
+    def latest_seq(self):
+        return int(self.head[0])
+
+    def read(self, seq):
+        """
+        Return a read-only view of frame ``seq``, or None if it was never
+        written or its slot has been reused
+        """
+        slot = seq % self.slots
+        if seq <= 0 or int(self.meta[slot, 0]) != seq:
+            return None
+        view = self.frames[slot]
+        view.flags.writeable = False
+        return view
+
+    def read_latest(self):
+        """
+        Return (seq, read-only view) of the newest frame, or (0, None)
+        """
+        seq = self.latest_seq()
+        return seq, self.read(seq)
+
+    def timestamp(self, seq):
+        slot = seq % self.slots
+        if int(self.meta[slot, 0]) != seq:
+            return None
+        return int(self.meta[slot, 1])
+
+    def is_current(self, seq):
+        """
+        Whether the slot of frame ``seq`` still holds that frame
+        """
+        return seq > 0 and int(self.meta[seq % self.slots, 0]) == seq
+
+    def close(self):
+        """
+        Unmap the ring (and remove it, in the creating process). Raises
+        BufferError while views returned by read() are alive; it can be
+        called again once they are gone.
+        """
+        # Our own views into the buffer must be gone before the mapping is closed
+        self.head = self.meta = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingStream:
+    """
+    The newest frames of one stream as published through a SharedFrameRing,
+    read through the same attributes as a PooledCapture (frame_count,
+    frame_time, latest_frame) so the analysis loop can use either.
+    """
+
+    def __init__(self, ring=None):
+        self.ring = ring
+        self.seq = 0
+
+    @property
+    def frame_count(self):
+        return self.ring.latest_seq() if self.ring is not None else 0
+
+    @property
+    def frame_time(self):
+        # Producers stamp frames with time.monotonic_ns(), which every
+        # process on the host shares
+        if self.ring is None:
+            return 0
+        timestamp = self.ring.timestamp(self.ring.latest_seq())
+        return timestamp / 1e9 if timestamp is not None else 0
+
+    def latest_frame(self, timeout=0, max_age=None):
+        """
+        Return a read-only view of the newest frame, or None
+        """
+        if self.ring is None:
+            return None
+        self.seq, frame = self.ring.read_latest()
+        return frame
+
+    def is_current(self):
+        """
+        Whether the frame last returned by latest_frame has not been
+        overwritten since
+        """
+        return self.ring is not None and self.ring.is_current(self.seq)
+
+
+class RingFrameSource:
+    """
+    Consumer side of a capture process: attaches to the rings it announces
+    on ``announcements`` and hands out RingStreams by stream URL, standing
+    in for a CapturePool in the analysis process.
+
+    The producer sends ('ring', url, name, shape, slots) when it creates a
+    ring for a stream (again whenever the frame size changes),
+    ('closed', url) when it stops publishing one, and ('stats', stats)
+    with its capture pool statistics.
+
+    A ring cannot be unmapped while a frame view read from it is still
+    alive; such rings are kept in ``closing`` and closed by a later poll.
+    """
+
+    def __init__(self, announcements):
+        self.announcements = announcements
+        self.streams = {}
+        self.closing = []
+        self.capture_stats = {}
+
+    def poll(self):
+        """
+        Close the rings whose frames are no longer in use and apply the
+        announcements received since the last call
+        """
+        closing, self.closing = self.closing, []
+        for ring in closing:
+            self._close_ring(ring)
+        while True:
+            try:
+                message = self.announcements.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == 'ring':
+                _, url, name, shape, slots = message
+                self.release(url)
+                try:
+                    self.streams[url] = RingStream(SharedFrameRing.attach(name, shape, slots))
+                except FileNotFoundError:
+                    # Already replaced by the producer; a newer one follows
+                    pass
+            elif message[0] == 'closed':
+                self.release(message[1])
+            elif message[0] == 'stats':
+                self.capture_stats = message[1]
+
+    def reserve(self, owner, count):
+        # Rings are announced by the producer; there is nothing to evict
+        pass
+
+    def acquire(self, url):
+        stream = self.streams.get(url)
+        return stream if stream is not None else RingStream()
+
+    def release(self, url):
+        stream = self.streams.pop(url, None)
+        if stream is not None:
+            # Anyone still holding the stream sees an empty one from now on
+            ring, stream.ring = stream.ring, None
+            self._close_ring(ring)
+
+    def _close_ring(self, ring):
+        try:
+            ring.close()
+        except BufferError:
+            self.closing.append(ring)
+
+    def close(self):
+        for url in list(self.streams):
+            self.release(url)
+        if self.closing:
+            print(f"Error detaching {len(self.closing)} frame rings: frames read from them are still in use")
+
+    def stats(self):
+        return self.capture_stats
@@ -0,0 +1,335 @@
+import multiprocessing
+import queue
+import time
+
+# This module is the entry point of spawned worker processes, so anything
+# touching Django models is imported only after django.setup() has run.
+
+
+def latest_command(commands):
+    """
+    The newest command waiting on a worker's queue, or None
+    """
+    command = None
+    try:
+        while True:
+            command = commands.get_nowait()
+    except queue.Empty:
+        pass
+    return command
+
+
+def capture_main(index, fps, commands, frames, report_interval):
+    """
+    Entry point of a capture process: decodes the streams of its shard and
+    publishes the newest frame of every camera, at most ``fps`` times per
+    second, into one SharedFrameRing per stream for the analysis process
+    """
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from .capture_pool import CapturePool
+    from .frame_ring import SharedFrameRing
+    from .models import Camera
+    from .sampling import AdaptiveSampler
+    from .validators import get_stream_url
+
+    pool = CapturePool(sampler_factory=AdaptiveSampler if settings.SAMPLING_ENABLED else None)
+    rings = {}
+    published = {}
+    urls = set()
+    interval = 1.0 / fps
+    last_report = 0
+
+    def close_ring(url):
+        ring = rings.pop(url, None)
+        published.pop(url, None)
+        if ring is not None:
+            frames.put(('closed', url))
+            ring.close()
+
+    while True:
+        assignment = latest_command(commands)
+        if assignment == 'stop':
+            break
+        if assignment is not None:
+            urls = {get_stream_url(camera) for camera in Camera.objects.filter(id__in=assignment)}
+            # The whole shard is read every tick, however large it is
+            pool.reserve('shard', len(urls))
+            for url in list(pool.streams):
+                if url not in urls:
+                    pool.release(url)
+            for url in list(rings):
+                if url not in urls:
+                    close_ring(url)
+
+        started = time.monotonic()
+        for url in urls:
+            stream = pool.acquire(url)
+            frame_count = stream.frame_count
+            if frame_count == published.get(url):
+                continue
+            frame = stream.latest_frame(timeout=0)
+            if frame is None:
+                continue
+            ring = rings.get(url)
+            if ring is None or ring.shape != frame.shape:
+                close_ring(url)
+                ring = rings[url] = SharedFrameRing.create(frame.shape, settings.INGEST_RING_SLOTS, frame.dtype)
+                frames.put(('ring', url, ring.name, ring.shape, ring.slots))
+            ring.write(frame, timestamp=int(stream.frame_time * 1e9))
+            published[url] = frame_count
+
+        if started - last_report >= report_interval:
+            last_report = started
+            frames.put(('stats', pool.stats()))
+
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+    pool.close()
+    for url in list(rings):
+        close_ring(url)
+
+
+def worker_main(index, fps, commands, frames, reports, report_interval):
+    """
+    Entry point of an analysis process: runs the analytics of its shard on
+    the frames its capture process publishes
+    """
+    import django
+    django.setup()
+
+    from alerts.coalescing import get_alert_coalescer
+    from alerts.writer import get_alert_writer
+    from .frame_ring import RingFrameSource
+    from .models import Camera
+    from .motion import MotionMonitor
+
+    source = RingFrameSource(frames)
+    monitor = MotionMonitor(fps=fps, refresh_interval=None, pool=source)
+    interval = 1.0 / fps
+    last_report = 0
+
+    while True:
+        # Apply the latest assignment from the scheduler
+        assignment = latest_command(commands)
+        if assignment == 'stop':
+            break
+        if assignment is not None:
+            monitor.set_cameras(Camera.objects.filter(id__in=assignment))
+
+        started = time.monotonic()
+        source.poll()
+        monitor.tick()
+        elapsed = time.monotonic() - started
+        monitor.overrun = max(0.0, elapsed - interval)
+
+        if started - last_report >= report_interval:
+            last_report = started
+            reports.put((index, monitor.stats()))
+
+        time.sleep(max(0, interval - elapsed))
+
+    source.close()
+    # Write buffered alerts, then the latest counts of open episodes,
+    # before the process goes away
+    get_alert_writer().close()
+    get_alert_coalescer().close()
+
+
+class IngestScheduler:
+    """
+    Shards the online cameras with analytics enabled across a pool of
+    workers so decode and analysis are not bound to one GIL. Every worker
+    is a pair of processes: one decoding the streams of its shard and one
+    analysing them, handing frames over through shared-memory rings
+    instead of pickling them.
+
+    Every ``rebalance_interval`` seconds the camera set is reloaded: cameras
+    that were removed or went offline are dropped from their worker, new
+    ones go to the least loaded worker, and cameras move from the most to
+    the least loaded worker until the shard sizes differ by at most one.
+    Cameras otherwise stay on their worker, so their warm streams survive a
+    rebalance. Workers whose cameras were edited since the last rebalance
+    (zones, stages, detection switches) are sent their shard again so they
+    reload the camera rows. Dead workers are restarted with their shard.
+    """
+
+    def __init__(self, workers=None, fps=None, rebalance_interval=30, report_interval=5):
+        from django.conf import settings
+
+        self.worker_count = workers or settings.INGEST_WORKERS or multiprocessing.cpu_count()
+        self.fps = fps or settings.INGEST_MAX_FPS
+        self.rebalance_interval = rebalance_interval
+        self.report_interval = report_interval
+
+        self.context = multiprocessing.get_context('spawn')
+        self.reports = self.context.Queue()
+        self.processes = [None] * self.worker_count
+        self.commands = [None] * self.worker_count
+        self.captures = [None] * self.worker_count
+        self.capture_commands = [None] * self.worker_count
+        self.frames = [None] * self.worker_count
+        self.assignment = {}
+        self.versions = {}
+        self.reports_by_worker = {}
+
+    def start_worker(self, index):
+        # The two processes of a worker share their frame rings, so they
+        # are always restarted together
+        for process in (self.processes[index], self.captures[index]):
+            if process is not None and process.is_alive():
+                process.terminate()
+                process.join(timeout=5)
+
+        frames = self.context.Queue()
+        commands = self.context.Queue()
+        capture_commands = self.context.Queue()
+        capture = self.context.Process(
+            target=capture_main,
+            args=(index, self.fps, capture_commands, frames, self.report_interval),
+            daemon=True,
+        )
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.fps, commands, frames, self.reports, self.report_interval),
+            daemon=True,
+        )
+        capture.start()
+        process.start()
+        self.processes[index] = process
+        self.commands[index] = commands
+        self.captures[index] = capture
+        self.capture_commands[index] = capture_commands
+        # Spawned children open the queue after start() returns
+        self.frames[index] = frames
+
+    def alive(self, index):
+        return all(
+            process is not None and process.is_alive()
+            for process in (self.processes[index], self.captures[index])
+        )
+
+    def shards(self):
+        shards = [set() for _ in range(self.worker_count)]
+        for camera_id, index in self.assignment.items():
+            shards[index].add(camera_id)
+        return shards
+
+    def rebalance(self, camera_ids):
+        """
+        Update the camera -> worker assignment for the current camera set and
+        return the indexes of the workers whose shard changed
+        """
+        before = self.shards()
+        camera_ids = set(camera_ids)
+
+        for camera_id in list(self.assignment):
+            if camera_id not in camera_ids:
+                del self.assignment[camera_id]
+
+        shards = self.shards()
+        for camera_id in sorted(camera_ids - set(self.assignment)):
+            index = min(range(self.worker_count), key=lambda i: len(shards[i]))
+            shards[index].add(camera_id)
+            self.assignment[camera_id] = index
+
+        while True:
+            largest = max(range(self.worker_count), key=lambda i: len(shards[i]))
+            smallest = min(range(self.worker_count), key=lambda i: len(shards[i]))
+            if len(shards[largest]) - len(shards[smallest]) <= 1:
+                break
+            camera_id = shards[largest].pop()
+            shards[smallest].add(camera_id)
+            self.assignment[camera_id] = smallest
+
+        return [index for index in range(self.worker_count) if shards[index] != before[index]]
+
+    def online_cameras(self):
+        """
+        camera id -> last update time of the cameras to analyse
+        """
+        from .pipeline import analytics_cameras
+        return dict(analytics_cameras().values_list('id', 'updated_at'))
+
+    def edited(self, versions):
+        """
+        Remember the cameras' update times and return the indexes of the
+        workers holding a camera edited since the last call
+        """
+        changed = {
+            self.assignment[camera_id] for camera_id, updated_at in versions.items()
+            if camera_id in self.versions and self.versions[camera_id] != updated_at
+            and camera_id in self.assignment
+        }
+        self.versions = versions
+        return changed
+
+    def tick(self):
+        """
+        Restart dead workers, rebalance and send out the changed shards
+        """
+        restarted = []
+        for index in range(self.worker_count):
+            if not self.alive(index):
+                self.start_worker(index)
+                restarted.append(index)
+
+        versions = self.online_cameras()
+        changed = set(self.rebalance(versions)) | self.edited(versions) | set(restarted)
+        shards = self.shards()
+        for index in changed:
+            self.capture_commands[index].put(sorted(shards[index]))
+            self.commands[index].put(sorted(shards[index]))
+
+    def collect_reports(self, timeout):
+        """
+        Gather worker reports for up to ``timeout`` seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                index, report = self.reports.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self.reports_by_worker[index] = report
+        return self.reports_by_worker
+
+    def worker_lag(self):
+        """
+        Per-worker summary: cameras, worst frame age, dropped frames, overrun,
+        mean effective analysis fps, the share of frames never decoded and
+        the pixels the detectors analysed
+        """
+        summary = {}
+        for index, report in sorted(self.reports_by_worker.items()):
+            cameras = report['cameras'].values()
+            lags = [camera['lag'] for camera in cameras if camera['lag'] is not None]
+            rates = [camera['effective_fps'] for camera in cameras if camera['effective_fps'] is not None]
+            grabbed = sum(camera['grabbed'] or 0 for camera in cameras)
+            decoded = sum(camera['decoded'] or 0 for camera in cameras)
+            summary[index] = {
+                'cameras': len(report['cameras']),
+                'max_lag': max(lags) if lags else None,
+                'dropped': sum(camera['dropped'] for camera in cameras),
+                'overrun': report['overrun'],
+                'effective_fps': sum(rates) / len(rates) if rates else None,
+                'decode_saved': 1 - decoded / grabbed if grabbed else None,
+                'pixels_analysed': sum(camera['pixels_analysed'] for camera in cameras),
+            }
+        return summary
+
+    def stop(self):
+        for processes, commands in ((self.processes, self.commands), (self.captures, self.capture_commands)):
+            for index, process in enumerate(processes):
+                if process is not None and process.is_alive():
+                    commands[index].put('stop')
+        for process in self.processes + self.captures:
+            if process is not None:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import cv2
+from django.conf import settings
+from .capture_pool import get_capture_pool
+
+BOUNDARY = 'frame'
+
+
+class LiveBroadcast:
+    """
+    Fans one camera stream out to any number of live preview viewers.
+
+    A single thread takes frames from the capture pool (one upstream
+    session per camera), JPEG-encodes each frame once and publishes the
+    bytes. Viewers only ever see the newest frame: one that is still busy
+    sending when the next frame arrives skips to it instead of building up
+    a backlog.
+    """
+
+    def __init__(self, url, pool, width=None, quality=None):
+        self.url = url
+        self.pool = pool
+        self.width = width if width is not None else settings.LIVE_PREVIEW_WIDTH
+        self.quality = quality or settings.LIVE_PREVIEW_QUALITY
+
+        self.lock = threading.Lock()
+        self.viewers = {}
+        self.seq = 0
+        self.jpeg = None
+        self.encoded = 0
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        frame_count = 0
+        while not self.stopped.is_set():
+            stream = self.pool.acquire(self.url)
+            frame_count, frame = stream.wait_for_frame(frame_count, timeout=1)
+            if frame is None or self.stopped.is_set():
+                continue
+            data = self.encode(frame)
+            if data is not None:
+                self.publish(data)
+
+    def encode(self, frame):
+        height, width = frame.shape[:2]
+        if self.width and width > self.width:
+            size = (self.width, max(1, round(height * self.width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return None
+        self.encoded += 1
+        return data.tobytes()
+
+    def publish(self, data):
+        with self.lock:
+            self.seq += 1
+            self.jpeg = data
+            viewers = list(self.viewers.values())
+        for loop, event in viewers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The viewer's event loop is gone
+                pass
+
+    def latest(self):
+        with self.lock:
+            return self.seq, self.jpeg
+
+    def add_viewer(self, key, loop, event):
+        with self.lock:
+            self.viewers[key] = (loop, event)
+
+    def remove_viewer(self, key):
+        with self.lock:
+            self.viewers.pop(key, None)
+            return len(self.viewers)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class LiveHub:
+    """
+    Registry of the live broadcasts of this process, one per stream URL.
+    A broadcast starts with its first viewer and stops when the last viewer
+    leaves. Its upstream capture is shared through the capture pool with
+    thumbnails, status checks and detectors, so it is left to the pool's
+    idle eviction rather than closed.
+    """
+
+    def __init__(self, pool=None, heartbeat=None):
+        self.pool = pool
+        self.heartbeat = heartbeat or settings.LIVE_PREVIEW_HEARTBEAT
+        self.lock = threading.Lock()
+        self.broadcasts = {}
+
+    def subscribe(self, url, key, loop, event):
+        with self.lock:
+            broadcast = self.broadcasts.get(url)
+            if broadcast is None:
+                pool = self.pool or get_capture_pool()
+                broadcast = self.broadcasts[url] = LiveBroadcast(url, pool)
+            broadcast.add_viewer(key, loop, event)
+        return broadcast
+
+    def unsubscribe(self, url, key):
+        with self.lock:
+            broadcast = self.broadcasts.get(url)
+            if broadcast is None or broadcast.remove_viewer(key):
+                return
+            del self.broadcasts[url]
+        broadcast.stop()
+
+    async def stream(self, url):
+        """
+        Async iterator of multipart MJPEG parts for one viewer. When no new
+        frame arrives for ``heartbeat`` seconds the last one is sent again:
+        only a failing write tells the server that the viewer is gone, and
+        the viewer would otherwise hold the broadcast open for as long as
+        the camera is stalled.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        key = object()
+        broadcast = self.subscribe(url, key, loop, event)
+        last_seq = 0
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(event.wait(), self.heartbeat)
+                    fresh = True
+                except asyncio.TimeoutError:
+                    fresh = False
+                event.clear()
+                seq, data = broadcast.latest()
+                if data is None or (fresh and seq == last_seq):
+                    continue
+                last_seq = seq
+                yield (
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n"
+                ).encode() + data + b"\r\n"
+        finally:
+            self.unsubscribe(url, key)
+
+
+live_hub = LiveHub()
@@ -0,0 +1,61 @@
+import json
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from cameras.benchmark import SCENARIOS, compare_reports, run_suite
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the capture -> preprocess -> detect path on synthetic videos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help='Comma separated scenarios')
+        parser.add_argument('--resolutions', default='640x360,1280x720,1920x1080',
+                            help='Comma separated WIDTHxHEIGHT sizes')
+        parser.add_argument('--frames', type=int, default=90, help='Frames per video')
+        parser.add_argument('--output', default='bench_analytics.json', help='Where to write the JSON report')
+        parser.add_argument('--compare', help='Earlier JSON report to check for regressions')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='Allowed relative drop before a metric counts as a regression')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        try:
+            resolutions = [
+                tuple(int(value) for value in size.split('x'))
+                for size in options['resolutions'].split(',') if size
+            ]
+        except ValueError:
+            raise CommandError("Resolutions must look like 1280x720")
+
+        with tempfile.TemporaryDirectory() as directory:
+            report = run_suite(directory, scenarios, resolutions, frames=options['frames'])
+
+        for result in report['results']:
+            precision = result['precision']
+            recall = result['recall']
+            self.stdout.write(
+                f"{result['scenario']:9} {result['width']:>5}x{result['height']:<5} "
+                f"{result['fps_per_core']:7.1f} fps/core  "
+                f"p50 {result['latency_ms']['p50']:6.2f}ms  p99 {result['latency_ms']['p99']:6.2f}ms  "
+                f"rss {result['peak_rss_mb']:6.1f}MB (+{result['scenario_rss_mb']:.1f})  "
+                f"precision {'-' if precision is None else f'{precision:.2f}'}  "
+                f"recall {'-' if recall is None else f'{recall:.2f}'}  "
+                f"false positives {result['false_positives']}"
+            )
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare_reports(baseline, report, options['tolerance'])
+            for scenario, width, height, metric, before, after in regressions:
+                self.stdout.write(f"REGRESSION {scenario} {width}x{height} {metric}: {before:.2f} -> {after:.2f}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
@@ -0,0 +1,107 @@
+import multiprocessing
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from cameras.frame_ring import SharedFrameRing
+
+# Worker functions are module level so they can be started by any
+# multiprocessing start method.
+#
+# Both pipelines wait the same way: the consumer blocks until a frame is
+# there and the producer blocks while ``slots`` frames are unread, so
+# neither side spins and no frame is skipped.
+
+
+def ring_consumer(name, shape, slots, frames, free, filled, results):
+    ring = SharedFrameRing.attach(name, shape, slots)
+    received = skipped = 0
+    checksum = 0
+    for seq in range(1, frames + 1):
+        filled.acquire()
+        view = ring.read(seq)
+        if view is not None and ring.is_current(seq):
+            checksum += int(view[0, 0, 0])
+            received += 1
+        else:
+            skipped += 1
+        del view
+        free.release()
+    ring.close()
+    results.put((received, skipped, checksum))
+
+
+def queue_consumer(frame_queue, frames, results):
+    received = 0
+    checksum = 0
+    while received < frames:
+        frame = frame_queue.get()
+        checksum += int(frame[0, 0, 0])
+        received += 1
+    results.put((received, 0, checksum))
+
+
+def run_ring(context, shape, slots, frames, source):
+    ring = SharedFrameRing.create(shape, slots)
+    free = context.Semaphore(slots)
+    filled = context.Semaphore(0)
+    results = context.Queue()
+    consumer = context.Process(
+        target=ring_consumer, args=(ring.name, shape, slots, frames, free, filled, results)
+    )
+    consumer.start()
+
+    started = time.perf_counter()
+    for index in range(frames):
+        free.acquire()
+        ring.write(source[index % len(source)])
+        filled.release()
+    received, skipped, _ = results.get()
+    elapsed = time.perf_counter() - started
+
+    consumer.join()
+    ring.close()
+    return elapsed, received, skipped
+
+
+def run_queue(context, shape, slots, frames, source):
+    frame_queue = context.Queue(maxsize=slots)
+    results = context.Queue()
+    consumer = context.Process(target=queue_consumer, args=(frame_queue, frames, results))
+    consumer.start()
+
+    started = time.perf_counter()
+    for index in range(frames):
+        frame_queue.put(source[index % len(source)])
+    received, skipped, _ = results.get()
+    elapsed = time.perf_counter() - started
+
+    consumer.join()
+    return elapsed, received, skipped
+
+
+class Command(BaseCommand):
+    help = 'Compare frame throughput of the shared-memory ring with a multiprocessing.Queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=300)
+        parser.add_argument('--width', type=int, default=1920)
+        parser.add_argument('--height', type=int, default=1080)
+        parser.add_argument('--slots', type=int, default=8)
+
+    def handle(self, *args, **options):
+        shape = (options['height'], options['width'], 3)
+        frames = options['frames']
+        slots = options['slots']
+        frame_mb = np.prod(shape) / 1e6
+
+        rng = np.random.default_rng(0)
+        source = [rng.integers(0, 255, shape, dtype=np.uint8) for _ in range(4)]
+        context = multiprocessing.get_context()
+
+        for label, runner in (('shared ring', run_ring), ('mp.Queue', run_queue)):
+            elapsed, received, skipped = runner(context, shape, slots, frames, source)
+            self.stdout.write(
+                f"{label:12} {frames / elapsed:8.1f} frames/s written, "
+                f"{received / elapsed:8.1f} frames/s delivered "
+                f"({received * frame_mb / elapsed:8.1f} MB/s), {skipped} skipped"
+            )
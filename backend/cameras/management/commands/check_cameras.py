@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from cameras.models import Camera
+from cameras.probe import probe_cameras
+
+
+class Command(BaseCommand):
+    help = 'Probe every camera (or one user\'s cameras) concurrently and store their statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only check the cameras of this user id')
+        parser.add_argument('--concurrency', type=int, help='Maximum number of probes in flight')
+        parser.add_argument('--per-host', type=int, help='Maximum number of probes in flight per host')
+        parser.add_argument('--timeout', type=float, help='Timeout of a single probe in seconds')
+
+    def handle(self, *args, **options):
+        cameras = Camera.objects.all()
+        if options['user']:
+            cameras = cameras.filter(user_id=options['user'])
+
+        cameras = list(cameras)
+        results = probe_cameras(
+            cameras,
+            concurrency=options['concurrency'],
+            per_host=options['per_host'],
+            timeout=options['timeout'],
+        )
+
+        online = sum(1 for result in results.values() if result.is_reachable)
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {len(cameras)} cameras: {online} online, {len(cameras) - online} offline"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from cameras.motion import MotionMonitor
+
+
+class Command(BaseCommand):
+    help = 'Run motion detection on every online camera with motion detection enabled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fps', type=float, help='Frames analysed per camera per second')
+        parser.add_argument('--cooldown', type=float, help='Minimum seconds between two alerts of a camera when alert episodes are disabled')
+
+    def handle(self, *args, **options):
+        monitor = MotionMonitor(fps=options['fps'], cooldown=options['cooldown'])
+        self.stdout.write(f"Watching for motion at {monitor.fps} fps per camera")
+        try:
+            monitor.run()
+        except KeyboardInterrupt:
+            monitor.stop()
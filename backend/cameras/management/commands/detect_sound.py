@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from cameras.audio import SoundMonitor, detect_cries_in_wav
+
+
+class Command(BaseCommand):
+    help = 'Run crying detection on every online camera with sound detection enabled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wav', help='Analyse this WAV file offline instead of the cameras')
+
+    def handle(self, *args, **options):
+        if options['wav']:
+            onsets = detect_cries_in_wav(options['wav'])
+            for onset in onsets:
+                self.stdout.write(f"Crying at {onset:.2f}s")
+            self.stdout.write(self.style.SUCCESS(f"{len(onsets)} crying episodes found"))
+            return
+
+        monitor = SoundMonitor()
+        self.stdout.write('Listening for crying')
+        try:
+            monitor.run()
+        except KeyboardInterrupt:
+            monitor.stop()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from cameras.thumbnails import collect_thumbnail_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete thumbnail files that no camera refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Keep unreferenced files younger than this many seconds')
+
+    def handle(self, *args, **options):
+        deleted, freed = collect_thumbnail_garbage(grace=options['grace'])
+        self.stdout.write(f"Deleted {deleted} thumbnail files, freed {freed / 1e6:.1f} MB")
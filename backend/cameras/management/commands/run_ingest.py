@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from cameras.ingest import IngestScheduler
+
+
+class Command(BaseCommand):
+    help = 'Shard the online cameras across worker processes and analyse their streams'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Number of worker processes (default: one per core)')
+        parser.add_argument('--fps', type=float, help='Maximum frames analysed per camera per second')
+        parser.add_argument('--rebalance-interval', type=float, default=30, help='Seconds between rebalances')
+
+    def handle(self, *args, **options):
+        scheduler = IngestScheduler(workers=options['workers'], fps=options['fps'])
+        self.stdout.write(
+            f"Starting {scheduler.worker_count} ingestion workers at up to {scheduler.fps} fps per camera"
+        )
+        try:
+            while True:
+                scheduler.tick()
+                deadline = time.monotonic() + options['rebalance_interval']
+                while time.monotonic() < deadline:
+                    scheduler.collect_reports(scheduler.report_interval)
+                    for index, lag in scheduler.worker_lag().items():
+                        self.stdout.write(
+                            f"worker {index}: {lag['cameras']} cameras, "
+                            f"max lag {lag['max_lag'] or 0:.3f}s, "
+                            f"{lag['dropped']} frames dropped, overrun {lag['overrun']:.3f}s, "
+                            f"{lag['effective_fps'] or 0:.1f} fps analysed, "
+                            f"{(lag['decode_saved'] or 0) * 100:.0f}% decodes skipped, "
+                            f"{lag['pixels_analysed'] / 1e6:.1f} Mpx analysed"
+                        )
+        except KeyboardInterrupt:
+            scheduler.stop()
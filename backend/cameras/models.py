@@ -32,9 +32,18 @@ class Camera(models.Model):
     description = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='offline')
     thumbnail = models.ImageField(upload_to=camera_thumbnail_path, blank=True, null=True)
+    # Storage paths of the rendered thumbnail sizes, keyed by size name
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # Perceptual hash of the frame the thumbnails were rendered from
+    thumbnail_phash = models.CharField(max_length=16, blank=True, default='')
     camera_type = models.CharField(max_length=20, choices=CAMERA_TYPE_CHOICES, default='ip')
     enable_motion_detection = models.BooleanField(default=True)
     enable_sound_detection = models.BooleanField(default=False)
+    # Polygons of {"mode": "include"/"exclude", "points": [[x, y], ...]} in
+    # fractions of the frame size, see cameras.zones
+    detection_zones = models.JSONField(default=list, blank=True)
+    # Names of additional analytics stages to run, see cameras.pipeline
+    enabled_stages = models.JSONField(default=list, blank=True)
     stream_url = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -43,7 +52,14 @@ class Camera(models.Model):
         return f"{self.name} ({self.ip_address})"
     
     def save(self, *args, **kwargs):
-        # Generate stream URL if not provided
+        self.fill_stream_url()
+        super().save(*args, **kwargs)
+    
+    def fill_stream_url(self):
+        """
+        Generate the stream URL if not provided. Called by save(), and
+        directly for rows written with bulk_create
+        """
         if not self.stream_url:
             if self.camera_type == 'rtsp':
                 self.stream_url = self.ip_address
@@ -59,5 +75,3 @@ class Camera(models.Model):
                     self.stream_url = f"rtsp://{self.ip_address}:554/onvif1"
                 else:
                     self.stream_url = self.ip_address
-        
-        super().save(*args, **kwargs)
@@ -0,0 +1,110 @@
+import hashlib
+import math
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .thumbnails import encode_image
+
+BACKGROUND = 24
+STATUS_COLORS = {'online': (80, 200, 80), 'offline': (60, 60, 220)}
+
+
+def mosaic_layout(count, columns=None):
+    """
+    Return (columns, rows) of a grid for ``count`` tiles, as square as
+    possible unless ``columns`` is given
+    """
+    columns = columns or max(1, math.ceil(math.sqrt(count)))
+    columns = min(columns, max(1, count))
+    return columns, max(1, math.ceil(count / columns))
+
+
+def mosaic_size(count, tile_width, columns=None):
+    """
+    Return (width, height) in pixels of the canvas for ``count`` tiles
+    """
+    columns, rows = mosaic_layout(count, columns)
+    return columns * tile_width, rows * round(tile_width * 9 / 16)
+
+
+def source_path(camera, tile_width):
+    """
+    The stored thumbnail to build a tile from: the smallest rendered size
+    at least ``tile_width`` wide, else the largest one
+    """
+    thumbnails = camera.thumbnails or {}
+    wide_enough = [
+        (width, name) for name, width in settings.THUMBNAIL_SIZES.items()
+        if name in thumbnails and width and width >= tile_width
+    ]
+    if wide_enough:
+        return thumbnails[min(wide_enough)[1]]
+    return camera.thumbnail.name if camera.thumbnail else None
+
+
+def mosaic_key(cameras, tile_width, columns, overlay, fmt):
+    """
+    Digest of everything a mosaic depends on: the member thumbnails (which
+    are content-addressed) and, with overlays, names and statuses
+    """
+    parts = [f"{tile_width}:{columns}:{overlay}:{fmt}"]
+    for camera in cameras:
+        parts.append(f"{camera.id}:{source_path(camera, tile_width)}")
+        if overlay:
+            parts.append(f"{camera.name}:{camera.status}")
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def _place(canvas, image, x, y, tile_width, tile_height):
+    # Letterbox the image into its tile
+    height, width = image.shape[:2]
+    scale = min(tile_width / width, tile_height / height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if size != (width, height):
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    left = x + (tile_width - size[0]) // 2
+    top = y + (tile_height - size[1]) // 2
+    canvas[top:top + size[1], left:left + size[0]] = image
+
+
+def _overlay(canvas, camera, x, y, tile_width, tile_height):
+    bar = max(14, tile_height // 8)
+    # Darken the label bar in place
+    canvas[y + tile_height - bar:y + tile_height, x:x + tile_width] >>= 1
+    scale = bar / 30
+    baseline = y + tile_height - bar // 4
+    radius = max(3, bar // 4)
+    color = STATUS_COLORS.get(camera.status, (200, 200, 200))
+    cv2.circle(canvas, (x + bar // 2, y + tile_height - bar // 2), radius, color, -1, cv2.LINE_AA)
+    cv2.putText(canvas, camera.name, (x + bar, baseline), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (255, 255, 255), 1, cv2.LINE_AA)
+
+
+def render_mosaic(cameras, tile_width=320, columns=None, overlay=True, fmt=None):
+    """
+    Composite the latest thumbnails of ``cameras`` into one grid image and
+    return (bytes, format). Tiles are 16:9 and written into a canvas
+    allocated once up front; cameras without a thumbnail get an empty tile.
+    """
+    tile_height = round(tile_width * 9 / 16)
+    columns, rows = mosaic_layout(len(cameras), columns)
+    canvas = np.full((rows * tile_height, columns * tile_width, 3), BACKGROUND, dtype=np.uint8)
+
+    for index, camera in enumerate(cameras):
+        x = (index % columns) * tile_width
+        y = (index // columns) * tile_height
+        path = source_path(camera, tile_width)
+        image = None
+        if path:
+            try:
+                with default_storage.open(path, 'rb') as f:
+                    image = cv2.imdecode(np.frombuffer(f.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+            except FileNotFoundError:
+                pass
+        if image is not None:
+            _place(canvas, image, x, y, tile_width, tile_height)
+        if overlay:
+            _overlay(canvas, camera, x, y, tile_width, tile_height)
+
+    return encode_image(canvas, fmt)
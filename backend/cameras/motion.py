@@ -0,0 +1,296 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+import cv2
+import numpy as np
+from django.conf import settings
+from .capture_pool import get_capture_pool
+from .clips import ClipRecorder
+from .pipeline import CameraPipeline, Stage, StageOutput, analytics_cameras, register_stage
+from .validators import get_stream_url
+from .zones import ZoneMask
+
+MotionResult = namedtuple('MotionResult', ['motion', 'area_ratio', 'boxes'])
+
+
+class MotionDetector:
+    """
+    Running-average background subtraction motion detector.
+
+    Frames are downscaled to ``width`` pixels wide and converted to blurred
+    grayscale, differenced against an exponentially weighted background
+    model, thresholded and reduced to contours. Motion is reported when the
+    changed contours cover at least ``min_area`` of the frame.
+
+    With detection ``zones`` only the bounding box of the analysed area is
+    processed and the pixels outside the zones are masked out before
+    thresholding; ``min_area`` is then a fraction of the analysed area.
+    """
+
+    def __init__(self, width=None, alpha=None, threshold=None, min_area=None, warmup=None, zones=None):
+        self.width = width or settings.MOTION_ANALYSIS_WIDTH
+        self.alpha = alpha or settings.MOTION_BACKGROUND_ALPHA
+        self.threshold = threshold or settings.MOTION_PIXEL_THRESHOLD
+        self.min_area = min_area or settings.MOTION_MIN_AREA
+        self.warmup = warmup if warmup is not None else settings.MOTION_WARMUP_FRAMES
+
+        self.zone_mask = ZoneMask(zones)
+        self.pixels_analysed = 0
+
+        self.background = None
+        self.frames = 0
+        self.kernel = np.ones((3, 3), dtype=np.uint8)
+
+    def set_zones(self, zones):
+        """
+        Change the detection zones; the mask is rebuilt on the next frame
+        """
+        self.zone_mask.set_zones(zones)
+
+    def preprocess(self, frame):
+        """
+        Downscale a BGR frame to blurred grayscale at the analysis width
+        """
+        height, width = frame.shape[:2]
+        if width > self.width:
+            size = (self.width, max(1, round(height * self.width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(frame, (5, 5), 0)
+
+    def process(self, frame):
+        """
+        Feed one BGR frame and return a MotionResult
+        """
+        gray = self.preprocess(frame)
+        return self.process_gray(gray)
+
+    def process_gray(self, gray):
+        """
+        Feed one already preprocessed grayscale frame and return a MotionResult
+        """
+        mask, box = self.zone_mask.get(gray.shape)
+        if box is not None:
+            x, y, w, h = box
+            if not w:
+                return MotionResult(False, 0.0, [])
+            gray = gray[y:y + h, x:x + w]
+        analysed = self.zone_mask.pixels
+        self.pixels_analysed += analysed
+
+        self.frames += 1
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.frames = 1
+            return MotionResult(False, 0.0, [])
+
+        # Difference against the background before folding the frame into it
+        delta = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        if self.frames <= self.warmup:
+            return MotionResult(False, 0.0, [])
+
+        if mask is not None:
+            delta = cv2.bitwise_and(delta, mask)
+        _, changes = cv2.threshold(delta, self.threshold, 255, cv2.THRESH_BINARY)
+        changes = cv2.dilate(changes, self.kernel, iterations=2)
+        if mask is not None:
+            # Keep dilation from bleeding back into excluded pixels
+            changes = cv2.bitwise_and(changes, mask)
+        contours, _ = cv2.findContours(changes, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_pixels = self.min_area * analysed
+        offset_x, offset_y = box[:2] if box is not None else (0, 0)
+        boxes = []
+        changed = 0.0
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area >= min_pixels:
+                x, y, w, h = cv2.boundingRect(contour)
+                boxes.append((x + offset_x, y + offset_y, w, h))
+                changed += area
+
+        area_ratio = changed / analysed
+        return MotionResult(bool(boxes), area_ratio, boxes)
+
+    def reset(self):
+        self.background = None
+        self.frames = 0
+
+
+@register_stage
+class MotionStage(Stage):
+    """
+    Motion detection as a pipeline stage, on the shared blurred grayscale
+    input and the camera's detection zones
+    """
+
+    name = 'motion'
+    inputs = ('blurred',)
+
+    def __init__(self, camera):
+        super().__init__(camera)
+        self.detector = MotionDetector(zones=camera.detection_zones)
+
+    @classmethod
+    def enabled(cls, camera):
+        return camera.enable_motion_detection
+
+    def configure(self, camera):
+        super().configure(camera)
+        self.detector.set_zones(camera.detection_zones)
+
+    def process(self, context):
+        result = self.detector.process_gray(context['blurred'])
+        if not result.motion:
+            return []
+        return [StageOutput('Motion', f"Motion detected at {self.camera.location}")]
+
+
+class MotionMonitor:
+    """
+    Runs the analytics pipeline (motion detection and any other enabled
+    stages) of every online camera on frames from the shared capture pool.
+    Repeated detections are folded into alert episodes; with episodes
+    disabled, alerts of one type are raised at most once per camera every
+    ``cooldown`` seconds.
+
+    Each camera is analysed at most ``fps`` times per second on its newest
+    frame; frames that arrived in between are dropped, not queued, and
+    counted in ``stats()`` along with the age of the last analysed frame.
+    With ``refresh_interval=None`` the set of cameras is not loaded from the
+    database but assigned through ``set_cameras``.
+    """
+
+    def __init__(self, fps=None, cooldown=None, refresh_interval=30, pool=None):
+        self.fps = fps or settings.MOTION_FPS
+        self.cooldown = cooldown or settings.MOTION_ALERT_COOLDOWN
+        self.refresh_interval = refresh_interval
+        self.pool = pool or get_capture_pool()
+
+        self.cameras = {}
+        self.pipelines = {}
+        self.recorders = {}
+        self.seen_frames = {}
+        self.last_refresh = 0
+        self.stopped = threading.Event()
+
+        self.analysed = defaultdict(int)
+        self.dropped = defaultdict(int)
+        self.overwritten = defaultdict(int)
+        self.lag = {}
+        self.overrun = 0.0
+
+    def set_cameras(self, cameras):
+        """
+        Replace the set of cameras to watch
+        """
+        self.cameras = {camera.id: camera for camera in cameras}
+        self.pool.reserve(self, len(self.cameras))
+        for camera_id in list(self.pipelines):
+            if camera_id not in self.cameras:
+                del self.pipelines[camera_id]
+            else:
+                self.pipelines[camera_id].configure(self.cameras[camera_id])
+        for camera_id in list(self.recorders):
+            if camera_id not in self.cameras:
+                self.recorders.pop(camera_id).close()
+        for stats in (self.seen_frames, self.analysed, self.dropped, self.overwritten, self.lag):
+            for camera_id in list(stats):
+                if camera_id not in self.cameras:
+                    del stats[camera_id]
+
+    def refresh_cameras(self):
+        """
+        Reload the set of cameras to watch
+        """
+        self.set_cameras(analytics_cameras())
+        self.last_refresh = time.monotonic()
+
+    def process_camera(self, camera, frame):
+        """
+        Run the camera's pipeline on a frame and return the alerts raised
+        """
+        pipeline = self.pipelines.get(camera.id)
+        if pipeline is None:
+            pipeline = self.pipelines[camera.id] = CameraPipeline(camera, cooldown=self.cooldown)
+
+        alerts = pipeline.process(frame)
+
+        # Record after detecting; encoding happens off this thread
+        recorder = self.recorders.get(camera.id)
+        if recorder is None:
+            recorder = self.recorders[camera.id] = ClipRecorder()
+        for alert in alerts:
+            recorder.trigger(alert)
+        recorder.add_frame(frame)
+        return alerts
+
+    def tick(self):
+        """
+        Analyse the newest frame of every watched camera once
+        """
+        if self.refresh_interval is not None and time.monotonic() - self.last_refresh > self.refresh_interval:
+            self.refresh_cameras()
+
+        for camera in self.cameras.values():
+            stream = self.pool.acquire(get_stream_url(camera))
+            frame_count = stream.frame_count
+            seen = self.seen_frames.get(camera.id)
+            if frame_count == seen:
+                continue
+            frame = stream.latest_frame(timeout=0)
+            if frame is None:
+                continue
+
+            # Frames that arrived since the last analysed one are skipped
+            if seen is not None:
+                self.dropped[camera.id] += max(0, frame_count - seen - 1)
+            self.seen_frames[camera.id] = frame_count
+            self.lag[camera.id] = time.monotonic() - stream.frame_time
+            self.analysed[camera.id] += 1
+            try:
+                self.process_camera(camera, frame)
+            except Exception as e:
+                print(f"Error analysing frame for camera {camera.id}: {e}")
+            # Frames shared through a ring can be overwritten while in use
+            if not stream.is_current():
+                self.overwritten[camera.id] += 1
+
+    def stats(self):
+        """
+        Per-camera analysed/dropped/overwritten frame counts, frame age,
+        pixels analysed, stage timings, (with adaptive sampling) decode
+        statistics, and how far the last tick overran its time slot
+        """
+        streams = self.pool.stats()
+        cameras = {}
+        for camera_id, camera in self.cameras.items():
+            stream = streams.get(get_stream_url(camera), {})
+            pipeline = self.pipelines.get(camera_id)
+            motion = pipeline.stages.get('motion') if pipeline else None
+            cameras[camera_id] = {
+                'analysed': self.analysed[camera_id],
+                'dropped': self.dropped[camera_id],
+                'overwritten': self.overwritten[camera_id],
+                'lag': self.lag.get(camera_id),
+                'grabbed': stream.get('grabbed'),
+                'decoded': stream.get('decoded'),
+                'effective_fps': stream.get('effective_fps'),
+                'pixels_analysed': motion.detector.pixels_analysed if motion else 0,
+                'stages': pipeline.stats() if pipeline else {},
+            }
+        return {'cameras': cameras, 'overrun': self.overrun}
+
+    def run(self):
+        interval = 1.0 / self.fps
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            self.tick()
+            elapsed = time.monotonic() - started
+            self.overrun = max(0.0, elapsed - interval)
+            self.stopped.wait(max(0, interval - elapsed))
+
+    def stop(self):
+        self.stopped.set()
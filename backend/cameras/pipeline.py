@@ -0,0 +1,230 @@
+import time
+from collections import namedtuple
+import cv2
+from django.conf import settings
+from django.db.models import Q
+from alerts.services import create_alert
+from .models import Camera
+
+# An alert a stage wants raised for the camera it runs on
+StageOutput = namedtuple('StageOutput', ['alert_type', 'message'])
+
+INPUTS = {}
+STAGES = {}
+
+
+def register_input(name):
+    """
+    Register a function computing a named frame input from a FrameContext
+    """
+    def decorator(func):
+        INPUTS[name] = func
+        return func
+    return decorator
+
+
+def register_stage(cls):
+    """
+    Register a Stage subclass under its ``name``
+    """
+    STAGES[cls.name] = cls
+    return cls
+
+
+@register_input('small')
+def small_input(context):
+    frame = context.frame
+    height, width = frame.shape[:2]
+    if width <= context.width:
+        return frame
+    size = (context.width, max(1, round(height * context.width / width)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+@register_input('gray')
+def gray_input(context):
+    small = context['small']
+    if small.ndim == 2:
+        return small
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+@register_input('blurred')
+def blurred_input(context):
+    return cv2.GaussianBlur(context['gray'], (5, 5), 0)
+
+
+@register_input('hsv')
+def hsv_input(context):
+    return cv2.cvtColor(context['small'], cv2.COLOR_BGR2HSV)
+
+
+class FrameContext:
+    """
+    One frame and its preprocessed inputs.
+
+    Inputs are computed on first access and then shared by every stage
+    that asks for them, so a frame is resized, converted and blurred at
+    most once however many stages need it. ``small`` and everything
+    derived from it are at ``width`` pixels wide.
+    """
+
+    def __init__(self, frame, width=None):
+        self.frame = frame
+        self.width = width or settings.ANALYTICS_WIDTH
+        self.inputs = {'frame': frame}
+        self.timings = {}
+
+    def __getitem__(self, name):
+        value = self.inputs.get(name)
+        if value is None:
+            # Time spent on inputs this one needs is counted under those
+            started = time.perf_counter()
+            nested = sum(self.timings.values())
+            value = self.inputs[name] = INPUTS[name](self)
+            self.timings[name] = time.perf_counter() - started - (sum(self.timings.values()) - nested)
+        return value
+
+
+class Stage:
+    """
+    Base class of a video analytics stage.
+
+    Subclasses set ``name`` and the ``inputs`` they read from the
+    FrameContext, and implement ``process(context)`` returning a list of
+    StageOutput. ``enabled(camera)`` decides whether the stage runs for a
+    camera; by default that is when its name is in the camera's
+    ``enabled_stages``.
+    """
+
+    name = None
+    inputs = ()
+
+    def __init__(self, camera):
+        self.camera = camera
+
+    @classmethod
+    def enabled(cls, camera):
+        return cls.name in (camera.enabled_stages or [])
+
+    def configure(self, camera):
+        """
+        Pick up changed camera settings
+        """
+        self.camera = camera
+
+    def process(self, context):
+        raise NotImplementedError
+
+
+class StageTiming:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'mean_ms': self.total / self.calls * 1000 if self.calls else None,
+            'max_ms': self.max * 1000,
+        }
+
+
+def enabled_stages(camera):
+    return [name for name, cls in STAGES.items() if cls.enabled(camera)]
+
+
+def analytics_cameras():
+    """
+    Online cameras with at least one stage enabled
+    """
+    return Camera.objects.filter(status='online').filter(
+        Q(enable_motion_detection=True) | ~Q(enabled_stages=[])
+    )
+
+
+class CameraPipeline:
+    """
+    The enabled stages of one camera run over a shared FrameContext.
+
+    Stage outputs become alerts through ``emit``, which hands every one of
+    them to create_alert so repeats are folded into the open episode of
+    their type. With episodes disabled (ALERT_EPISODE_WINDOW of 0) one
+    alert per type is raised every ``cooldown`` seconds instead. Time
+    spent in every stage and in computing every input is collected.
+    """
+
+    def __init__(self, camera, cooldown=None, width=None):
+        self.cooldown = cooldown or settings.MOTION_ALERT_COOLDOWN
+        self.width = width
+        self.stages = {}
+        self.last_alert = {}
+        self.timings = {}
+        self.configure(camera)
+
+    def configure(self, camera):
+        """
+        Set the stages to the ones enabled for the camera, keeping the state
+        of stages that stay enabled
+        """
+        self.camera = camera
+        names = enabled_stages(camera)
+        for name in list(self.stages):
+            if name not in names:
+                del self.stages[name]
+        for name in names:
+            if name in self.stages:
+                self.stages[name].configure(camera)
+            else:
+                self.stages[name] = STAGES[name](camera)
+
+    def process(self, frame):
+        """
+        Run every stage on a frame and return the alerts raised
+        """
+        context = FrameContext(frame, self.width)
+        alerts = []
+        for name, stage in self.stages.items():
+            started = time.perf_counter()
+            nested = sum(context.timings.values())
+            try:
+                outputs = stage.process(context) or []
+            except Exception as e:
+                print(f"Error in stage {name} for camera {self.camera.id}: {e}")
+                outputs = []
+            # Inputs the stage was first to ask for are timed on their own
+            self._time(name, time.perf_counter() - started - (sum(context.timings.values()) - nested))
+            for output in outputs:
+                alert = self.emit(output)
+                if alert is not None:
+                    alerts.append(alert)
+        for name, elapsed in context.timings.items():
+            self._time(f"input:{name}", elapsed)
+        return alerts
+
+    def emit(self, output):
+        """
+        Turn a stage output into an Alert; returns None for repeats folded
+        into an open episode or, without episodes, while cooling down
+        """
+        if settings.ALERT_EPISODE_WINDOW <= 0:
+            now = time.monotonic()
+            if now - self.last_alert.get(output.alert_type, -self.cooldown) < self.cooldown:
+                return None
+            self.last_alert[output.alert_type] = now
+        return create_alert(self.camera, output.alert_type, output.message)
+
+    def _time(self, name, elapsed):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = StageTiming()
+        timing.add(elapsed)
+
+    def stats(self):
+        return {name: timing.as_dict() for name, timing in self.timings.items()}
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from django.conf import settings
+from .probe import DEFAULT_PORTS
+from .singleflight import SingleFlight
+
+
+def normalize_url(url):
+    """
+    Normalize a stream URL so spelling variants share one cache entry
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = '//' + url
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    netloc = host
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parsed.port}"
+    if parsed.username:
+        credentials = parsed.username if parsed.password is None else f"{parsed.username}:{parsed.password}"
+        netloc = f"{credentials}@{netloc}"
+    path = parsed.path.rstrip('/') or '/'
+    normalized = f"{scheme}://{netloc}{path}" if scheme else f"{netloc}{path}"
+    if parsed.query:
+        normalized = f"{normalized}?{parsed.query}"
+    return normalized
+
+
+# Kinds of probe cached side by side: a TCP reachability check
+# (is_reachable, status) and a protocol-level stream check that also
+# returns the stream details (is_reachable, status, stream)
+PROBE_KINDS = ('tcp', 'stream')
+
+
+def probe_key(kind, url):
+    """
+    Cache key of a ``kind`` probe of ``url``
+    """
+    return f"{kind}:{normalize_url(url)}"
+
+
+class ProbeCache:
+    """
+    LRU cache of camera probe results keyed by probe kind and normalized
+    stream URL.
+
+    Reachable results live for ``positive_ttl`` seconds, unreachable ones
+    only for ``negative_ttl`` so a camera that comes back is noticed soon.
+    Concurrent misses for one URL share a single in-flight probe.
+    """
+
+    def __init__(self, positive_ttl=None, negative_ttl=None, max_entries=None):
+        self.positive_ttl = positive_ttl if positive_ttl is not None else settings.PROBE_CACHE_POSITIVE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else settings.PROBE_CACHE_NEGATIVE_TTL
+        self.max_entries = max_entries or settings.PROBE_CACHE_MAX_ENTRIES
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.flights = SingleFlight()
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'forced': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store a result, whose first item is is_reachable, under a probe_key
+        """
+        ttl = self.positive_ttl if value[0] else self.negative_ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get_or_probe(self, url, probe, force=False, kind='tcp'):
+        """
+        Return the cached result of a ``kind`` probe of ``url``, calling
+        ``probe()`` on a miss or when ``force`` is set
+        """
+        key = probe_key(kind, url)
+        if force:
+            self._count('forced')
+        else:
+            value = self.get(key)
+            if value is not None:
+                self._count('hits')
+                return value
+
+        def run():
+            value = probe()
+            self.set(key, value)
+            return value
+
+        value, shared = self.flights.do(key, run)
+        self._count('coalesced' if shared else 'misses')
+        return value
+
+    def invalidate(self, url):
+        with self.lock:
+            for kind in PROBE_KINDS:
+                self.entries.pop(probe_key(kind, url), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses'] + self.counters['coalesced']
+            return dict(
+                self.counters,
+                entries=len(self.entries),
+                hit_ratio=self.counters['hits'] / lookups if lookups else None,
+                positive_ttl=self.positive_ttl,
+                negative_ttl=self.negative_ttl,
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_probe_cache():
+    """
+    Return the process-wide probe cache, creating it on first use
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ProbeCache()
+        return _cache
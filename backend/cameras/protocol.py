@@ -0,0 +1,260 @@
+import hashlib
+import http.client
+import re
+import socket
+import ssl
+import time
+from base64 import b64encode
+from collections import namedtuple
+from urllib.parse import urlparse, unquote
+from .probe import DEFAULT_PORTS
+
+StreamInfo = namedtuple(
+    'StreamInfo',
+    ['is_reachable', 'latency', 'protocol', 'status_code', 'codec', 'width', 'height'],
+)
+
+USER_AGENT = 'GuardianEye/1.0'
+
+# Status codes that prove a live server even though we did not get the stream
+ALIVE_STATUS_CODES = (401, 403, 405)
+
+# Content types advertised by common HTTP cameras
+HTTP_CODECS = {
+    'multipart/x-mixed-replace': 'MJPEG',
+    'image/jpeg': 'JPEG',
+    'video/mp4': 'MP4',
+    'video/x-flv': 'FLV',
+    'application/vnd.apple.mpegurl': 'HLS',
+    'application/x-mpegurl': 'HLS',
+}
+
+SDP_RTPMAP = re.compile(r'^a=rtpmap:\d+\s+([\w.-]+)/', re.IGNORECASE)
+SDP_DIMENSIONS = (
+    re.compile(r'^a=framesize:\d+\s+(\d+)-(\d+)', re.IGNORECASE),
+    re.compile(r'^a=x-dimensions:\s*(\d+),\s*(\d+)', re.IGNORECASE),
+)
+SDP_CLIPRECT = re.compile(r'^a=cliprect:\s*\d+,\s*\d+,\s*(\d+),\s*(\d+)', re.IGNORECASE)
+
+
+def unverified_ssl_context():
+    """
+    TLS context that accepts any certificate: cameras almost always serve
+    self-signed ones, and a probe only asks whether the stream is alive
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def probe_stream(url, timeout=2):
+    """
+    Check whether a camera stream is alive without decoding any video.
+
+    RTSP streams are probed with OPTIONS and DESCRIBE on a raw socket and
+    the returned SDP is parsed for codec and resolution; HTTP(S) streams
+    are probed with a HEAD request.
+
+    Returns:
+        StreamInfo
+    """
+    scheme = urlparse(url).scheme.lower()
+    try:
+        if scheme in ('rtsp', 'rtsps'):
+            return probe_rtsp(url, timeout)
+        if scheme in ('http', 'https'):
+            return probe_http(url, timeout)
+    except (OSError, ValueError, http.client.HTTPException):
+        pass
+    return StreamInfo(False, None, scheme, None, None, None, None)
+
+
+def probe_http(url, timeout=2):
+    """
+    Probe an HTTP(S) camera with a HEAD request
+    """
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+
+    headers = {'User-Agent': USER_AGENT}
+    if parsed.username:
+        credentials = f"{unquote(parsed.username)}:{unquote(parsed.password or '')}"
+        headers['Authorization'] = 'Basic ' + b64encode(credentials.encode()).decode()
+
+    started = time.monotonic()
+    if parsed.scheme == 'https':
+        connection = http.client.HTTPSConnection(
+            parsed.hostname, parsed.port, timeout=timeout, context=unverified_ssl_context()
+        )
+    else:
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        connection.request('HEAD', path, headers=headers)
+        response = connection.getresponse()
+        latency = time.monotonic() - started
+    finally:
+        connection.close()
+
+    content_type = (response.getheader('Content-Type') or '').split(';')[0].strip().lower()
+    is_alive = response.status < 400 or response.status in ALIVE_STATUS_CODES
+    return StreamInfo(
+        is_alive, latency, parsed.scheme, response.status,
+        HTTP_CODECS.get(content_type), None, None,
+    )
+
+
+class RTSPClient:
+    """
+    Minimal RTSP/1.0 client that only knows enough to ask a camera to
+    describe its stream
+    """
+
+    def __init__(self, url, timeout=2):
+        parsed = urlparse(url)
+        self.timeout = timeout
+        self.host = parsed.hostname
+        self.port = parsed.port or DEFAULT_PORTS[parsed.scheme.lower()]
+        self.use_tls = parsed.scheme.lower() == 'rtsps'
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else ''
+
+        # Credentials never go on the request line
+        netloc = self.host if parsed.port is None else f"{self.host}:{parsed.port}"
+        self.url = parsed._replace(netloc=netloc).geturl()
+
+        self.cseq = 0
+        self.sock = None
+        self.buffer = b''
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if self.use_tls:
+            self.sock = unverified_ssl_context().wrap_socket(self.sock, server_hostname=self.host)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def request(self, method, headers=None):
+        """
+        Send a request and return (status_code, headers, body), answering a
+        single Basic or Digest authentication challenge if we have credentials
+        """
+        status_code, response_headers, body = self._send(method, headers or {})
+        challenge = response_headers.get('www-authenticate')
+        if status_code == 401 and self.username and challenge:
+            auth_headers = dict(headers or {})
+            auth_headers['Authorization'] = self._authorization(method, challenge)
+            status_code, response_headers, body = self._send(method, auth_headers)
+        return status_code, response_headers, body
+
+    def _send(self, method, headers):
+        self.cseq += 1
+        lines = [f"{method} {self.url} RTSP/1.0", f"CSeq: {self.cseq}", f"User-Agent: {USER_AGENT}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        self.sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        return self._read_response()
+
+    def _read_response(self):
+        while b'\r\n\r\n' not in self.buffer:
+            self._fill()
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('RTSP/'):
+            raise ValueError(f"Not an RTSP response: {status_line!r}")
+
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        while len(self.buffer) < length:
+            self._fill()
+        body, self.buffer = self.buffer[:length], self.buffer[length:]
+        return int(parts[1]), headers, body.decode('utf-8', 'replace')
+
+    def _fill(self):
+        chunk = self.sock.recv(4096)
+        if not chunk:
+            raise ConnectionError('RTSP server closed the connection')
+        self.buffer += chunk
+
+    def _authorization(self, method, challenge):
+        scheme, _, params = challenge.partition(' ')
+        if scheme.lower() == 'basic':
+            credentials = f"{self.username}:{self.password}"
+            return 'Basic ' + b64encode(credentials.encode()).decode()
+
+        fields = dict(re.findall(r'(\w+)="?([^",]*)"?', params))
+        realm, nonce = fields.get('realm', ''), fields.get('nonce', '')
+        ha1 = hashlib.md5(f"{self.username}:{realm}:{self.password}".encode()).hexdigest()
+        ha2 = hashlib.md5(f"{method}:{self.url}".encode()).hexdigest()
+        response = hashlib.md5(f"{ha1}:{nonce}:{ha2}".encode()).hexdigest()
+        return (
+            f'Digest username="{self.username}", realm="{realm}", nonce="{nonce}", '
+            f'uri="{self.url}", response="{response}"'
+        )
+
+
+def parse_sdp(sdp):
+    """
+    Extract (codec, width, height) of the first video track of an SDP body
+    """
+    codec = width = height = None
+    in_video = False
+    for line in sdp.splitlines():
+        line = line.strip()
+        if line.startswith('m='):
+            if in_video:
+                break
+            in_video = line.startswith('m=video')
+            continue
+        if not in_video:
+            continue
+
+        match = SDP_RTPMAP.match(line)
+        if match and codec is None:
+            codec = match.group(1).upper()
+            continue
+        for pattern in SDP_DIMENSIONS:
+            match = pattern.match(line)
+            if match:
+                width, height = int(match.group(1)), int(match.group(2))
+        match = SDP_CLIPRECT.match(line)
+        if match and width is None:
+            height, width = int(match.group(1)), int(match.group(2))
+
+    return codec, width, height
+
+
+def probe_rtsp(url, timeout=2):
+    """
+    Probe an RTSP camera with OPTIONS and DESCRIBE
+    """
+    protocol = urlparse(url).scheme.lower()
+    client = RTSPClient(url, timeout)
+    started = time.monotonic()
+    try:
+        client.connect()
+        status_code, _, _ = client.request('OPTIONS')
+        latency = time.monotonic() - started
+        if status_code >= 400 and status_code not in ALIVE_STATUS_CODES:
+            return StreamInfo(False, latency, protocol, status_code, None, None, None)
+
+        status_code, _, sdp = client.request('DESCRIBE', {'Accept': 'application/sdp'})
+    finally:
+        client.close()
+
+    codec = width = height = None
+    if status_code == 200:
+        codec, width, height = parse_sdp(sdp)
+
+    is_alive = status_code < 400 or status_code in ALIVE_STATUS_CODES
+    return StreamInfo(is_alive, latency, protocol, status_code, codec, width, height)
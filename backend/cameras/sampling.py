@@ -0,0 +1,106 @@
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+
+# Size of the tiny grayscale image the change score is computed on
+SCORE_SIZE = (32, 24)
+
+
+def change_score(frame, previous):
+    """
+    Return (score, small) where ``small`` is a tiny grayscale copy of the
+    frame and ``score`` its mean absolute difference from ``previous``
+    """
+    small = cv2.resize(frame, SCORE_SIZE, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    if previous is None:
+        return 0.0, small
+    return float(np.mean(cv2.absdiff(small, previous))), small
+
+
+class AdaptiveSampler:
+    """
+    Decides which grabbed frames of a stream get decoded.
+
+    Frames are decoded at ``full_fps`` while the scene changes and at
+    ``idle_fps`` once the cheap change score stayed below ``threshold`` for
+    ``quiet_after`` seconds; the first score at or above the threshold
+    switches straight back to the full rate. Frames that are not decoded
+    are only grabbed, which skips their decode cost entirely.
+    """
+
+    def __init__(self, full_fps=None, idle_fps=None, quiet_after=None, threshold=None, window=5):
+        self.full_fps = full_fps or settings.INGEST_MAX_FPS
+        self.idle_fps = idle_fps or settings.SAMPLING_IDLE_FPS
+        self.quiet_after = quiet_after or settings.SAMPLING_QUIET_SECONDS
+        self.threshold = threshold or settings.SAMPLING_CHANGE_THRESHOLD
+        self.window = window
+
+        self.idle = False
+        self.last_change = None
+        self.next_decode = 0
+        self.boost_until = 0
+        self.previous = None
+
+        self.grabbed = 0
+        self.decoded = 0
+        self.window_start = None
+        self.window_decoded = 0
+        self.effective_fps = 0.0
+
+    @property
+    def fps(self):
+        return self.idle_fps if self.idle else self.full_fps
+
+    def should_decode(self, now=None):
+        """
+        Count a grabbed frame and tell whether it should be decoded
+        """
+        now = now if now is not None else time.monotonic()
+        self.grabbed += 1
+        if now < self.next_decode and now >= self.boost_until:
+            return False
+        self.next_decode = now + 1.0 / self.fps
+        return True
+
+    def observe(self, frame, now=None):
+        """
+        Update the sampling rate from a decoded frame
+        """
+        now = now if now is not None else time.monotonic()
+        if self.last_change is None:
+            self.last_change = self.window_start = now
+        self.decoded += 1
+        self.window_decoded += 1
+        if now - self.window_start >= self.window:
+            self.effective_fps = self.window_decoded / (now - self.window_start)
+            self.window_start = now
+            self.window_decoded = 0
+
+        score, self.previous = change_score(frame, self.previous)
+        if score >= self.threshold:
+            self.last_change = now
+            if self.idle:
+                self.idle = False
+                self.next_decode = now
+        elif not self.idle and now - self.last_change >= self.quiet_after:
+            self.idle = True
+        return score
+
+    def boost(self, seconds=2, now=None):
+        """
+        Decode every frame for a while, e.g. while someone watches live
+        """
+        now = now if now is not None else time.monotonic()
+        self.boost_until = now + seconds
+
+    def stats(self):
+        return {
+            'grabbed': self.grabbed,
+            'decoded': self.decoded,
+            'effective_fps': self.effective_fps,
+            'decode_saved': 1 - self.decoded / self.grabbed if self.grabbed else 0.0,
+            'quiet': self.idle,
+        }
@@ -1,17 +1,48 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Camera
 from .validators import validate_camera_connection
+from .zones import validate_zones
 
 class CameraSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+    
     class Meta:
         model = Camera
         fields = [
             'id', 'name', 'ip_address', 'location', 'description', 
-            'status', 'thumbnail', 'camera_type', 'enable_motion_detection', 
-            'enable_sound_detection', 'stream_url', 'created_at', 'updated_at'
+            'status', 'thumbnail', 'thumbnails', 'camera_type', 'enable_motion_detection', 
+            'enable_sound_detection', 'detection_zones', 'enabled_stages', 'stream_url', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'status', 'thumbnail', 'stream_url', 'created_at', 'updated_at']
     
+    def get_thumbnails(self, obj):
+        """
+        URLs of every rendered thumbnail size
+        """
+        request = self.context.get('request')
+        urls = {}
+        for name, path in (obj.thumbnails or {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+    
+    def validate_detection_zones(self, value):
+        error = validate_zones(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+    
+    def validate_enabled_stages(self, value):
+        from .motion import MotionStage  # noqa: F401, registers the built-in stages
+        from .pipeline import STAGES
+        if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+            raise serializers.ValidationError("Stages must be a list of stage names.")
+        unknown = sorted(set(value) - set(STAGES))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown stages: {', '.join(unknown)}")
+        return value
+    
     def create(self, validated_data):
         # Set the user from the request
         validated_data['user'] = self.context['request'].user
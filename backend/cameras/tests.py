@@ -1,15 +1,94 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.core.cache import caches
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from .models import Camera
-from unittest.mock import patch
+from .probe import FleetProber, ProbeResult
+from .protocol import probe_stream
+from .validators import validate_stream_url, get_stream_url
+from .capture_pool import CapturePool
+from .motion import MotionDetector, MotionMonitor
+from .audio import detect_cries_in_wav
+from .ingest import IngestScheduler
+from .frame_ring import RingFrameSource, SharedFrameRing
+from .clips import ClipRecorder, EncodedFrameRing, submit_clip, write_clip
+from .probe_cache import ProbeCache, get_probe_cache, normalize_url, probe_key
+from .live import LiveHub
+from .sampling import AdaptiveSampler
+from .zones import ZoneMask
+from .benchmark import compare_reports, run_suite
+from .thumbnails import (
+    capture_camera_thumbnail, collect_thumbnail_garbage, queue_thumbnails, render_thumbnails, store_thumbnails
+)
+from .variants import VariantCache
+from .mosaic import mosaic_layout, mosaic_size, render_mosaic
+from .discovery import discover
+from .throttles import DiscoveryRateThrottle
+from .pipeline import INPUTS, STAGES, CameraPipeline, FrameContext, Stage, StageOutput
+from alerts.coalescing import AlertCoalescer
+from alerts.models import Alert
+from unittest.mock import MagicMock, patch
+import asyncio
+import queue
+import socket
+import ssl
+import socketserver
+import http.server
+import json
+import threading
+import time
+import numpy as np
+import cv2
+import os
+import tempfile
+import shutil
+import wave
+import multiprocessing
+from concurrent.futures import Future
 
 User = get_user_model()
 
+FAKE_SDP = (
+    'v=0\r\n'
+    'o=- 0 0 IN IP4 127.0.0.1\r\n'
+    's=Fake Camera\r\n'
+    't=0 0\r\n'
+    'm=video 0 RTP/AVP 96\r\n'
+    'a=rtpmap:96 H264/90000\r\n'
+    'a=framesize:96 1920-1080\r\n'
+    'm=audio 0 RTP/AVP 97\r\n'
+    'a=rtpmap:97 MPEG4-GENERIC/16000/1\r\n'
+)
+
+class FakeRTSPHandler(socketserver.StreamRequestHandler):
+    """
+    Answers OPTIONS and DESCRIBE like a real camera, without any media
+    """
+    def handle(self):
+        while True:
+            request_line = self.rfile.readline().decode()
+            if not request_line:
+                return
+            headers = {}
+            for line in iter(self.rfile.readline, b'\r\n'):
+                name, _, value = line.decode().partition(':')
+                headers[name.strip().lower()] = value.strip()
+            
+            method = request_line.split(' ')[0]
+            lines = ['RTSP/1.0 200 OK', f"CSeq: {headers['cseq']}"]
+            body = ''
+            if method == 'OPTIONS':
+                lines.append('Public: OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN')
+            elif method == 'DESCRIBE':
+                body = FAKE_SDP
+                lines += ['Content-Type: application/sdp', f'Content-Length: {len(body)}']
+            self.wfile.write(('\r\n'.join(lines) + '\r\n\r\n' + body).encode())
+
 class CameraTests(TestCase):
     def setUp(self):
+        get_probe_cache().clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             username='testuser',
@@ -35,7 +114,7 @@ class CameraTests(TestCase):
             'description': 'Test Description'
         }
         
-    @patch('cameras.validators.validate_camera_connection')
+    @patch('cameras.serializers.validate_camera_connection')
     def test_add_camera(self, mock_validate):
         """Test adding a camera"""
         # Mock the camera validation to return True
@@ -49,7 +128,7 @@ class CameraTests(TestCase):
         self.assertEqual(Camera.objects.get().name, 'Test Camera')
         self.assertEqual(Camera.objects.get().status, 'online')
         
-    @patch('cameras.validators.validate_camera_connection')
+    @patch('cameras.serializers.validate_camera_connection')
     def test_add_camera_unreachable(self, mock_validate):
         """Test adding an unreachable camera"""
         # Mock the camera validation to return False
@@ -61,11 +140,62 @@ class CameraTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(Camera.objects.count(), 0)
         
-    @patch('cameras.validators.validate_camera_connection')
-    def test_check_camera_status(self, mock_validate):
+    def test_bulk_create_validates_concurrently(self):
+        """Test bulk creating cameras checks all connections in parallel"""
+        def validate(address):
+            time.sleep(0.2)
+            return (not address.endswith('.99'), 'online')
+        
+        items = [dict(self.camera_data, name=f'Camera {i}', ip_address=f'10.0.0.{i}') for i in range(8)]
+        items.append(dict(self.camera_data, ip_address='10.0.0.99'))
+        items.append({'name': 'No address'})
+        url = reverse('camera-bulk')
+        with patch('cameras.bulk.validate_camera_connection', side_effect=validate), \
+                patch('cameras.bulk.queue_thumbnails') as mock_queue:
+            started = time.monotonic()
+            response = self.client.post(url, items, format='json')
+            elapsed = time.monotonic() - started
+        
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(response.data['saved'], 8)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created'] * 8 + ['unreachable', 'invalid'])
+        self.assertIn('ip_address', results[9]['errors'])
+        camera = Camera.objects.get(id=results[0]['id'])
+        self.assertEqual(camera.status, 'online')
+        self.assertEqual(camera.stream_url, 'rtsp://10.0.0.0:554/stream')
+        mock_queue.assert_called_once_with([result['id'] for result in results[:8]])
+        
+        # Updates only re-check changed addresses
+        with patch('cameras.bulk.validate_camera_connection', return_value=(True, 'online')) as mock_validate, \
+                patch('cameras.bulk.queue_thumbnails'):
+            response = self.client.post(url, [
+                {'id': results[0]['id'], 'name': 'Renamed'},
+                {'id': results[1]['id'], 'ip_address': '10.0.1.1'},
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_validate.assert_called_once_with('10.0.1.1')
+        self.assertEqual(Camera.objects.get(id=results[0]['id']).name, 'Renamed')
+        self.assertEqual(Camera.objects.get(id=results[1]['id']).ip_address, '10.0.1.1')
+    
+    @patch('cameras.bulk.queue_thumbnails')
+    def test_bulk_create_atomic(self, mock_queue):
+        """Test an atomic bulk create writes nothing when one item fails"""
+        items = [self.camera_data, dict(self.camera_data, ip_address='10.0.0.99')]
+        with patch('cameras.bulk.validate_camera_connection',
+                   side_effect=lambda address: (address != '10.0.0.99', 'online')):
+            response = self.client.post(reverse('camera-bulk'), {'cameras': items, 'atomic': True}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data['results']], ['skipped', 'unreachable'])
+        self.assertEqual(Camera.objects.count(), 0)
+        mock_queue.assert_not_called()
+        
+    @patch('cameras.probe.FleetProber.probe')
+    def test_check_camera_status(self, mock_probe):
         """Test checking camera status"""
         # Create a camera
-        mock_validate.return_value = (True, 'online')
         camera = Camera.objects.create(
             user=self.user,
             name='Test Camera',
@@ -74,8 +204,8 @@ class CameraTests(TestCase):
             status='online'
         )
         
-        # Mock the camera validation to return offline
-        mock_validate.return_value = (False, 'offline')
+        # Mock the camera probe to return unreachable
+        mock_probe.return_value = ProbeResult('192.168.1.100', 554, False, None)
         
         url = reverse('camera-check-status', args=[camera.id])
         response = self.client.post(url, format='json')
@@ -86,3 +216,1482 @@ class CameraTests(TestCase):
         # Refresh from database
         camera.refresh_from_db()
         self.assertEqual(camera.status, 'offline')
+    
+    def test_check_status_bulk(self):
+        """Test checking the status of all cameras against local sockets"""
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        self.addCleanup(listener.close)
+        open_port = listener.getsockname()[1]
+        
+        # Grab a port that nothing listens on
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+        
+        up = Camera.objects.create(
+            user=self.user, name='Up', location='Hall', status='offline',
+            camera_type='rtsp', ip_address=f'rtsp://127.0.0.1:{open_port}/stream'
+        )
+        down = Camera.objects.create(
+            user=self.user, name='Down', location='Hall', status='online',
+            camera_type='rtsp', ip_address=f'rtsp://127.0.0.1:{closed_port}/stream'
+        )
+        
+        url = reverse('camera-check-status-bulk')
+        with patch('cameras.views.queue_thumbnails'):
+            response = self.client.post(url, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = {item['id']: item['status'] for item in response.data}
+        self.assertEqual(statuses, {up.id: 'online', down.id: 'offline'})
+        
+        up.refresh_from_db()
+        down.refresh_from_db()
+        self.assertEqual(up.status, 'online')
+        self.assertEqual(down.status, 'offline')
+
+    @patch('cameras.views.check_camera_connection')
+    def test_test_connection_is_cached(self, mock_validate):
+        """Test that repeated connection tests hit the probe cache until forced"""
+        mock_validate.return_value = (True, 'online', None)
+        url = reverse('camera-test-connection')
+        data = {'ip_address': '192.168.1.100', 'camera_type': 'rtsp'}
+        # A status check of the same URL caches a TCP result, which has no stream details
+        tcp_key = probe_key('tcp', 'rtsp://192.168.1.100:554/stream')
+        get_probe_cache().set(tcp_key, (False, 'offline'))
+        
+        for _ in range(3):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.data['status'], 'online')
+        self.assertEqual(mock_validate.call_count, 1)
+        
+        self.client.post(url, dict(data, force=True), format='json')
+        self.assertEqual(mock_validate.call_count, 2)
+        
+        stats = self.client.get(reverse('camera-probe-cache')).data
+        self.assertEqual((stats['hits'], stats['misses'], stats['forced']), (2, 2, 1))
+        self.assertEqual(get_probe_cache().get(tcp_key), (False, 'offline'))
+
+    def test_live_preview_requires_authentication(self):
+        """Test the live preview endpoint with header-less stream token auth"""
+        camera = Camera.objects.create(
+            user=self.user, name='Live', ip_address='192.168.1.100', location='Hall'
+        )
+        other = Camera.objects.create(
+            user=self.user, name='Other', ip_address='192.168.1.101', location='Hall'
+        )
+        url = reverse('camera-live', args=[camera.id])
+        token = self.client.post(reverse('camera-live-token', args=[camera.id])).data['stream_token']
+        other_token = self.client.post(reverse('camera-live-token', args=[other.id])).data['stream_token']
+        
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        # The access token is no longer accepted in the URL
+        self.assertEqual(anonymous.get(url, {'token': self.token}).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(anonymous.get(url, {'stream_token': other_token}).status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(LIVE_STREAM_TOKEN_TTL=-1):
+            self.assertEqual(anonymous.get(url, {'stream_token': token}).status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        with patch('cameras.views.live_hub') as mock_hub:
+            response = anonymous.get(url, {'stream_token': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('multipart/x-mixed-replace'))
+        mock_hub.stream.assert_called_once_with('rtsp://192.168.1.100:554/stream')
+
+class FleetProberTests(TestCase):
+    def test_per_host_limit(self):
+        """Test that the per-host limit caps concurrent probes to one host"""
+        in_flight = {'now': 0, 'peak': 0}
+        
+        async def slow_probe(host, port):
+            in_flight['now'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+            await asyncio.sleep(0.01)
+            in_flight['now'] -= 1
+            return ProbeResult(host, port, True, 0.01)
+        
+        prober = FleetProber(concurrency=50, per_host=3, timeout=1)
+        prober.probe = slow_probe
+        targets = {i: ('10.0.0.1', 554 + i) for i in range(12)}
+        results = prober.run(targets)
+        
+        self.assertEqual(len(results), 12)
+        self.assertEqual(in_flight['peak'], 3)
+    
+    def test_busy_host_does_not_hold_global_slots(self):
+        """Test that probes queued behind their host's limit leave global slots to other hosts"""
+        in_flight = {'now': 0, 'peak': 0}
+        
+        async def slow_probe(host, port):
+            in_flight['now'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+            await asyncio.sleep(0.01)
+            in_flight['now'] -= 1
+            return ProbeResult(host, port, True, 0.01)
+        
+        prober = FleetProber(concurrency=3, per_host=1, timeout=1)
+        prober.probe = slow_probe
+        targets = {i: ('10.0.0.1', 554 + i) for i in range(6)}
+        targets.update({'b': ('10.0.0.2', 554), 'c': ('10.0.0.3', 554)})
+        results = prober.run(targets)
+        
+        self.assertEqual(len(results), 8)
+        self.assertEqual(in_flight['peak'], 3)
+
+class StreamProbeTests(TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeRTSPHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'rtsp://127.0.0.1:{self.server.server_address[1]}/stream'
+    
+    def test_probe_rtsp(self):
+        """Test probing a fake RTSP camera for codec and resolution"""
+        info = probe_stream(self.url, timeout=1)
+        
+        self.assertTrue(info.is_reachable)
+        self.assertEqual(info.status_code, 200)
+        self.assertEqual(info.codec, 'H264')
+        self.assertEqual((info.width, info.height), (1920, 1080))
+        self.assertIsNotNone(info.latency)
+    
+    @patch('cv2.VideoCapture')
+    def test_validate_stream_url_does_not_decode(self, mock_capture):
+        """Test that stream validation never opens an OpenCV capture"""
+        self.assertEqual(validate_stream_url(self.url), (True, 'online'))
+        mock_capture.assert_not_called()
+    
+    def test_test_connection_describes_stream(self):
+        """Test that the connection test returns what the probe found out"""
+        user = User.objects.create_user(username='probe', password='StrongPassword123!')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        get_probe_cache().clear()
+        self.addCleanup(get_probe_cache().clear)
+        
+        response = client.post(reverse('camera-test-connection'), {'ip_address': self.url}, format='json')
+        
+        self.assertTrue(response.data['is_reachable'])
+        stream = response.data['stream']
+        self.assertEqual((stream['protocol'], stream['codec']), ('rtsp', 'H264'))
+        self.assertEqual((stream['width'], stream['height']), (1920, 1080))
+        self.assertIsNotNone(stream['latency'])
+    
+    @patch('cameras.protocol.http.client.HTTPSConnection')
+    def test_probe_https_accepts_self_signed_certificates(self, mock_connection):
+        """Test that HTTPS probes do not verify the camera's certificate"""
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheader.return_value = 'image/jpeg'
+        
+        info = probe_stream('https://192.168.1.100/snapshot.jpg', timeout=1)
+        
+        self.assertTrue(info.is_reachable)
+        context = mock_connection.call_args.kwargs['context']
+        self.assertEqual(context.verify_mode, ssl.CERT_NONE)
+        self.assertFalse(context.check_hostname)
+    
+    def test_probe_unreachable(self):
+        """Test probing a port nothing listens on"""
+        self.server.server_close()
+        info = probe_stream(self.url, timeout=1)
+        
+        self.assertFalse(info.is_reachable)
+
+class FakeCapture:
+    """
+    Stands in for cv2.VideoCapture, producing numbered frames
+    """
+    opened = []
+    
+    def __init__(self, url, frames=None):
+        self.url = url
+        self.frames = frames
+        self.count = 0
+        FakeCapture.opened.append(url)
+    
+    def isOpened(self):
+        return not self.url.endswith('/down')
+    
+    def read(self):
+        time.sleep(0.005)
+        self.count += 1
+        if self.frames is not None and self.count > self.frames:
+            return False, None
+        return True, np.full((4, 4, 3), self.count % 256, dtype=np.uint8)
+    
+    def grab(self):
+        ok, self.pending = self.read()
+        return ok
+    
+    def retrieve(self):
+        return True, self.pending
+    
+    def release(self):
+        pass
+
+class CapturePoolTests(TestCase):
+    def setUp(self):
+        FakeCapture.opened = []
+    
+    def make_pool(self, **kwargs):
+        options = {'max_streams': 2, 'idle_timeout': 60, 'backoff_base': 0.05, 'backoff_max': 0.2}
+        options.update(kwargs)
+        pool = CapturePool(capture_factory=FakeCapture, **options)
+        self.addCleanup(pool.close)
+        return pool
+    
+    def test_latest_frame_reuses_stream(self):
+        """Test that repeated frame requests share one open stream"""
+        pool = self.make_pool()
+        first = pool.latest_frame('rtsp://cam/1', timeout=1)
+        second = pool.latest_frame('rtsp://cam/1', timeout=1, max_age=1)
+        
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertEqual(FakeCapture.opened, ['rtsp://cam/1'])
+        self.assertTrue(pool.has_fresh_frame('rtsp://cam/1'))
+    
+    def test_max_streams_evicts_least_recently_used(self):
+        """Test that opening past the cap closes the oldest stream"""
+        pool = self.make_pool()
+        for url in ('rtsp://cam/1', 'rtsp://cam/2', 'rtsp://cam/1', 'rtsp://cam/3'):
+            pool.acquire(url)
+        
+        self.assertEqual(list(pool.streams), ['rtsp://cam/1', 'rtsp://cam/3'])
+    
+    def test_idle_eviction_and_backoff(self):
+        """Test closing idle streams and backing off on dead ones"""
+        pool = self.make_pool(idle_timeout=0.01)
+        self.assertIsNone(pool.latest_frame('rtsp://cam/down', timeout=0.3))
+        
+        # Exponential backoff keeps reconnect attempts well below one per read
+        self.assertLessEqual(len(FakeCapture.opened), 4)
+        
+        # The janitor thread closes the stream once it has been idle
+        time.sleep(0.1)
+        self.assertEqual(len(pool.streams), 0)
+
+def write_synthetic_video(path, frames=60, moving_from=30, size=(640, 480), fps=10):
+    """
+    Write a static noisy scene where a bright square starts moving at
+    frame ``moving_from``
+    """
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 90, (height, width, 3), dtype=np.uint8)
+    for index in range(frames):
+        frame = background.copy()
+        if index >= moving_from:
+            x = 40 + (index - moving_from) * 12
+            frame[200:280, x:x + 80] = 255
+        writer.write(frame)
+    writer.release()
+
+class MotionDetectorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='motion', password='StrongPassword123!')
+        self.camera = Camera.objects.create(
+            user=self.user, name='Nursery', ip_address='192.168.1.50',
+            location='Nursery', status='online'
+        )
+    
+    def read_video(self, **kwargs):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(lambda: os.rmdir(directory))
+        path = os.path.join(directory, 'synthetic.avi')
+        write_synthetic_video(path, **kwargs)
+        self.addCleanup(os.remove, path)
+        
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+        cap.release()
+    
+    def test_detects_motion_only_when_scene_changes(self):
+        """Test the detector against a synthetic video"""
+        detector = MotionDetector(width=320, warmup=5)
+        results = [detector.process(frame) for frame in self.read_video(moving_from=30)]
+        
+        self.assertEqual(len(results), 60)
+        self.assertFalse(any(result.motion for result in results[:30]))
+        self.assertTrue(all(result.motion for result in results[31:]))
+    
+    @override_settings(ALERT_BATCH_INTERVAL=0, ALERT_EPISODE_WINDOW=0)
+    def test_monitor_raises_one_alert_per_cooldown(self):
+        """Test that motion frames become a single Motion alert"""
+        monitor = MotionMonitor(fps=5, cooldown=60, pool=CapturePool(capture_factory=FakeCapture))
+        self.addCleanup(monitor.pool.close)
+        for frame in self.read_video(moving_from=20, frames=40):
+            monitor.process_camera(self.camera, frame)
+        
+        alerts = Alert.objects.filter(camera=self.camera)
+        self.assertEqual(alerts.count(), 1)
+        self.assertEqual(alerts.get().alert_type, 'Motion')
+    
+    def test_excluded_zone_is_ignored(self):
+        """Test that motion inside an exclude zone is ignored and not analysed"""
+        band = {'mode': 'exclude', 'points': [[0, 0.35], [1, 0.35], [1, 0.65], [0, 0.65]]}
+        masked = MotionDetector(width=320, warmup=5, zones=[band])
+        full = MotionDetector(width=320, warmup=5)
+        results = []
+        for frame in self.read_video(moving_from=30):
+            results.append(masked.process(frame))
+            full.process(frame)
+        
+        self.assertFalse(any(result.motion for result in results))
+        self.assertLess(masked.pixels_analysed, full.pixels_analysed * 0.75)
+    
+    def test_include_zone_crops_and_maps_boxes(self):
+        """Test that an include zone limits detection and boxes stay in frame coordinates"""
+        right = {'mode': 'include', 'points': [[0.5, 0], [1, 0], [1, 1], [0.5, 1]]}
+        detector = MotionDetector(width=320, warmup=5, zones=[right])
+        results = [detector.process(frame) for frame in self.read_video(moving_from=30)]
+        
+        self.assertFalse(any(result.motion for result in results[:45]))
+        moving = [result for result in results[45:] if result.motion]
+        self.assertTrue(moving)
+        self.assertTrue(all(box[0] >= 159 for result in moving for box in result.boxes))
+        self.assertEqual(detector.zone_mask.builds, 1)
+    
+    def test_zone_mask_rebuilt_only_on_change(self):
+        """Test that the mask is cached until the zones or frame size change"""
+        zones = [{'mode': 'exclude', 'points': [[0, 0], [0.5, 0], [0.5, 0.5]]}]
+        mask = ZoneMask(zones)
+        mask.get((240, 320))
+        mask.get((240, 320))
+        mask.set_zones([dict(zone) for zone in zones])
+        mask.get((240, 320))
+        self.assertEqual(mask.builds, 1)
+        
+        mask.get((180, 320))
+        mask.set_zones([])
+        self.assertEqual(mask.get((180, 320)), (None, None))
+        self.assertEqual(mask.builds, 3)
+    
+    def test_zones_are_validated(self):
+        """Test that malformed zones are rejected by the API"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('camera-detail', args=[self.camera.id])
+        
+        response = client.patch(url, {'detection_zones': [{'mode': 'include', 'points': [[0, 0], [2, 0]]}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        zones = [{'mode': 'exclude', 'points': [[0, 0], [0.2, 0], [0.2, 0.2]]}]
+        response = client.patch(url, {'detection_zones': zones}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.detection_zones, zones)
+
+def write_wav(path, samples, sample_rate=16000):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+
+def synthetic_cry(seconds, sample_rate=16000):
+    """
+    Harmonic 450 Hz wail in one second bursts separated by short breaths
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 450 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    tone = sum(np.sin(k * phase) / k for k in range(1, 5))
+    bursts = (t % 1.3) < 1.0
+    return 0.3 * tone * bursts
+
+class CryDetectorTests(TestCase):
+    def analyse(self, samples):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'audio.wav')
+        write_wav(path, samples)
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, path)
+        return detect_cries_in_wav(path)
+    
+    def test_continuous_cry_is_one_episode(self):
+        """Test that hysteresis folds a long cry into a single onset"""
+        silence = np.zeros(16000 * 2)
+        onsets = self.analyse(np.concatenate([silence, synthetic_cry(8), silence]))
+        
+        self.assertEqual(len(onsets), 1)
+        self.assertGreater(onsets[0], 2)
+        self.assertLess(onsets[0], 3)
+    
+    def test_separate_cries_and_noise(self):
+        """Test that noise is ignored and cries apart are separate episodes"""
+        rng = np.random.default_rng(0)
+        noise = 0.3 * rng.standard_normal(16000 * 4)
+        silence = np.zeros(16000 * 3)
+        onsets = self.analyse(np.concatenate([noise, synthetic_cry(3), silence, synthetic_cry(3)]))
+        
+        self.assertEqual(len(onsets), 2)
+
+class IngestSchedulerTests(TestCase):
+    def test_rebalance_keeps_shards_even_and_sticky(self):
+        """Test that rebalancing spreads cameras and moves as few as possible"""
+        scheduler = IngestScheduler(workers=3, fps=5)
+        
+        changed = scheduler.rebalance(range(1, 10))
+        self.assertEqual(sorted(changed), [0, 1, 2])
+        self.assertEqual([len(shard) for shard in scheduler.shards()], [3, 3, 3])
+        before = dict(scheduler.assignment)
+        
+        # Two cameras of the first worker go offline, one camera is added
+        gone = sorted(scheduler.shards()[0])[:2]
+        remaining = [camera_id for camera_id in range(1, 11) if camera_id not in gone]
+        scheduler.rebalance(remaining)
+        
+        sizes = sorted(len(shard) for shard in scheduler.shards())
+        self.assertEqual(sizes, [2, 3, 3])
+        moved = [
+            camera_id for camera_id in remaining
+            if camera_id in before and before[camera_id] != scheduler.assignment[camera_id]
+        ]
+        self.assertLessEqual(len(moved), 1)
+    
+    def test_tick_resends_shards_of_edited_cameras(self):
+        """Test that a worker is sent its shard again when one of its cameras is edited"""
+        scheduler = IngestScheduler(workers=2, fps=5)
+        scheduler.commands = [MagicMock(), MagicMock()]
+        scheduler.processes = [MagicMock(), MagicMock()]
+        scheduler.capture_commands = [MagicMock(), MagicMock()]
+        scheduler.captures = [MagicMock(), MagicMock()]
+        versions = {1: 'a', 2: 'a', 3: 'a', 4: 'a'}
+        
+        with patch.object(scheduler, 'online_cameras', side_effect=lambda: dict(versions)):
+            scheduler.tick()
+            queues = scheduler.commands + scheduler.capture_commands
+            for commands in queues:
+                commands.put.reset_mock()
+            
+            # Nothing changed: nothing is sent
+            scheduler.tick()
+            self.assertFalse(any(commands.put.called for commands in queues))
+            
+            versions[3] = 'b'
+            scheduler.tick()
+        
+        index = scheduler.assignment[3]
+        for commands in (scheduler.commands, scheduler.capture_commands):
+            commands[index].put.assert_called_once_with(sorted(scheduler.shards()[index]))
+            commands[1 - index].put.assert_not_called()
+    
+    def test_monitor_drops_stale_frames(self):
+        """Test that a slow analysis loop skips frames instead of queueing them"""
+        user = User.objects.create_user(username='ingest', password='StrongPassword123!')
+        camera = Camera.objects.create(
+            user=user, name='Hall', ip_address='192.168.1.60', location='Hall', status='online'
+        )
+        pool = CapturePool(capture_factory=FakeCapture)
+        self.addCleanup(pool.close)
+        monitor = MotionMonitor(fps=5, refresh_interval=None, pool=pool)
+        monitor.set_cameras([camera])
+        
+        # The first tick opens the stream, the second analyses its first frame
+        monitor.tick()
+        pool.latest_frame(get_stream_url(camera), timeout=1)
+        monitor.tick()
+        time.sleep(0.1)
+        monitor.tick()
+        
+        stats = monitor.stats()['cameras'][camera.id]
+        self.assertGreaterEqual(stats['analysed'], 1)
+        self.assertGreater(stats['dropped'], 0)
+        self.assertLess(stats['lag'], 0.1)
+
+    def test_monitor_keeps_more_cameras_than_pool_streams(self):
+        """Test that watching more cameras than max_streams does not reopen them every tick"""
+        FakeCapture.opened = []
+        user = User.objects.create_user(username='crowd', password='StrongPassword123!')
+        cameras = [
+            Camera.objects.create(
+                user=user, name=f'Cam {i}', ip_address=f'192.168.1.{100 + i}', location='Hall', status='online'
+            )
+            for i in range(5)
+        ]
+        pool = CapturePool(max_streams=2, capture_factory=FakeCapture)
+        self.addCleanup(pool.close)
+        monitor = MotionMonitor(fps=5, refresh_interval=None, pool=pool)
+        monitor.set_cameras(cameras)
+        
+        with patch.object(monitor, 'process_camera'):
+            for _ in range(3):
+                monitor.tick()
+                time.sleep(0.05)
+        
+        self.assertEqual(len(FakeCapture.opened), 5)
+        self.assertEqual(len(pool.streams), 5)
+        self.assertTrue(all(monitor.analysed[camera.id] >= 1 for camera in cameras))
+        
+        # Other readers still get max_streams on top of the monitor's cameras
+        monitor.set_cameras(cameras[:1])
+        pool.acquire('rtsp://other/1')
+        pool.acquire('rtsp://other/2')
+        self.assertEqual(len(pool.streams), 3)
+
+def sum_ring_frame(name, shape, slots, seq, results):
+    ring = SharedFrameRing.attach(name, shape, slots)
+    results.put(int(ring.read(seq).sum()))
+    ring.close()
+
+class SharedFrameRingTests(TestCase):
+    def setUp(self):
+        self.shape = (8, 8, 3)
+        self.ring = SharedFrameRing.create(self.shape, slots=4)
+        self.addCleanup(self.ring.close)
+    
+    def frame(self, value):
+        return np.full(self.shape, value, dtype=np.uint8)
+    
+    def test_views_are_zero_copy_and_read_only(self):
+        """Test that readers get read-only views of the shared slots"""
+        seq = self.ring.write(self.frame(7))
+        reader = SharedFrameRing.attach(self.ring.name, self.shape, slots=4)
+        
+        view = reader.read(seq)
+        self.assertEqual(int(view[0, 0, 0]), 7)
+        self.assertFalse(view.flags.writeable)
+        
+        # The producer's next write to the slot shows through the view
+        self.ring.frames[seq % 4][:] = 9
+        self.assertEqual(int(view[0, 0, 0]), 9)
+        del view
+        reader.close()
+    
+    def test_detects_overwritten_slots(self):
+        """Test that a reader can tell its frame was overwritten"""
+        first = self.ring.write(self.frame(1))
+        for value in range(2, 6):
+            self.ring.write(self.frame(value))
+        
+        self.assertFalse(self.ring.is_current(first))
+        self.assertIsNone(self.ring.read(first))
+        seq, view = self.ring.read_latest()
+        self.assertEqual(seq, 5)
+        self.assertEqual(int(view[0, 0, 0]), 5)
+    
+    def test_monitor_reads_frames_from_announced_rings(self):
+        """Test that the analysis loop reads ring frames like pooled ones"""
+        user = User.objects.create_user(username='ringmonitor', password='StrongPassword123!')
+        camera = Camera.objects.create(
+            user=user, name='Yard', ip_address='192.168.1.61', location='Yard', status='online'
+        )
+        url = get_stream_url(camera)
+        announcements = queue.Queue()
+        source = RingFrameSource(announcements)
+        self.addCleanup(source.close)
+        monitor = MotionMonitor(fps=5, refresh_interval=None, pool=source)
+        monitor.set_cameras([camera])
+        
+        # Nothing announced yet
+        monitor.tick()
+        self.assertEqual(monitor.stats()['cameras'][camera.id]['analysed'], 0)
+        
+        announcements.put(('ring', url, self.ring.name, self.shape, 4))
+        announcements.put(('stats', {url: {'grabbed': 3, 'decoded': 2}}))
+        self.ring.write(self.frame(1), timestamp=time.monotonic_ns())
+        self.ring.write(self.frame(2), timestamp=time.monotonic_ns())
+        source.poll()
+        with patch.object(monitor, 'process_camera') as process_camera:
+            monitor.tick()
+        
+        frame = process_camera.call_args[0][1]
+        self.assertEqual(int(frame[0, 0, 0]), 2)
+        self.assertFalse(frame.flags.writeable)
+        stats = monitor.stats()['cameras'][camera.id]
+        self.assertEqual((stats['analysed'], stats['overwritten'], stats['decoded']), (1, 0, 2))
+        self.assertLess(stats['lag'], 1)
+        del frame, process_camera
+        
+        announcements.put(('closed', url))
+        source.poll()
+        self.assertEqual(source.streams, {})
+    
+    def test_ring_in_use_is_closed_once_its_frames_are_released(self):
+        """Test that a ring released while a frame view is alive is kept and closed later"""
+        announcements = queue.Queue()
+        source = RingFrameSource(announcements)
+        self.addCleanup(source.close)
+        announcements.put(('ring', 'rtsp://cam/yard', self.ring.name, self.shape, 4))
+        self.ring.write(self.frame(4))
+        source.poll()
+        stream = source.acquire('rtsp://cam/yard')
+        frame = stream.latest_frame()
+        
+        announcements.put(('closed', 'rtsp://cam/yard'))
+        source.poll()
+        self.assertEqual(source.streams, {})
+        self.assertEqual(len(source.closing), 1)
+        self.assertIsNone(stream.latest_frame())
+        self.assertEqual(int(frame[0, 0, 0]), 4)
+        
+        del frame
+        source.poll()
+        self.assertEqual(source.closing, [])
+    
+    def test_reader_in_another_process(self):
+        """Test reading a frame from a consumer process"""
+        seq = self.ring.write(self.frame(3))
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=sum_ring_frame, args=(self.ring.name, self.shape, 4, seq, results)
+        )
+        process.start()
+        process.join(timeout=10)
+        
+        self.assertEqual(results.get(timeout=1), 3 * 8 * 8 * 3)
+
+class InlineExecutor:
+    """
+    Runs submitted work in the calling thread (and its database transaction)
+    """
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+@patch('cameras.clips._writer', InlineExecutor())
+@patch('cameras.clips._encoder', InlineExecutor())
+class ClipRecorderTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        user = User.objects.create_user(username='clips', password='StrongPassword123!')
+        self.camera = Camera.objects.create(
+            user=user, name='Door', ip_address='192.168.1.70', location='Door', status='online'
+        )
+    
+    def test_ring_is_bounded_by_time_and_bytes(self):
+        """Test that the encoded ring never exceeds its window or byte budget"""
+        ring = EncodedFrameRing(seconds=2, max_bytes=1000)
+        for index in range(100):
+            ring.append(index * 0.1, b'x' * 30)
+        self.assertEqual(len(ring.frames), 21)
+        
+        for index in range(100):
+            ring.append(10 + index * 0.01, b'x' * 300)
+        self.assertLessEqual(ring.size, 1000)
+        self.assertEqual(len(ring.frames), 3)
+    
+    def test_clip_contains_pre_and_post_event_frames(self):
+        """Test that a triggered clip is written and stored on the alert"""
+        alert = Alert.objects.create(camera=self.camera, alert_type='Motion', message='Motion')
+        recorder = ClipRecorder(pre_seconds=1, post_seconds=1, max_bytes=10 ** 6, width=160, quality=70)
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        
+        with override_settings(MEDIA_ROOT=self.media_root):
+            for index in range(20):
+                recorder.add_frame(frame, timestamp=index * 0.2)
+            recorder.trigger(alert, timestamp=3.8)
+            futures = []
+            for index in range(20, 30):
+                futures += recorder.add_frame(frame, timestamp=index * 0.2).result()
+            futures += recorder.flush_expired(timestamp=100)
+            paths = [future.result() for future in futures]
+        
+        self.assertEqual(paths, ['alert_clips/%d.mp4' % alert.id])
+        alert.refresh_from_db()
+        self.assertEqual(alert.clip.name, paths[0])
+        cap = cv2.VideoCapture(os.path.join(self.media_root, paths[0]))
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        
+        # One second before the event at 5 fps, one second after it
+        self.assertGreaterEqual(frames, 10)
+        self.assertLessEqual(frames, 12)
+    
+    def test_clip_writes_are_bounded_and_checked(self):
+        """Test that clips are dropped when the writer lags, and none is stored if no codec opens"""
+        alerts = [Alert.objects.create(camera=self.camera, alert_type='Motion', message='Motion') for _ in range(3)]
+        frames = [(index * 0.2, cv2.imencode('.jpg', np.zeros((120, 160, 3), dtype=np.uint8))[1].tobytes())
+                  for index in range(5)]
+        
+        writer = MagicMock()
+        with override_settings(ALERT_CLIP_WRITE_QUEUE=2), patch('cameras.clips._writer', writer):
+            futures = [submit_clip([alert], frames) for alert in alerts]
+        self.assertEqual(writer.submit.call_count, 2)
+        self.assertIsNone(futures[2])
+        # Let the two queued clips count as written again
+        for call in writer.submit.call_args_list:
+            with patch('cameras.clips.write_clip'):
+                call[0][0](*call[0][1:])
+        
+        with override_settings(MEDIA_ROOT=self.media_root, ALERT_CLIP_FOURCCS=['XXXX']):
+            self.assertIsNone(write_clip(alerts[:1], frames))
+        alerts[0].refresh_from_db()
+        self.assertFalse(alerts[0].clip)
+    
+    def test_frames_are_encoded_off_the_caller(self):
+        """Test that add_frame only queues a private copy and drops frames when the encoder lags"""
+        encoder = MagicMock()
+        recorder = ClipRecorder(pre_seconds=1, post_seconds=1, max_bytes=10 ** 6, width=160, max_queued=2)
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        
+        with patch('cameras.clips._encoder', encoder), patch.object(recorder, 'encode') as encode:
+            for index in range(3):
+                recorder.add_frame(frame, timestamp=index * 0.2)
+        
+        encode.assert_not_called()
+        self.assertEqual(encoder.submit.call_count, 2)
+        self.assertEqual(recorder.dropped, 1)
+        queued = encoder.submit.call_args[0][1]
+        self.assertIsNot(queued, frame)
+        
+        recorder._add_encoded(queued, 0.4)
+        self.assertEqual((recorder.queued, len(recorder.ring.frames)), (1, 1))
+
+class ProbeCacheTests(TestCase):
+    def test_normalize_url(self):
+        """Test that spelling variants of a URL share a key"""
+        self.assertEqual(
+            normalize_url('RTSP://Cam.Local:554/stream/'),
+            normalize_url('rtsp://cam.local/stream'),
+        )
+        self.assertNotEqual(normalize_url('rtsp://cam/a'), normalize_url('rtsp://cam:8554/a'))
+    
+    def test_ttls_and_lru_eviction(self):
+        """Test the positive/negative TTLs and the size bound"""
+        cache = ProbeCache(positive_ttl=60, negative_ttl=0.05, max_entries=2)
+        cache.set('a', (True, 'online'))
+        cache.set('b', (False, 'offline'))
+        self.assertEqual(cache.get('b'), (False, 'offline'))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('b'))
+        
+        cache.set('c', (True, 'online'))
+        cache.get('a')
+        cache.set('d', (True, 'online'))
+        self.assertEqual(list(cache.entries), ['a', 'd'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+    
+    def test_concurrent_misses_share_one_probe(self):
+        """Test that concurrent requests for a URL run a single probe"""
+        cache = ProbeCache(positive_ttl=60, negative_ttl=5, max_entries=10)
+        calls = []
+        
+        def slow_probe():
+            calls.append(1)
+            time.sleep(0.1)
+            return True, 'online'
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_probe('rtsp://cam/1', slow_probe)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(True, 'online')] * 8)
+        self.assertEqual(cache.stats()['coalesced'], 7)
+
+class LiveHubTests(TestCase):
+    def setUp(self):
+        FakeCapture.opened = []
+    
+    def test_one_encode_fanned_out_and_torn_down(self):
+        """Test that viewers share encoded frames and the broadcast stops with the last one"""
+        pool = CapturePool(capture_factory=FakeCapture, idle_timeout=0.5)
+        self.addCleanup(pool.close)
+        hub = LiveHub(pool=pool)
+        
+        async def watch(parts):
+            stream = hub.stream('rtsp://cam/live')
+            received = [await stream.__anext__() for _ in range(parts)]
+            await stream.aclose()
+            return received
+        
+        async def main():
+            return await asyncio.gather(watch(5), watch(3))
+        
+        first, second = asyncio.run(main())
+        
+        self.assertTrue(all(part.startswith(b'--frame\r\nContent-Type: image/jpeg') for part in first + second))
+        self.assertEqual(FakeCapture.opened, ['rtsp://cam/live'])
+        self.assertEqual(hub.broadcasts, {})
+        
+        # The shared stream stays open for other readers until it goes idle
+        self.assertEqual(list(pool.streams), ['rtsp://cam/live'])
+        time.sleep(0.6)
+        pool.evict_idle()
+        self.assertEqual(len(pool.streams), 0)
+    
+    def test_stalled_camera_keeps_sending_heartbeats(self):
+        """Test that the last frame is resent while no new one arrives, so dead viewers get noticed"""
+        def stalled(frame_count, timeout):
+            time.sleep(0.01)
+            return frame_count, None
+        
+        pool = MagicMock()
+        pool.acquire.return_value.wait_for_frame.side_effect = stalled
+        hub = LiveHub(pool=pool, heartbeat=0.05)
+        
+        async def watch():
+            stream = hub.stream('rtsp://cam/stalled')
+            first = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.01)
+            hub.broadcasts['rtsp://cam/stalled'].publish(b'jpeg')
+            started = time.monotonic()
+            parts = [await first, await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return parts, time.monotonic() - started
+        
+        parts, elapsed = asyncio.run(watch())
+        
+        self.assertEqual(len(set(parts)), 1)
+        self.assertTrue(parts[0].endswith(b'jpeg\r\n'))
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(hub.broadcasts, {})
+    
+    def test_encodes_once_per_frame_for_all_viewers(self):
+        """Test that the encode count does not grow with the number of viewers"""
+        pool = CapturePool(capture_factory=FakeCapture)
+        self.addCleanup(pool.close)
+        hub = LiveHub(pool=pool)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        
+        broadcasts = [hub.subscribe('rtsp://cam/fan', key, loop, asyncio.Event()) for key in range(10)]
+        time.sleep(0.1)
+        broadcast = broadcasts[0]
+        for key in range(10):
+            hub.unsubscribe('rtsp://cam/fan', key)
+        
+        self.assertTrue(all(other is broadcast for other in broadcasts))
+        self.assertEqual(broadcast.encoded, broadcast.seq)
+        self.assertTrue(broadcast.stopped.is_set())
+
+
+class AdaptiveSamplerTests(TestCase):
+    def make_sampler(self):
+        return AdaptiveSampler(full_fps=10, idle_fps=1, quiet_after=2, threshold=4, window=1)
+    
+    def run_frames(self, sampler, frames, start=0, fps=30):
+        """Feed frames at ``fps`` and return the timestamps that were decoded"""
+        decoded = []
+        for i, frame in enumerate(frames):
+            now = start + i / fps
+            if sampler.should_decode(now):
+                sampler.observe(frame, now)
+                decoded.append(now)
+        return decoded
+    
+    def test_static_scene_drops_to_idle_rate(self):
+        """Test that a static scene is decoded at the idle rate after the quiet period"""
+        sampler = self.make_sampler()
+        static = np.full((48, 64, 3), 100, dtype=np.uint8)
+        decoded = self.run_frames(sampler, [static] * 300)
+        
+        self.assertTrue(sampler.idle)
+        self.assertEqual(len([t for t in decoded if t >= 3]), 7)
+        self.assertEqual(sampler.grabbed, 300)
+        self.assertGreater(sampler.stats()['decode_saved'], 0.8)
+    
+    def test_change_restores_full_rate(self):
+        """Test that a scene change switches straight back to the full rate"""
+        sampler = self.make_sampler()
+        static = np.full((48, 64, 3), 100, dtype=np.uint8)
+        self.run_frames(sampler, [static] * 150)
+        self.assertTrue(sampler.idle)
+        
+        rng = np.random.default_rng(0)
+        busy = [rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(60)]
+        decoded = self.run_frames(sampler, busy, start=6)
+        
+        self.assertFalse(sampler.idle)
+        self.assertGreaterEqual(len(decoded), 18)
+    
+    def test_pool_stream_reports_sampling(self):
+        """Test that pooled streams grab every frame but decode only sampled ones"""
+        pool = CapturePool(capture_factory=FakeCapture, sampler_factory=lambda: AdaptiveSampler(full_fps=20))
+        self.addCleanup(pool.close)
+        self.assertIsNotNone(pool.latest_frame('rtsp://cam/sampled', timeout=2))
+        time.sleep(0.3)
+        
+        stats = pool.stats()['rtsp://cam/sampled']
+        self.assertGreater(stats['grabbed'], stats['decoded'])
+        self.assertEqual(stats['frames'], stats['decoded'])
+
+
+class BrightStage(Stage):
+    """Raises a test alert when the frame is mostly bright"""
+    name = 'bright'
+    inputs = ('gray', 'hsv')
+    
+    def process(self, context):
+        gray, hsv = context['gray'], context['hsv']
+        if gray.mean() > 200 and hsv[..., 2].mean() > 200:
+            return [StageOutput('Motion', 'Bright')]
+        return []
+
+class DarkStage(Stage):
+    name = 'dark'
+    inputs = ('gray',)
+    
+    def process(self, context):
+        return [] if context['gray'].mean() > 50 else [StageOutput('Motion', 'Dark')]
+
+class PipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pipeline', password='StrongPassword123!')
+        self.camera = Camera.objects.create(
+            user=self.user, name='Hall', ip_address='192.168.1.60', location='Hall',
+            status='online', enable_motion_detection=False, enabled_stages=['bright', 'dark']
+        )
+        stages = patch.dict(STAGES, {'bright': BrightStage, 'dark': DarkStage})
+        stages.start()
+        self.addCleanup(stages.stop)
+    
+    def test_inputs_are_computed_once_per_frame(self):
+        """Test that stages sharing an input trigger a single computation"""
+        calls = []
+        counted = {
+            name: (lambda context, name=name, func=func: calls.append(name) or func(context))
+            for name, func in INPUTS.items()
+        }
+        with patch.dict(INPUTS, counted):
+            pipeline = CameraPipeline(self.camera)
+            pipeline.process(np.full((480, 640, 3), 128, dtype=np.uint8))
+        
+        self.assertEqual(sorted(calls), ['gray', 'hsv', 'small'])
+        stats = pipeline.stats()
+        self.assertEqual(stats['bright']['calls'], 1)
+        self.assertEqual(stats['input:gray']['calls'], 1)
+    
+    def test_shared_input_size(self):
+        """Test that derived inputs are at the analysis width"""
+        context = FrameContext(np.zeros((720, 1280, 3), dtype=np.uint8), width=320)
+        self.assertEqual(context['blurred'].shape, (180, 320))
+        self.assertIs(context['gray'], context['gray'])
+    
+    @override_settings(ALERT_BATCH_INTERVAL=0, ALERT_EPISODE_WINDOW=0)
+    def test_outputs_become_alerts_with_cooldown(self):
+        """Test that stage outputs are stored as alerts, once per cooldown"""
+        pipeline = CameraPipeline(self.camera, cooldown=60)
+        bright = np.full((48, 64, 3), 255, dtype=np.uint8)
+        alerts = pipeline.process(bright) + pipeline.process(bright)
+        
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(Alert.objects.get(camera=self.camera).message, 'Bright')
+    
+    @override_settings(ALERT_BATCH_INTERVAL=0, ALERT_EPISODE_WINDOW=60, ALERT_EPISODE_PUSH_INTERVAL=60)
+    def test_repeats_reach_the_coalescer(self):
+        """Test that repeated outputs are counted into one episode instead of being dropped"""
+        coalescer = AlertCoalescer()
+        self.addCleanup(coalescer.close)
+        pipeline = CameraPipeline(self.camera, cooldown=60)
+        bright = np.full((48, 64, 3), 255, dtype=np.uint8)
+        with patch('alerts.coalescing.get_alert_coalescer', return_value=coalescer):
+            alerts = [alert for _ in range(5) for alert in pipeline.process(bright)]
+            coalescer.close()
+        
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(Alert.objects.get(camera=self.camera).count, 5)
+    
+    def test_stages_follow_camera_settings(self):
+        """Test that only the stages enabled for the camera run"""
+        pipeline = CameraPipeline(self.camera)
+        self.assertEqual(list(pipeline.stages), ['bright', 'dark'])
+        
+        self.camera.enabled_stages = ['dark']
+        self.camera.enable_motion_detection = True
+        pipeline.configure(self.camera)
+        self.assertEqual(sorted(pipeline.stages), ['dark', 'motion'])
+        
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.patch(
+            reverse('camera-detail', args=[self.camera.id]), {'enabled_stages': ['nope']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkTests(TestCase):
+    def test_suite_reports_throughput_and_quality(self):
+        """Test a small benchmark run and the regression check"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        report = run_suite(directory, scenarios=('static', 'blobs'), resolutions=((320, 180),), frames=30)
+        
+        static, blobs = report['results']
+        self.assertEqual(static['false_positives'], 0)
+        self.assertGreater(blobs['recall'], 0.8)
+        self.assertGreater(blobs['fps_per_core'], 0)
+        self.assertLessEqual(blobs['latency_ms']['p50'], blobs['latency_ms']['p99'])
+        # Each scenario runs in its own process, so memory is not cumulative
+        self.assertGreaterEqual(blobs['scenario_rss_mb'], 0)
+        self.assertLess(blobs['scenario_rss_mb'], blobs['peak_rss_mb'])
+        self.assertEqual(os.listdir(directory), [])
+        
+        slower = {'results': [dict(blobs, fps_per_core=blobs['fps_per_core'] / 2)]}
+        self.assertEqual(compare_reports(report, report), [])
+        self.assertEqual(compare_reports(report, slower)[0][3], 'fps_per_core')
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='thumbs', password='StrongPassword123!')
+        self.camera = Camera.objects.create(
+            user=self.user, name='Porch', ip_address='192.168.1.70', location='Porch'
+        )
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+    
+    def test_renders_every_size_from_one_chain(self):
+        """Test that each size is encoded at its width, largest first"""
+        frame = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+        images = render_thumbnails(frame, sizes={'tile': 200, 'card': 480, 'full': 0}, fmt='jpeg')
+        
+        self.assertEqual(list(images), ['full', 'card', 'tile'])
+        widths = {
+            name: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[1]
+            for name, (data, fmt) in images.items()
+        }
+        self.assertEqual(widths, {'full': 1920, 'card': 480, 'tile': 200})
+        
+        data, fmt = render_thumbnails(frame, sizes={'tile': 200}, fmt='webp')['tile']
+        self.assertEqual(fmt, 'webp')
+        self.assertEqual(data[8:12], b'WEBP')
+    
+    def blob_files(self):
+        found = []
+        for root, _, files in os.walk(os.path.join(self.media, 'thumbnail_blobs')):
+            found.extend(files)
+        return sorted(found)
+    
+    def test_serializer_exposes_every_size(self):
+        """Test that identical renders share blobs and every size shows up in the API"""
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        with override_settings(MEDIA_ROOT=self.media):
+            first = store_thumbnails(self.camera, render_thumbnails(frame, sizes={'tile': 200, 'full': 0}))
+            second = store_thumbnails(self.camera, render_thumbnails(frame, sizes={'tile': 200, 'full': 0}))
+            
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            response = client.get(reverse('camera-detail', args=[self.camera.id]))
+        
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.blob_files()), 2)
+        self.assertEqual(set(response.data['thumbnails']), {'tile', 'full'})
+        self.assertTrue(response.data['thumbnails']['tile'].endswith(second['tile']))
+        self.assertTrue(response.data['thumbnail'].endswith(second['full']))
+    
+    def test_similar_frames_keep_thumbnail_and_orphans_are_collected(self):
+        """Test perceptual-hash reuse and garbage collection of replaced blobs"""
+        rng = np.random.default_rng(0)
+        x = np.linspace(0, 6 * np.pi, 640)
+        y = np.linspace(0, 4 * np.pi, 360)
+        shade = (127 + 100 * np.sin(x)[None, :] * np.cos(y)[:, None]).astype(np.uint8)
+        scene = np.dstack([shade] * 3)
+        noisy = np.clip(scene + rng.normal(0, 3, scene.shape), 0, 255).astype(np.uint8)
+        other = cv2.flip(scene, 1)
+        pool = MagicMock()
+        
+        with override_settings(MEDIA_ROOT=self.media, THUMBNAIL_SIZES={'tile': 200}):
+            with patch('cameras.thumbnails.get_capture_pool', return_value=pool):
+                for frame in (scene, noisy):
+                    pool.latest_frame.return_value = frame
+                    self.assertTrue(capture_camera_thumbnail(self.camera))
+                self.assertEqual(len(self.blob_files()), 1)
+                
+                pool.latest_frame.return_value = other
+                capture_camera_thumbnail(self.camera)
+                self.assertEqual(len(self.blob_files()), 2)
+            
+            self.assertEqual(collect_thumbnail_garbage(grace=3600)[0], 0)
+            deleted, freed = collect_thumbnail_garbage(grace=-60)
+        
+        self.assertEqual(deleted, 1)
+        self.assertGreater(freed, 0)
+        self.camera.refresh_from_db()
+        self.assertEqual(self.blob_files(), [os.path.basename(self.camera.thumbnails['tile'])])
+    
+    def test_reused_blob_survives_garbage_collection(self):
+        """Test that storing an existing blob again refreshes its age"""
+        images = render_thumbnails(np.zeros((90, 160, 3), dtype=np.uint8), sizes={'tile': 80})
+        with override_settings(MEDIA_ROOT=self.media):
+            path = store_thumbnails(self.camera, images)['tile']
+            full_path = os.path.join(self.media, path)
+            os.utime(full_path, (0, 0))
+            
+            # Collection read the references before the camera was pointed at the blob again
+            with patch('cameras.thumbnails.Camera.objects.values_list', return_value=[]):
+                store_thumbnails(self.camera, images)
+                deleted, _ = collect_thumbnail_garbage(grace=3600)
+        
+        self.assertEqual(deleted, 0)
+        self.assertTrue(os.path.exists(full_path))
+    
+    def test_blob_reused_on_remote_storage_survives_garbage_collection(self):
+        """Test that references are checked again at delete time when blob ages cannot be refreshed"""
+        images = render_thumbnails(np.zeros((90, 160, 3), dtype=np.uint8), sizes={'tile': 80})
+        with override_settings(MEDIA_ROOT=self.media):
+            path = store_thumbnails(self.camera, images)['tile']
+            full_path = os.path.join(self.media, path)
+            os.utime(full_path, (0, 0))
+            
+            with patch('cameras.thumbnails.Camera.objects.values_list', return_value=[]), \
+                    patch('cameras.thumbnails.touch_blob'):
+                store_thumbnails(self.camera, images)
+                deleted, _ = collect_thumbnail_garbage(grace=3600)
+            self.assertTrue(os.path.exists(full_path))
+            
+            self.camera.thumbnails = {}
+            self.camera.thumbnail = None
+            self.camera.save()
+            self.assertEqual(collect_thumbnail_garbage(grace=3600)[0], 1)
+        
+        self.assertEqual(deleted, 0)
+    
+    def test_thumbnail_conditional_get(self):
+        """Test strong ETags, 304 responses and long caching of versioned URLs"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('camera-thumbnail-image', args=[self.camera.id])
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        
+        with override_settings(MEDIA_ROOT=self.media):
+            store_thumbnails(self.camera, render_thumbnails(np.zeros((90, 160, 3), dtype=np.uint8), sizes={'tile': 80}))
+            response = client.get(url, {'size': 'tile'})
+            etag = response['ETag']
+            body = b''.join(response.streaming_content)
+            
+            cached = client.get(url, {'size': 'tile'}, HTTP_IF_NONE_MATCH=etag)
+            versioned = client.get(url, {'size': 'tile', 'v': etag.strip('"')})
+            versioned.close()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(body.startswith(b'\xff\xd8'))
+        self.assertRegex(etag, r'^"[0-9a-f]{64}"$')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('immutable', versioned['Cache-Control'])
+    
+    def test_queue_skips_cameras_already_pending(self):
+        """Test that a camera is queued at most once at a time"""
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_capture(camera_id):
+            started.set()
+            release.wait(5)
+        
+        with patch('cameras.thumbnails._capture', side_effect=slow_capture) as capture:
+            first = queue_thumbnails([self.camera.id])
+            started.wait(5)
+            again = queue_thumbnails([self.camera.id, self.camera.id])
+            release.set()
+            for future in first:
+                future.result(5)
+        
+        self.assertEqual(len(first), 1)
+        self.assertEqual(again, [])
+        self.assertEqual(capture.call_count, 1)
+
+
+class VariantCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+    
+    def test_evicts_least_recently_used_within_budget(self):
+        """Test that the cache stays under its byte budget, evicting the oldest use"""
+        cache = VariantCache(self.directory, max_bytes=250)
+        for key in ('a', 'b'):
+            cache.get_or_render(key, lambda: b'x' * 100)
+        cache.get_or_render('a', lambda: self.fail('a should be cached'))
+        cache.get_or_render('c', lambda: b'y' * 100)
+        
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a', 'c'])
+        self.assertEqual(cache.stats()['bytes'], 200)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        
+        reopened = VariantCache(self.directory, max_bytes=250)
+        self.assertEqual(reopened.get_or_render('c', lambda: self.fail('c should be on disk')), b'y' * 100)
+        self.assertEqual(reopened.stats()['entries'], 2)
+    
+    def test_budget_covers_caches_sharing_a_directory(self):
+        """Test that caches of several processes keep their shared directory within one budget"""
+        caches = [VariantCache(self.directory, max_bytes=1000) for _ in range(2)]
+        for index in range(10):
+            caches[index % 2].get_or_render(f'v{index}', lambda: b'x' * 200)
+        
+        sizes = [os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)]
+        self.assertLessEqual(sum(sizes), 1000)
+        self.assertEqual(sorted(os.listdir(self.directory)), [f'v{index}' for index in range(5, 10)])
+    
+    def test_concurrent_misses_render_once(self):
+        """Test that concurrent requests for one variant share a single render"""
+        cache = VariantCache(self.directory, max_bytes=1000)
+        renders = []
+        
+        def render():
+            renders.append(1)
+            time.sleep(0.2)
+            return b'variant'
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_render('k', render))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(results, [b'variant'] * 5)
+        self.assertEqual(cache.stats()['coalesced'], 4)
+    
+    def test_resize_endpoint(self):
+        """Test on-demand variants, their ETags and parameter validation"""
+        user = User.objects.create_user(username='variants', password='StrongPassword123!')
+        camera = Camera.objects.create(user=user, name='Yard', ip_address='192.168.1.80', location='Yard')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('camera-thumbnail-image', args=[camera.id])
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        cache = VariantCache(self.directory, max_bytes=10 ** 6)
+        
+        with override_settings(MEDIA_ROOT=media), patch('cameras.views.get_variant_cache', return_value=cache):
+            store_thumbnails(camera, render_thumbnails(np.zeros((360, 640, 3), dtype=np.uint8), sizes={'full': 0}))
+            first = client.get(url, {'width': 120, 'type': 'webp'})
+            second = client.get(url, {'width': 120, 'type': 'webp'})
+            unchanged = client.get(url, {'width': 120, 'type': 'webp'}, HTTP_IF_NONE_MATCH=first['ETag'])
+            invalid = client.get(url, {'width': 'wide'})
+        
+        image = cv2.imdecode(np.frombuffer(first.content, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(first['Content-Type'], 'image/webp')
+        self.assertEqual(image.shape[:2], (68, 120))
+        self.assertEqual(first.content, second.content)
+        self.assertTrue(first['ETag'].endswith('-120-webp"'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MosaicTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='mosaic', password='StrongPassword123!')
+        self.cameras = [
+            Camera.objects.create(user=self.user, name=f'Cam {index}', ip_address=f'192.168.1.{90 + index}',
+                                  location='Wall', status='online')
+            for index in range(3)
+        ]
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+    
+    def store(self, camera, color):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        frame[:] = color
+        store_thumbnails(camera, render_thumbnails(frame, sizes={'tile': 200, 'full': 0}))
+    
+    def test_layout(self):
+        """Test that grids are as square as possible"""
+        self.assertEqual(mosaic_layout(1), (1, 1))
+        self.assertEqual(mosaic_layout(5), (3, 2))
+        self.assertEqual(mosaic_layout(9), (3, 3))
+        self.assertEqual(mosaic_layout(5, columns=5), (5, 1))
+        self.assertEqual(mosaic_size(5, 160, columns=1), (160, 450))
+    
+    def test_tiles_are_composited_in_order(self):
+        """Test that every camera lands in its own tile, missing thumbnails stay empty"""
+        with override_settings(MEDIA_ROOT=self.media):
+            self.store(self.cameras[0], (0, 0, 255))
+            self.store(self.cameras[2], (255, 0, 0))
+            for camera in self.cameras:
+                camera.refresh_from_db()
+            data, fmt = render_mosaic(self.cameras, tile_width=160, columns=2, overlay=False)
+        
+        canvas = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(canvas.shape, (180, 320, 3))
+        self.assertGreater(canvas[45, 80, 2], 200)
+        self.assertLess(canvas[45, 240].max(), 40)
+        self.assertGreater(canvas[135, 80, 0], 200)
+    
+    def test_endpoint_caches_until_a_member_changes(self):
+        """Test that mosaics are served from cache and rebuilt on thumbnail changes"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('camera-mosaic')
+        cache = VariantCache(self.cache_dir, max_bytes=10 ** 6)
+        
+        with override_settings(MEDIA_ROOT=self.media), patch('cameras.views.get_variant_cache', return_value=cache):
+            for camera in self.cameras:
+                self.store(camera, (0, 128, 0))
+            first = client.get(url, {'tile_width': 160})
+            again = client.get(url, {'tile_width': 160})
+            unchanged = client.get(url, {'tile_width': 160}, HTTP_IF_NONE_MATCH=first['ETag'])
+            subset = client.get(url, {'tile_width': 160, 'ids': f'{self.cameras[1].id}'})
+            
+            self.store(self.cameras[0], (0, 0, 255))
+            changed = client.get(url, {'tile_width': 160}, HTTP_IF_NONE_MATCH=first['ETag'])
+        
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['Content-Type'], 'image/jpeg')
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
+        subset_image = cv2.imdecode(np.frombuffer(subset.content, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(subset_image.shape, (90, 160, 3))
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+    
+    def test_oversized_canvas_is_rejected(self):
+        """Test that a mosaic larger than MOSAIC_MAX_PIXELS is refused before rendering"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('camera-mosaic')
+        
+        # Three 1280-wide tiles stacked in one column: 1280x2160
+        with override_settings(MOSAIC_MAX_PIXELS=1280 * 1440), patch('cameras.views.render_mosaic') as render:
+            tall = client.get(url, {'tile_width': 1280, 'columns': 1})
+        
+        self.assertEqual(tall.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('1280x2160', tall.data['error'])
+        render.assert_not_called()
+
+
+ONVIF_FAULT = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://www.w3.org/2003/05/soap-envelope">'
+    b'<SOAP-ENV:Body><SOAP-ENV:Fault><SOAP-ENV:Code><SOAP-ENV:Value>SOAP-ENV:Sender</SOAP-ENV:Value>'
+    b'</SOAP-ENV:Code></SOAP-ENV:Fault></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+)
+
+class FakeONVIFHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Web server with an ONVIF device service (which rejects GET with a SOAP
+    fault like real ones)
+    """
+    def do_GET(self):
+        if self.path == '/onvif/device_service':
+            self.send_response(405)
+            self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+            self.send_header('Content-Length', str(len(ONVIF_FAULT)))
+            self.end_headers()
+            self.wfile.write(ONVIF_FAULT)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+class PlainHTTPHandler(FakeONVIFHandler):
+    def do_GET(self):
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+class LoginHTTPHandler(FakeONVIFHandler):
+    """
+    Web UI that asks for a login on every path
+    """
+    def do_GET(self):
+        body = b'<html><body>Login required</body></html>'
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', 'Basic realm="router"')
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class DiscoveryTests(TestCase):
+    def serve(self, address, handler):
+        server = socketserver.ThreadingTCPServer((address, 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+    
+    def closed_port(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+    
+    def test_classifies_local_listeners(self):
+        """Test that RTSP, ONVIF and plain HTTP listeners are found and told apart"""
+        rtsp = self.serve('127.0.0.1', FakeRTSPHandler)
+        web = self.serve('127.0.0.1', PlainHTTPHandler)
+        login = self.serve('127.0.0.1', LoginHTTPHandler)
+        onvif = self.serve('127.0.0.2', FakeONVIFHandler)
+        ports = [rtsp, web, login, onvif, self.closed_port()]
+        
+        async def scan():
+            return [result async for result in discover('127.0.0.0/30', ports, timeout=0.5, rtsp_ports={rtsp})]
+        
+        results = asyncio.run(scan())
+        summary = results.pop()
+        hosts = {result['host']: result for result in results}
+        
+        self.assertEqual(summary['scanned'], 2)
+        self.assertEqual(summary['found'], 2)
+        self.assertEqual(hosts['127.0.0.1']['open_ports'], sorted([rtsp, web, login]))
+        self.assertEqual(hosts['127.0.0.1']['kinds'], ['http', 'rtsp'])
+        self.assertEqual(hosts['127.0.0.2']['kinds'], ['http', 'onvif'])
+    
+    def test_discover_endpoint_streams_results(self):
+        """Test that the endpoint streams one JSON line per host and marks known cameras"""
+        caches['default'].clear()
+        user = User.objects.create_user(username='installer', password='StrongPassword123!')
+        web = self.serve('127.0.0.1', PlainHTTPHandler)
+        camera = Camera.objects.create(user=user, name='Known', ip_address='127.0.0.1', location='Lab')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('camera-discover')
+        
+        response = client.post(url, {'cidr': '127.0.0.1/32', 'ports': [web]}, format='json')
+        
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        
+        lines = [json.loads(line) for line in asyncio.run(read()).decode().splitlines()]
+        too_big = client.post(url, {'cidr': '10.0.0.0/8'}, format='json')
+        public = client.post(url, {'cidr': '8.8.8.0/24'}, format='json')
+        bad_ports = [
+            client.post(url, {'cidr': '127.0.0.1/32', 'ports': ports}, format='json').status_code
+            for ports in ('8080', ['http'], [0], [70000], [True], [])
+        ]
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lines[0]['host'], '127.0.0.1')
+        self.assertEqual(lines[0]['camera_id'], camera.id)
+        self.assertTrue(lines[-1]['done'])
+        self.assertEqual(too_big.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(public.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(bad_ports, [status.HTTP_400_BAD_REQUEST] * 6)
+    
+    def test_discover_endpoint_is_throttled(self):
+        """Test that each user may only start so many scans"""
+        # Throttle history lives in the cache, keyed by user id
+        caches['default'].clear()
+        user = User.objects.create_user(username='scanner', password='StrongPassword123!')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('camera-discover')
+        
+        with patch.object(DiscoveryRateThrottle, 'THROTTLE_RATES', {'discovery': '2/hour'}):
+            codes = [client.post(url, {'cidr': '8.8.8.0/24'}, format='json').status_code for _ in range(3)]
+        
+        self.assertEqual(codes, [status.HTTP_400_BAD_REQUEST] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
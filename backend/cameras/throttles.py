@@ -0,0 +1,8 @@
+from rest_framework.throttling import UserRateThrottle
+
+
+class DiscoveryRateThrottle(UserRateThrottle):
+    """
+    Limits how often each user may start a LAN scan (DISCOVERY_RATE)
+    """
+    scope = 'discovery'
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from .capture_pool import get_capture_pool
+from .models import Camera
+from .validators import get_stream_url
+
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+# Thumbnails are stored by content hash; files named per capture are the
+# older layout and only kept until garbage collection
+BLOB_DIR = 'thumbnail_blobs'
+LEGACY_DIR = 'camera_thumbnails'
+
+# Thumbnails are rendered on a small bounded pool, off the request path
+_executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def encode_image(image, fmt=None, quality=None):
+    """
+    Encode a BGR image as JPEG or WebP bytes; returns (bytes, format)
+    """
+    fmt = fmt or settings.THUMBNAIL_FORMAT
+    quality = quality or settings.THUMBNAIL_QUALITY
+    if fmt == 'webp':
+        ok, data = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if ok:
+            return data.tobytes(), 'webp'
+        # OpenCV built without WebP support
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return data.tobytes(), 'jpeg'
+
+
+def image_content_type(data):
+    """
+    Content type of encoded image bytes
+    """
+    return 'image/webp' if data[8:12] == b'WEBP' else 'image/jpeg'
+
+
+def render_thumbnails(frame, sizes=None, fmt=None, quality=None):
+    """
+    Render a BGR frame at every configured size and return
+    {name: (bytes, format)}.
+
+    Sizes are widths (0 keeps the frame width) and are rendered largest
+    first, each one resized from the previous, so every step is a small
+    INTER_AREA downscale instead of a full-frame one. Frames are never
+    upscaled.
+    """
+    sizes = sizes or settings.THUMBNAIL_SIZES
+    images = {}
+    image = frame
+    for name, width in sorted(sizes.items(), key=lambda item: item[1] or frame.shape[1], reverse=True):
+        height_now, width_now = image.shape[:2]
+        if width and width < width_now:
+            size = (width, max(1, round(height_now * width / width_now)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        images[name] = encode_image(image, fmt, quality)
+    return images
+
+
+def perceptual_hash(frame):
+    """
+    64-bit difference hash of a frame as 16 hex digits: each bit tells
+    whether a pixel of a 9x8 grayscale thumbnail is brighter than its
+    right neighbour, so small noise and recompression leave it unchanged
+    """
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return bits.tobytes().hex()
+
+
+def hash_distance(first, second):
+    """
+    Number of differing bits between two perceptual hashes
+    """
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def blob_path(data, fmt):
+    """
+    Content-addressed storage path of an encoded image
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}.{EXTENSIONS[fmt]}"
+
+
+def blob_etag(path):
+    """
+    Strong ETag of a stored blob: its content hash
+    """
+    return '"' + os.path.splitext(os.path.basename(path))[0] + '"'
+
+
+def touch_blob(path):
+    """
+    Set a stored blob's modification time to now
+    """
+    try:
+        os.utime(default_storage.path(path))
+    except NotImplementedError:
+        # Remote storages have no local path; their blobs keep their age and
+        # only the reference check at delete time protects them
+        pass
+    except OSError as e:
+        print(f"Error touching thumbnail {path}: {e}")
+
+
+def store_thumbnails(camera, images, phash=''):
+    """
+    Store rendered thumbnails under their content hash and point the camera
+    at them. Blobs that already exist are reused, not written again, but
+    their modification time is refreshed so collect_thumbnail_garbage does
+    not take them for old orphans while the camera is being pointed at
+    them; blobs no camera points at any more are left to it. The largest
+    size also becomes ``camera.thumbnail``.
+    """
+    stored = {}
+    for name, (data, fmt) in images.items():
+        path = blob_path(data, fmt)
+        if default_storage.exists(path):
+            touch_blob(path)
+        else:
+            default_storage.save(path, ContentFile(data))
+        stored[name] = path
+
+    # render_thumbnails returns the largest size first
+    largest = next(iter(images))
+    camera.thumbnails = stored
+    camera.thumbnail.name = stored[largest]
+    camera.thumbnail_phash = phash
+    # Only touch the thumbnail columns so concurrent status updates survive
+    Camera.objects.filter(id=camera.id).update(
+        thumbnail=stored[largest], thumbnails=stored, thumbnail_phash=phash
+    )
+    return stored
+
+
+def capture_camera_thumbnail(camera):
+    """
+    Capture a thumbnail from the camera
+    """
+    try:
+        # In serverless environment, we'll skip thumbnail capture
+        if os.getenv('VERCEL_ENV'):
+            return True
+
+        # Get the latest frame from the warm capture pool
+        frame = get_capture_pool().latest_frame(get_stream_url(camera), timeout=10)
+        if frame is None:
+            return False
+
+        # A scene that looks the same keeps its current thumbnails
+        phash = perceptual_hash(frame)
+        if (camera.thumbnails and camera.thumbnail_phash
+                and hash_distance(phash, camera.thumbnail_phash) <= settings.THUMBNAIL_PHASH_DISTANCE):
+            return True
+
+        store_thumbnails(camera, render_thumbnails(frame), phash)
+        return True
+    except Exception as e:
+        print(f"Error capturing thumbnail: {e}")
+        return False
+
+
+def is_referenced(path):
+    """
+    Whether any camera points at the stored thumbnail ``path`` right now
+    """
+    return Camera.objects.annotate(sizes=Cast('thumbnails', TextField())).filter(
+        Q(thumbnail=path) | Q(sizes__contains=f'"{path}"')
+    ).exists()
+
+
+def collect_thumbnail_garbage(grace=3600):
+    """
+    Delete thumbnail files no camera refers to that are older than
+    ``grace`` seconds (so blobs being stored right now survive). Covers
+    the content-addressed blobs and the older per-capture files. A camera
+    may be pointed at an old blob again after the references were read,
+    so each file is checked once more right before it is deleted. Returns
+    (files deleted, bytes freed).
+    """
+    referenced = set()
+    for thumbnails, thumbnail in Camera.objects.values_list('thumbnails', 'thumbnail'):
+        referenced.update((thumbnails or {}).values())
+        if thumbnail:
+            referenced.add(thumbnail)
+
+    def walk(directory):
+        try:
+            directories, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in files:
+            yield f"{directory}/{name}"
+        for name in directories:
+            yield from walk(f"{directory}/{name}")
+
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    deleted = freed = 0
+    for directory in (BLOB_DIR, LEGACY_DIR):
+        for path in walk(directory):
+            if path in referenced:
+                continue
+            try:
+                if default_storage.get_modified_time(path) > cutoff or is_referenced(path):
+                    continue
+                size = default_storage.size(path)
+                default_storage.delete(path)
+            except Exception as e:
+                print(f"Error deleting thumbnail {path}: {e}")
+                continue
+            deleted += 1
+            freed += size
+    return deleted, freed
+
+
+def _capture(camera_id):
+    camera = Camera.objects.filter(id=camera_id).first()
+    if camera is not None:
+        capture_camera_thumbnail(camera)
+
+
+def _run(camera_id):
+    try:
+        _capture(camera_id)
+    finally:
+        with _pending_lock:
+            _pending.discard(camera_id)
+
+
+def queue_thumbnails(camera_ids):
+    """
+    Queue thumbnail captures on the worker pool. A camera that already has
+    a capture queued is not queued again, so the backlog never exceeds one
+    job per camera. Returns the futures of the queued jobs.
+    """
+    futures = []
+    for camera_id in camera_ids:
+        with _pending_lock:
+            if camera_id in _pending:
+                continue
+            _pending.add(camera_id)
+        futures.append(_executor.submit(_run, camera_id))
+    return futures
@@ -1,15 +1,8 @@
-import cv2
-import socket
-import subprocess
-import platform
-from urllib.parse import urlparse
-import time
-import threading
 import os
 from django.conf import settings
-import numpy as np
-from PIL import Image
-import io
+from .probe import probe_address
+from .protocol import probe_stream
+from .capture_pool import get_capture_pool
 
 def validate_camera_connection(ip_address):
     """
@@ -18,131 +11,85 @@ def validate_camera_connection(ip_address):
     Returns:
         tuple: (is_reachable, status)
     """
+    is_reachable, status, _ = check_camera_connection(ip_address)
+    return is_reachable, status
+
+def check_camera_connection(ip_address):
+    """
+    Validate if the camera is reachable and describe its stream
+    
+    Returns:
+        tuple: (is_reachable, status, stream) where stream is a dict with
+        the protocol, status code, codec, resolution and latency found by
+        a protocol-level probe, or None when no probe was needed
+    """
     # Check if it's a URL (RTSP, HTTP, etc.)
     if ip_address.startswith(('rtsp://', 'http://', 'https://')):
-        return validate_stream_url(ip_address)
+        return check_stream_url(ip_address)
     
     # Otherwise, treat as IP address
-    return ping_ip(ip_address)
+    return ping_ip(ip_address) + (None,)
 
 def validate_stream_url(url):
     """
-    Validate if the camera stream URL is accessible using OpenCV
+    Validate if the camera stream URL is alive with a protocol-level probe
+    (RTSP OPTIONS/DESCRIBE or HTTP HEAD), without decoding any video
     """
-    try:
-        # In serverless environment, we'll just assume the URL is valid
-        # This is because OpenCV might not work properly in Vercel's environment
-        if os.getenv('VERCEL_ENV'):
-            return True, 'online'
-            
-        cap = cv2.VideoCapture(url)
-        if not cap.isOpened():
-            return False, 'offline'
-        
-        # Try to read a frame
-        ret, frame = cap.read()
-        
-        # If we got a frame, save a thumbnail
-        if ret and frame is not None:
-            # Create thumbnails directory if it doesn't exist
-            thumbnails_dir = os.path.join(settings.MEDIA_ROOT, 'camera_thumbnails')
-            os.makedirs(thumbnails_dir, exist_ok=True)
-            
-            # Save the frame as a thumbnail
-            thumbnail_path = os.path.join(thumbnails_dir, f"{int(time.time())}.jpg")
-            cv2.imwrite(thumbnail_path, frame)
-            
-            # Release the capture
-            cap.release()
-            
-            return True, 'online'
-        
-        cap.release()
-        return False, 'offline'
-    except Exception as e:
-        print(f"Error validating stream URL: {e}")
-        # In serverless environment, we'll just assume the URL is valid
-        if os.getenv('VERCEL_ENV'):
-            return True, 'online'
-        return False, 'offline'
+    is_reachable, status, _ = check_stream_url(url)
+    return is_reachable, status
+
+def check_stream_url(url):
+    """
+    Like validate_stream_url, also returning what the probe found out about
+    the stream (see check_camera_connection)
+    """
+    # In serverless environment, we'll just assume the URL is valid
+    if os.getenv('VERCEL_ENV'):
+        return True, 'online', None
+    
+    # A stream already warm in the capture pool is known to be alive
+    if get_capture_pool().has_fresh_frame(url):
+        return True, 'online', None
+    
+    info = probe_stream(url, timeout=settings.CAMERA_PROBE_TIMEOUT)
+    stream = {
+        'protocol': info.protocol,
+        'status_code': info.status_code,
+        'codec': info.codec,
+        'width': info.width,
+        'height': info.height,
+        'latency': info.latency,
+    }
+    if info.is_reachable:
+        return True, 'online', stream
+    return False, 'offline', stream
 
 def ping_ip(ip_address):
     """
-    Ping the IP address to check if it's reachable
+    Check if the IP address is reachable with a TCP-connect probe
     """
     # In serverless environment, we'll just assume the IP is valid
     if os.getenv('VERCEL_ENV'):
         return True, 'online'
-        
-    # Parse the IP address if it contains port
-    parsed = urlparse('//' + ip_address)
-    ip = parsed.hostname or ip_address
-    
-    # Determine the ping command based on the OS
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    command = ['ping', param, '1', ip]
     
-    try:
-        # Run the ping command
-        subprocess.check_output(command, stderr=subprocess.STDOUT, universal_newlines=True)
+    result = probe_address(ip_address)
+    if result.is_reachable:
         return True, 'online'
-    except subprocess.CalledProcessError:
-        # If ping fails, try socket connection
-        try:
-            # If port is specified, use it, otherwise use default port 80
-            port = parsed.port or 80
-            with socket.create_connection((ip, port), timeout=2):
-                return True, 'online'
-        except (socket.timeout, socket.error):
-            return False, 'offline'
+    return False, 'offline'
 
-def capture_camera_thumbnail(camera):
+def get_stream_url(camera):
     """
-    Capture a thumbnail from the camera
+    Get the URL OpenCV should open for the camera
     """
-    try:
-        # In serverless environment, we'll skip thumbnail capture
-        if os.getenv('VERCEL_ENV'):
-            return True
-            
-        # Use the stream URL if available, otherwise use the IP address
-        url = camera.stream_url if camera.stream_url else camera.ip_address
-        
-        # If it's just an IP address, try to form a proper URL
-        if not url.startswith(('rtsp://', 'http://', 'https://')):
-            if camera.camera_type == 'rtsp':
-                url = f"rtsp://{url}:554/stream"
-            elif camera.camera_type == 'onvif':
-                url = f"rtsp://{url}:554/onvif1"
-            else:
-                url = f"http://{url}"
-        
-        # Open the video capture
-        cap = cv2.VideoCapture(url)
-        if not cap.isOpened():
-            return False
-        
-        # Try to read a frame
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret or frame is None:
-            return False
-        
-        # Convert the frame to a PIL Image
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame_rgb)
-        
-        # Create a BytesIO object to save the image
-        img_io = io.BytesIO()
-        img.save(img_io, format='JPEG', quality=85)
-        img_io.seek(0)
-        
-        # Save the image to the camera's thumbnail field
-        thumbnail_name = f"{camera.id}_{int(time.time())}.jpg"
-        camera.thumbnail.save(thumbnail_name, img_io, save=True)
-        
-        return True
-    except Exception as e:
-        print(f"Error capturing thumbnail: {e}")
-        return False
+    # Use the stream URL if available, otherwise use the IP address
+    url = camera.stream_url if camera.stream_url else camera.ip_address
+    
+    # If it's just an IP address, try to form a proper URL
+    if not url.startswith(('rtsp://', 'http://', 'https://')):
+        if camera.camera_type == 'rtsp':
+            url = f"rtsp://{url}:554/stream"
+        elif camera.camera_type == 'onvif':
+            url = f"rtsp://{url}:554/onvif1"
+        else:
+            url = f"http://{url}"
+    return url
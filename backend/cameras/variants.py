@@ -0,0 +1,181 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .singleflight import SingleFlight
+from .thumbnails import EXTENSIONS, encode_image
+
+
+def _touch(path):
+    # Explicit nanosecond times: the filesystem's own clock is too coarse to
+    # order files used in quick succession, and scans go by these
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def render_variant(path, width, fmt):
+    """
+    Decode a stored thumbnail and re-encode it at ``width`` (never wider
+    than the source) in ``fmt``; returns (bytes, format)
+    """
+    with default_storage.open(path, 'rb') as f:
+        data = np.frombuffer(f.read(), dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not decode {path}")
+    height_now, width_now = image.shape[:2]
+    if width < width_now:
+        size = (width, max(1, round(height_now * width / width_now)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return encode_image(image, fmt)
+
+
+class VariantCache:
+    """
+    On-disk LRU cache of resized thumbnail variants holding at most
+    ``max_bytes``.
+
+    Keys name a content-addressed source plus width and format, so cached
+    files never go stale; they are only evicted, least recently used first.
+    Recency is kept in file modification times so it survives restarts.
+    Concurrent misses for one key share a single render.
+
+    ``max_bytes`` is the budget of the whole directory, which other
+    processes may be writing to as well: it is scanned again whenever this
+    process goes over the budget or has written a tenth of it since the
+    last scan, so their files count and are evicted too.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or settings.THUMBNAIL_VARIANT_CACHE_DIR
+        self.max_bytes = max_bytes or settings.THUMBNAIL_VARIANT_CACHE_BYTES
+
+        self.lock = threading.Lock()
+        self.entries = None
+        self.size = 0
+        # Bytes this process stored since the directory was last scanned
+        self.unscanned = 0
+        self.flights = SingleFlight()
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+
+    def _load(self):
+        # Caller holds the lock
+        if self.entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                found.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(found))
+        self.size = sum(self.entries.values())
+        self.unscanned = 0
+
+    def _read(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            _touch(path)
+            return data
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            return None
+
+    def get_or_render(self, key, render):
+        """
+        Return the cached bytes for ``key``, calling ``render()`` for them on
+        a miss
+        """
+        with self.lock:
+            self._load()
+            cached = key in self.entries
+            if cached:
+                self.entries.move_to_end(key)
+        if cached:
+            data = self._read(key)
+            if data is not None:
+                self._count('hits')
+                return data
+            with self.lock:
+                self.size -= self.entries.pop(key, 0)
+
+        def run():
+            data = render()
+            self._store(key, data)
+            return data
+
+        data, shared = self.flights.do(key, run)
+        self._count('coalesced' if shared else 'misses')
+        return data
+
+    def _store(self, key, data):
+        # Write to a temporary file first so readers never see a partial one
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(data)
+        path = os.path.join(self.directory, key)
+        os.replace(temporary, path)
+        _touch(path)
+
+        evicted = []
+        with self.lock:
+            self.size -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.size += len(data)
+            self.unscanned += len(data)
+            if self.size > self.max_bytes or self.unscanned * 10 > self.max_bytes:
+                self.entries = None
+                self._load()
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                name, size = self.entries.popitem(last=False)
+                self.size -= size
+                evicted.append(name)
+            self.counters['evictions'] += len(evicted)
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                entries=len(self.entries or {}),
+                bytes=self.size,
+                max_bytes=self.max_bytes,
+            )
+
+
+def variant_key(path, width, fmt):
+    """
+    Cache key of a variant of the stored thumbnail at ``path``
+    """
+    source = os.path.splitext(os.path.basename(path))[0]
+    return f"{source}_{width}.{EXTENSIONS[fmt]}"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_variant_cache():
+    """
+    Return the process-wide variant cache, creating it on first use
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VariantCache()
+        return _cache
@@ -1,11 +1,26 @@
+import json
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from .models import Camera
 from .serializers import CameraSerializer
-from .validators import validate_camera_connection, capture_camera_thumbnail
-import threading
+from .validators import check_camera_connection, get_stream_url
+from .thumbnails import CONTENT_TYPES, EXTENSIONS, blob_etag, image_content_type, queue_thumbnails
+from .variants import get_variant_cache, render_variant, variant_key
+from .mosaic import mosaic_key, mosaic_size, render_mosaic
+from .probe import probe_cameras, resolve_endpoint
+from .discovery import DISCOVERY_PORTS, discover, expand_cidr
+from .bulk import bulk_save_cameras
+from .probe_cache import get_probe_cache, probe_key
+from .live import live_hub, BOUNDARY
+from .authentication import QueryParamJWTAuthentication, StreamTokenAuthentication, make_stream_token
+from .throttles import DiscoveryRateThrottle
 
 class CameraViewSet(viewsets.ModelViewSet):
     """
@@ -27,18 +42,46 @@ class CameraViewSet(viewsets.ModelViewSet):
         """
         camera = serializer.save()
         
-        # Capture thumbnail in a background thread
-        threading.Thread(target=self._capture_thumbnail, args=(camera.id,)).start()
+        # Capture thumbnails on the background worker pool
+        queue_thumbnails([camera.id])
     
-    def _capture_thumbnail(self, camera_id):
+    def _force(self, request):
         """
-        Helper method to capture a thumbnail for a camera
+        Whether the client asked to bypass the probe cache
         """
-        try:
-            camera = Camera.objects.get(id=camera_id)
-            capture_camera_thumbnail(camera)
-        except Camera.DoesNotExist:
-            pass
+        force = request.query_params.get('force', request.data.get('force', False))
+        return force in (True, 'true', '1')
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create (or, for items with an ``id``, update) a list of cameras in
+        one request. Takes a list, or ``{"cameras": [...], "atomic": true}``
+        to write nothing unless every item is valid; returns one result per
+        item.
+        """
+        items = request.data
+        atomic = False
+        if isinstance(items, dict):
+            atomic = items.get('atomic') in (True, 'true', '1')
+            items = items.get('cameras')
+        if not isinstance(items, list) or not items:
+            return Response({"error": "A list of cameras is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.CAMERA_BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.CAMERA_BULK_MAX_ITEMS} cameras per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = bulk_save_cameras(items, request, atomic=atomic)
+        saved = sum(result['status'] in ('created', 'updated') for result in results)
+        if saved == len(results):
+            status_code = status.HTTP_201_CREATED
+        elif atomic or not saved:
+            status_code = status.HTTP_400_BAD_REQUEST
+        else:
+            status_code = status.HTTP_207_MULTI_STATUS
+        return Response({'saved': saved, 'results': results}, status=status_code)
     
     @action(detail=True, methods=['post'])
     def check_status(self, request, pk=None):
@@ -46,15 +89,25 @@ class CameraViewSet(viewsets.ModelViewSet):
         Check the status of a camera
         """
         camera = self.get_object()
-        is_reachable, status = validate_camera_connection(camera.ip_address)
+        probed = []
+        
+        def probe():
+            probed.append(True)
+            result = probe_cameras([camera])[camera.id]
+            return result.is_reachable, camera.status
         
-        # Update the camera status
-        camera.status = status
-        camera.save()
+        is_reachable, status_value = get_probe_cache().get_or_probe(
+            get_stream_url(camera), probe, force=self._force(request)
+        )
+        
+        # A cached result may be newer than this row
+        if camera.status != status_value:
+            camera.status = status_value
+            camera.save(update_fields=['status', 'updated_at'])
         
         # If the camera is online, capture a thumbnail
-        if status == 'online':
-            threading.Thread(target=self._capture_thumbnail, args=(camera.id,)).start()
+        if probed and camera.status == 'online':
+            queue_thumbnails([camera.id])
         
         return Response({
             'id': camera.id,
@@ -63,6 +116,44 @@ class CameraViewSet(viewsets.ModelViewSet):
             'is_reachable': is_reachable
         })
     
+    @action(detail=False, methods=['post'], url_path='check_status', url_name='check-status-bulk')
+    def check_status_bulk(self, request):
+        """
+        Check the status of all (or the given ids of) the user's cameras at once
+        """
+        cameras = self.get_queryset()
+        ids = request.data.get('ids')
+        if ids:
+            cameras = cameras.filter(id__in=ids)
+        
+        cameras = list(cameras)
+        was_online = {camera.id for camera in cameras if camera.status == 'online'}
+        results = probe_cameras(cameras)
+        
+        # Keep the probe cache warm for single-camera checks
+        cache = get_probe_cache()
+        for camera in cameras:
+            cache.set(probe_key('tcp', get_stream_url(camera)), (results[camera.id].is_reachable, camera.status))
+        
+        # Capture thumbnails for the cameras that just came online
+        came_online = [
+            camera.id for camera in cameras
+            if camera.status == 'online' and camera.id not in was_online
+        ]
+        if came_online:
+            queue_thumbnails(came_online)
+        
+        return Response([
+            {
+                'id': camera.id,
+                'name': camera.name,
+                'status': camera.status,
+                'is_reachable': results[camera.id].is_reachable,
+                'latency': results[camera.id].latency,
+            }
+            for camera in cameras
+        ])
+    
     @action(detail=False, methods=['post'])
     def test_connection(self, request):
         """
@@ -87,11 +178,222 @@ class CameraViewSet(viewsets.ModelViewSet):
             elif camera_type == 'ip':
                 url = f"http://{url}"
         
-        is_reachable, status_value = validate_camera_connection(url)
+        is_reachable, status_value, stream = get_probe_cache().get_or_probe(
+            url, lambda: check_camera_connection(url), force=self._force(request), kind='stream'
+        )
         
         return Response({
             'ip_address': ip_address,
             'url': url,
             'is_reachable': is_reachable,
-            'status': status_value
+            'status': status_value,
+            'stream': stream
         })
+    
+    @action(detail=False, methods=['post'], throttle_classes=[DiscoveryRateThrottle])
+    def discover(self, request):
+        """
+        Scan a private CIDR range (``cidr``, optionally ``ports``) for
+        cameras and stream one JSON line per host found as soon as it is
+        probed, then a summary line. Scans are rate limited per user.
+        """
+        cidr = request.data.get('cidr')
+        ports = request.data.get('ports', DISCOVERY_PORTS)
+        if not cidr:
+            return Response({"error": "cidr is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            expand_cidr(cidr)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # bool is an int too, and strings would be split into digits
+        if (not isinstance(ports, (list, tuple)) or not ports
+                or not all(type(port) is int and 0 < port < 65536 for port in ports)):
+            return Response(
+                {"error": "ports must be a list of integers between 1 and 65535"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ports = sorted(set(ports))
+        
+        # Point out hosts that are already added
+        known = {}
+        for camera in self.get_queryset():
+            try:
+                known[resolve_endpoint(camera.ip_address, camera.camera_type)[0]] = camera.id
+            except ValueError:
+                pass
+        
+        async def lines():
+            async for result in discover(cidr, ports):
+                if 'host' in result:
+                    result['camera_id'] = known.get(result['host'])
+                yield json.dumps(result) + '\n'
+        
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    @action(detail=True, methods=['post'])
+    def live_token(self, request, pk=None):
+        """
+        A short-lived token that opens this camera's live preview as
+        ``?stream_token=``, for <img> tags that cannot send headers
+        """
+        camera = self.get_object()
+        return Response({
+            'stream_token': make_stream_token(request.user, camera),
+            'expires_in': settings.LIVE_STREAM_TOKEN_TTL,
+        })
+    
+    @action(detail=True, methods=['get'], authentication_classes=[JWTAuthentication, StreamTokenAuthentication])
+    def live(self, request, pk=None):
+        """
+        Live MJPEG preview of a camera, shared by all of its viewers
+        """
+        camera = self.get_object()
+        # Stream tokens are good for the one camera they were made for
+        if isinstance(request.auth, dict) and request.auth.get('camera') != camera.id:
+            raise PermissionDenied("Stream token is for another camera")
+        response = StreamingHttpResponse(
+            live_hub.stream(get_stream_url(camera)),
+            content_type=f'multipart/x-mixed-replace; boundary={BOUNDARY}'
+        )
+        response['Cache-Control'] = 'no-cache, no-store'
+        return response
+    
+    @action(detail=True, methods=['get'], url_path='thumbnail', url_name='thumbnail-image',
+            authentication_classes=[QueryParamJWTAuthentication])
+    def thumbnail_image(self, request, pk=None):
+        """
+        The camera's thumbnail with a strong ETag, so polling clients get 304
+        Not Modified until it changes. ``?size=`` picks a rendered size;
+        ``?width=`` and/or ``?type=jpeg|webp`` resize the largest one on
+        demand through the variant cache. Requests versioned with
+        ``?v=<etag>`` may be cached for good.
+        """
+        camera = self.get_object()
+        size = request.query_params.get('size')
+        width = request.query_params.get('width')
+        # ``format`` is taken by DRF's format suffix handling
+        fmt = request.query_params.get('type')
+        if size:
+            path = (camera.thumbnails or {}).get(size)
+        else:
+            path = camera.thumbnail.name if camera.thumbnail else None
+        if not path:
+            raise Http404("No thumbnail")
+        
+        variant = width is not None or fmt is not None
+        if variant:
+            try:
+                width = int(width) if width is not None else settings.THUMBNAIL_VARIANT_MAX_WIDTH
+            except ValueError:
+                width = 0
+            if not 1 <= width <= settings.THUMBNAIL_VARIANT_MAX_WIDTH:
+                return Response(
+                    {"error": f"width must be between 1 and {settings.THUMBNAIL_VARIANT_MAX_WIDTH}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            fmt = fmt or settings.THUMBNAIL_FORMAT
+            if fmt not in EXTENSIONS:
+                return Response(
+                    {"error": f"type must be one of {', '.join(EXTENSIONS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            etag = blob_etag(path)[:-1] + f'-{width}-{fmt}"'
+        else:
+            etag = blob_etag(path)
+        
+        if request.query_params.get('v') == etag.strip('"'):
+            cache_control = f'private, max-age={settings.THUMBNAIL_MAX_AGE}, immutable'
+        else:
+            cache_control = 'private, no-cache'
+        
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            response = HttpResponseNotModified()
+        elif variant:
+            try:
+                data = get_variant_cache().get_or_render(
+                    variant_key(path, width, fmt), lambda: render_variant(path, width, fmt)[0]
+                )
+            except FileNotFoundError:
+                raise Http404("No thumbnail")
+            response = HttpResponse(data, content_type=image_content_type(data))
+        else:
+            try:
+                data = default_storage.open(path, 'rb')
+            except FileNotFoundError:
+                raise Http404("No thumbnail")
+            extension = path.rsplit('.', 1)[-1].lower()
+            response = FileResponse(data, content_type=CONTENT_TYPES.get(extension, 'image/jpeg'))
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+    
+    @action(detail=False, methods=['get'], authentication_classes=[QueryParamJWTAuthentication])
+    def mosaic(self, request):
+        """
+        One grid image of the latest thumbnails of all (or ``?ids=1,2,3`` of)
+        the user's cameras, with name/status overlays unless ``?overlay=0``.
+        Mosaics are cached and only rebuilt when a member thumbnail (or,
+        with overlays, a name or status) changes.
+        """
+        cameras = self.get_queryset().order_by('id')
+        ids = request.query_params.get('ids')
+        try:
+            if ids:
+                ids = [int(value) for value in ids.split(',') if value]
+                cameras = cameras.filter(id__in=ids)
+            tile_width = int(request.query_params.get('tile_width', 320))
+            columns = int(request.query_params['columns']) if 'columns' in request.query_params else None
+        except ValueError:
+            return Response({"error": "ids, tile_width and columns must be integers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 32 <= tile_width <= 1280 or (columns is not None and not 1 <= columns <= 16):
+            return Response({"error": "tile_width must be 32-1280 and columns 1-16"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        overlay = request.query_params.get('overlay', '1') not in ('0', 'false')
+        fmt = request.query_params.get('type', settings.THUMBNAIL_FORMAT)
+        if fmt not in EXTENSIONS:
+            return Response({"error": f"type must be one of {', '.join(EXTENSIONS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        cameras = list(cameras)
+        if ids:
+            order = {camera_id: index for index, camera_id in enumerate(ids)}
+            cameras.sort(key=lambda camera: order[camera.id])
+        if not cameras:
+            raise Http404("No cameras")
+        width, height = mosaic_size(len(cameras), tile_width, columns)
+        if width * height > settings.MOSAIC_MAX_PIXELS:
+            return Response({"error": f"A {width}x{height} mosaic exceeds {settings.MOSAIC_MAX_PIXELS} pixels; "
+                                      "use fewer ids, a smaller tile_width or more columns"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        digest = mosaic_key(cameras, tile_width, columns, overlay, fmt)
+        etag = f'"mosaic-{digest}"'
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            data = get_variant_cache().get_or_render(
+                f"mosaic_{digest}.{EXTENSIONS[fmt]}",
+                lambda: render_mosaic(cameras, tile_width, columns, overlay, fmt)[0]
+            )
+            response = HttpResponse(data, content_type=image_content_type(data))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def probe_cache(self, request):
+        """
+        Hit/miss counters of the probe result cache
+        """
+        return Response(get_probe_cache().stats())
+    
+    @action(detail=False, methods=['get'])
+    def variant_cache(self, request):
+        """
+        Hit/miss counters and size of the thumbnail variant cache
+        """
+        return Response(get_variant_cache().stats())
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+ZONE_MODES = ('include', 'exclude')
+
+
+def validate_zones(zones):
+    """
+    Check a list of detection zones and return an error message, or None.
+
+    A zone is ``{"mode": "include" | "exclude", "points": [[x, y], ...]}``
+    with at least three points given as fractions (0-1) of the frame width
+    and height, so zones survive a change of stream resolution.
+    """
+    if not isinstance(zones, list):
+        return "Zones must be a list."
+    for index, zone in enumerate(zones):
+        if not isinstance(zone, dict) or zone.get('mode') not in ZONE_MODES:
+            return f"Zone {index} must have a mode of 'include' or 'exclude'."
+        points = zone.get('points')
+        if not isinstance(points, list) or len(points) < 3:
+            return f"Zone {index} needs at least three points."
+        for point in points:
+            if (not isinstance(point, (list, tuple)) or len(point) != 2
+                    or not all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in point)):
+                return f"Zone {index} points must be [x, y] pairs between 0 and 1."
+    return None
+
+
+def rasterize_zones(zones, width, height):
+    """
+    Rasterize zones into a uint8 mask (255 = analysed) of the given size, or
+    None when there are no zones and the whole frame is analysed.
+
+    With any include zone only the included area is analysed, otherwise the
+    whole frame; exclude zones are then cut out of it.
+    """
+    if not zones:
+        return None
+    includes = [zone['points'] for zone in zones if zone['mode'] == 'include']
+    excludes = [zone['points'] for zone in zones if zone['mode'] == 'exclude']
+
+    scale = np.array([width - 1, height - 1], dtype=np.float32)
+
+    def polygons(point_lists):
+        return [np.round(np.array(points, dtype=np.float32) * scale).astype(np.int32) for points in point_lists]
+
+    mask = np.zeros((height, width), dtype=np.uint8) if includes else np.full((height, width), 255, dtype=np.uint8)
+    if includes:
+        cv2.fillPoly(mask, polygons(includes), 255)
+    if excludes:
+        cv2.fillPoly(mask, polygons(excludes), 0)
+    return mask
+
+
+class ZoneMask:
+    """
+    The rasterized zone mask of one camera at the analysis resolution.
+
+    The mask is rebuilt only when the zones or the frame size change, and
+    carries the bounding box of the analysed area so detectors can crop to
+    it and skip the excluded margins altogether.
+    """
+
+    def __init__(self, zones=None):
+        self.zones = zones or []
+        self.key = None
+        self.mask = None
+        self.box = None
+        self.pixels = 0
+        self.builds = 0
+
+    def set_zones(self, zones):
+        zones = zones or []
+        if zones != self.zones:
+            self.zones = zones
+            self.key = None
+
+    def get(self, shape):
+        """
+        Return (mask, box) for a frame of ``shape``: the mask cropped to the
+        box (None when every pixel of the box is analysed) and the box as
+        (x, y, w, h), or (None, None) when the whole frame is analysed
+        """
+        height, width = shape[:2]
+        # set_zones clears the key when the zones change
+        key = (width, height)
+        if key != self.key:
+            self.key = key
+            self.builds += 1
+            self._build(width, height)
+        return self.mask, self.box
+
+    def _build(self, width, height):
+        mask = rasterize_zones(self.zones, width, height)
+        if mask is None:
+            self.mask, self.box, self.pixels = None, None, width * height
+            return
+        self.pixels = int(cv2.countNonZero(mask))
+        if not self.pixels:
+            self.mask, self.box = None, (0, 0, 0, 0)
+            return
+        x, y, w, h = cv2.boundingRect(mask)
+        cropped = np.ascontiguousarray(mask[y:y + h, x:x + w])
+        self.box = (x, y, w, h)
+        self.mask = None if self.pixels == w * h else cropped
@@ -145,6 +145,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Per-user rates of the actions that opt in with a throttle_scope
+    'DEFAULT_THROTTLE_RATES': {
+        'discovery': os.getenv('DISCOVERY_RATE', '20/hour'),
+    },
 }
 
 # JWT settings
@@ -178,3 +182,129 @@ CORS_ALLOWED_ORIGINS = [
     'https://guardian-eye.vercel.app',
 ]
 CORS_ALLOW_CREDENTIALS = True
+
+# Camera health checks
+CAMERA_PROBE_CONCURRENCY = int(os.getenv('CAMERA_PROBE_CONCURRENCY', '256'))
+CAMERA_PROBE_PER_HOST = int(os.getenv('CAMERA_PROBE_PER_HOST', '4'))
+CAMERA_PROBE_TIMEOUT = float(os.getenv('CAMERA_PROBE_TIMEOUT', '2'))
+
+# Warm camera capture pool
+CAPTURE_POOL_MAX_STREAMS = int(os.getenv('CAPTURE_POOL_MAX_STREAMS', '32'))
+CAPTURE_POOL_IDLE_TIMEOUT = float(os.getenv('CAPTURE_POOL_IDLE_TIMEOUT', '60'))
+CAPTURE_POOL_BACKOFF_BASE = float(os.getenv('CAPTURE_POOL_BACKOFF_BASE', '1'))
+CAPTURE_POOL_BACKOFF_MAX = float(os.getenv('CAPTURE_POOL_BACKOFF_MAX', '30'))
+
+# Motion detection
+MOTION_FPS = float(os.getenv('MOTION_FPS', '5'))
+MOTION_ANALYSIS_WIDTH = int(os.getenv('MOTION_ANALYSIS_WIDTH', '320'))
+MOTION_BACKGROUND_ALPHA = float(os.getenv('MOTION_BACKGROUND_ALPHA', '0.05'))
+MOTION_PIXEL_THRESHOLD = int(os.getenv('MOTION_PIXEL_THRESHOLD', '25'))
+MOTION_MIN_AREA = float(os.getenv('MOTION_MIN_AREA', '0.005'))
+MOTION_WARMUP_FRAMES = int(os.getenv('MOTION_WARMUP_FRAMES', '5'))
+# Only applies when alert episodes are disabled (ALERT_EPISODE_WINDOW = 0)
+MOTION_ALERT_COOLDOWN = float(os.getenv('MOTION_ALERT_COOLDOWN', '30'))
+
+# Sound detection
+SOUND_CHUNK_SIZE = int(os.getenv('SOUND_CHUNK_SIZE', '1024'))
+SOUND_WINDOW_CHUNKS = int(os.getenv('SOUND_WINDOW_CHUNKS', '16'))
+SOUND_MIN_RMS = float(os.getenv('SOUND_MIN_RMS', '0.02'))
+
+# Multi-process camera ingestion (0 workers means one per CPU core)
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '0'))
+INGEST_MAX_FPS = float(os.getenv('INGEST_MAX_FPS', '5'))
+# Frames per camera kept in the shared-memory ring between capture and analysis
+INGEST_RING_SLOTS = int(os.getenv('INGEST_RING_SLOTS', '4'))
+
+# Alert clips (pre/post-event footage kept per camera)
+ALERT_CLIP_PRE_SECONDS = float(os.getenv('ALERT_CLIP_PRE_SECONDS', '5'))
+ALERT_CLIP_POST_SECONDS = float(os.getenv('ALERT_CLIP_POST_SECONDS', '5'))
+ALERT_CLIP_MAX_BYTES = int(os.getenv('ALERT_CLIP_MAX_BYTES', str(4 * 1024 * 1024)))
+ALERT_CLIP_WIDTH = int(os.getenv('ALERT_CLIP_WIDTH', '640'))
+ALERT_CLIP_QUALITY = int(os.getenv('ALERT_CLIP_QUALITY', '70'))
+# Frames per camera that may wait for the clip encoder before new ones are dropped
+ALERT_CLIP_ENCODE_QUEUE = int(os.getenv('ALERT_CLIP_ENCODE_QUEUE', '16'))
+# Finished clips that may wait for the clip writer before new ones are dropped
+ALERT_CLIP_WRITE_QUEUE = int(os.getenv('ALERT_CLIP_WRITE_QUEUE', '8'))
+# Codecs tried in order for clips: avc1 (H.264) plays in browsers but needs an
+# OpenCV build with an H.264 encoder, mp4v is always available
+ALERT_CLIP_FOURCCS = os.getenv('ALERT_CLIP_FOURCCS', 'avc1,mp4v').split(',')
+
+# Probe result cache for test_connection/check_status
+PROBE_CACHE_POSITIVE_TTL = float(os.getenv('PROBE_CACHE_POSITIVE_TTL', '30'))
+PROBE_CACHE_NEGATIVE_TTL = float(os.getenv('PROBE_CACHE_NEGATIVE_TTL', '5'))
+PROBE_CACHE_MAX_ENTRIES = int(os.getenv('PROBE_CACHE_MAX_ENTRIES', '1024'))
+
+# Live MJPEG preview (width 0 keeps the camera resolution)
+LIVE_PREVIEW_WIDTH = int(os.getenv('LIVE_PREVIEW_WIDTH', '1280'))
+LIVE_PREVIEW_QUALITY = int(os.getenv('LIVE_PREVIEW_QUALITY', '75'))
+# Seconds without a new frame after which the last one is sent again, so a
+# viewer that went away is noticed even while the camera is stalled
+LIVE_PREVIEW_HEARTBEAT = float(os.getenv('LIVE_PREVIEW_HEARTBEAT', '5'))
+# Lifetime of the single-camera tokens that open a live preview
+LIVE_STREAM_TOKEN_TTL = int(os.getenv('LIVE_STREAM_TOKEN_TTL', '60'))
+
+# Adaptive frame sampling in the ingestion workers
+SAMPLING_ENABLED = os.getenv('SAMPLING_ENABLED', 'True') == 'True'
+SAMPLING_IDLE_FPS = float(os.getenv('SAMPLING_IDLE_FPS', '1'))
+SAMPLING_QUIET_SECONDS = float(os.getenv('SAMPLING_QUIET_SECONDS', '10'))
+SAMPLING_CHANGE_THRESHOLD = float(os.getenv('SAMPLING_CHANGE_THRESHOLD', '4'))
+
+# Analytics pipeline: width shared preprocessed frame inputs are computed at
+ANALYTICS_WIDTH = int(os.getenv('ANALYTICS_WIDTH', str(MOTION_ANALYSIS_WIDTH)))
+
+# Camera thumbnails: name:width pairs (width 0 keeps the camera resolution)
+THUMBNAIL_SIZES = {
+    name: int(width)
+    for name, width in (
+        size.split(':') for size in os.getenv('THUMBNAIL_SIZES', 'tile:200,card:480,full:1920').split(',')
+    )
+}
+THUMBNAIL_FORMAT = os.getenv('THUMBNAIL_FORMAT', 'jpeg')
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))
+# Frames within this many bits of the last thumbnail's perceptual hash keep it
+THUMBNAIL_PHASH_DISTANCE = int(os.getenv('THUMBNAIL_PHASH_DISTANCE', '4'))
+# Browser cache lifetime of versioned (?v=<etag>) thumbnail responses
+THUMBNAIL_MAX_AGE = int(os.getenv('THUMBNAIL_MAX_AGE', str(365 * 24 * 3600)))
+
+# On-disk LRU cache of on-demand resized thumbnails
+THUMBNAIL_VARIANT_CACHE_DIR = os.getenv('THUMBNAIL_VARIANT_CACHE_DIR', os.path.join(BASE_DIR, 'thumbnail_cache'))
+THUMBNAIL_VARIANT_CACHE_BYTES = int(os.getenv('THUMBNAIL_VARIANT_CACHE_BYTES', str(256 * 1024 * 1024)))
+THUMBNAIL_VARIANT_MAX_WIDTH = int(os.getenv('THUMBNAIL_VARIANT_MAX_WIDTH', '3840'))
+# Largest camera mosaic canvas, in pixels (bounds tile count x tile size)
+MOSAIC_MAX_PIXELS = int(os.getenv('MOSAIC_MAX_PIXELS', str(4096 * 4096)))
+
+# LAN camera discovery
+DISCOVERY_CONCURRENCY = int(os.getenv('DISCOVERY_CONCURRENCY', '512'))
+DISCOVERY_TIMEOUT = float(os.getenv('DISCOVERY_TIMEOUT', '0.5'))
+DISCOVERY_MAX_HOSTS = int(os.getenv('DISCOVERY_MAX_HOSTS', '1024'))
+
+# Bulk camera create/update: connection checks run on this many threads
+CAMERA_BULK_WORKERS = int(os.getenv('CAMERA_BULK_WORKERS', '32'))
+CAMERA_BULK_MAX_ITEMS = int(os.getenv('CAMERA_BULK_MAX_ITEMS', '500'))
+
+# Cursor pagination of the alerts list
+ALERTS_PAGE_SIZE = int(os.getenv('ALERTS_PAGE_SIZE', '50'))
+ALERTS_MAX_PAGE_SIZE = int(os.getenv('ALERTS_MAX_PAGE_SIZE', '200'))
+
+# Alerts are buffered and written in batches of up to ALERT_BATCH_SIZE, at
+# most ALERT_BATCH_INTERVAL seconds after they are raised (0 writes each
+# alert straight away)
+ALERT_BATCH_SIZE = int(os.getenv('ALERT_BATCH_SIZE', '200'))
+ALERT_BATCH_INTERVAL = float(os.getenv('ALERT_BATCH_INTERVAL', '0.005'))
+# Alerts a batch failed to store are retried this many times, this many
+# seconds apart, before they are dropped
+ALERT_WRITE_RETRIES = int(os.getenv('ALERT_WRITE_RETRIES', '5'))
+ALERT_WRITE_RETRY_DELAY = float(os.getenv('ALERT_WRITE_RETRY_DELAY', '1'))
+
+# Repeats of an alert within ALERT_EPISODE_WINDOW seconds of the last one
+# update its open episode instead of creating new alerts (0 disables this);
+# updates are pushed at most every ALERT_EPISODE_PUSH_INTERVAL seconds
+ALERT_EPISODE_WINDOW = float(os.getenv('ALERT_EPISODE_WINDOW', '60'))
+ALERT_EPISODE_PUSH_INTERVAL = float(os.getenv('ALERT_EPISODE_PUSH_INTERVAL', '10'))
+ALERT_EPISODE_MAX = int(os.getenv('ALERT_EPISODE_MAX', '10000'))
+
+# Largest number of rollup buckets one /api/alerts/stats/ query may span
+ALERT_STATS_MAX_BUCKETS = int(os.getenv('ALERT_STATS_MAX_BUCKETS', '10000'))
+# ... and most rows it may return (buckets x cameras x alert types)
+ALERT_STATS_MAX_ROWS = int(os.getenv('ALERT_STATS_MAX_ROWS', '50000'))